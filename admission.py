@@ -0,0 +1,91 @@
+import config
+
+from collections import OrderedDict
+import threading
+import time
+
+
+class TokenBucket:
+    """
+    Holds up to capacity tokens, refilling at refillRate tokens a second. Commands spend tokens to run
+    """
+    def __init__(self, capacity: float, refillRate: float):
+        self.capacity = capacity
+        self.refillRate = refillRate
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        # A bucket created after now was read mustn't lose tokens to a negative interval
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refillRate)
+            self.updated = now
+
+    def waitFor(self, cost: float):
+        """
+        Seconds until the bucket can afford cost, 0 if it already can. Assumes it has just been refilled
+        """
+        if self.tokens >= cost:
+            return 0.0
+        if cost > self.capacity or self.refillRate <= 0:
+            # Can never be afforded, admit caps costs at the capacity so this only happens if refilling is turned off
+            return float("inf")
+        return (cost - self.tokens) / self.refillRate
+
+
+class AdmissionController:
+    """
+    Token buckets per guild and per user. A command is only let in if both of its buckets can afford it,
+    in which case it's charged to both. The least recently used buckets are forgotten, a forgotten bucket starts full again
+    """
+    def __init__(self, maxBuckets: int = None):
+        self.maxBuckets = maxBuckets or config.ADMISSION_MAX_BUCKETS
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def getBucket(self, key: tuple, capacity: float, refillRate: float):
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = TokenBucket(capacity, refillRate)
+            while len(self.buckets) > self.maxBuckets:
+                self.buckets.popitem(last=False)
+        self.buckets.move_to_end(key)
+        return bucket
+
+    def admit(self, guildId: int, userId: int, cost: float):
+        """
+        Charges a command to its guild & user buckets. Returns 0 if it was admitted, otherwise how many seconds to wait before retrying
+        """
+        now = time.monotonic()
+        with self.lock:
+            buckets = [self.getBucket(("user", userId), config.ADMISSION_USER_CAPACITY, config.ADMISSION_USER_REFILL)]
+            # DMs have no guild, so only the user's bucket applies
+            if guildId is not None:
+                buckets.append(self.getBucket(("guild", guildId), config.ADMISSION_GUILD_CAPACITY, config.ADMISSION_GUILD_REFILL))
+
+            # A command costing more than a bucket can hold would never be let in, so it costs at most a full bucket
+            costs = [min(cost, bucket.capacity) for bucket in buckets]
+            for bucket in buckets:
+                bucket.refill(now)
+            retryAfter = max(bucket.waitFor(bucketCost) for bucket, bucketCost in zip(buckets, costs))
+            if retryAfter == 0:
+                for bucket, bucketCost in zip(buckets, costs):
+                    bucket.tokens -= bucketCost
+            return retryAfter
+
+
+def getCommandCost(commandName: str, options: dict):
+    """
+    FUNC NAME: getCommandCost
+    FUNC DESC: Works out how many tokens a command costs from its name and options. Anything that downloads a whole directory is the most expensive
+    FUNC TYPE: Function
+    """
+    # /search and /searchdir without an entity list a whole directory, /lst always downloads one
+    if commandName == "lst" or (commandName in ("search", "searchdir") and not options.get("entity")):
+        return config.COMMAND_LISTING_COST
+    if commandName == "roll" and options.get("mode") == "simulate":
+        return config.COMMAND_SIMULATE_COST
+    return config.COMMAND_COSTS.get(commandName, config.COMMAND_DEFAULT_COST)
+
+
+ADMISSION = AdmissionController()
@@ -1,10 +1,62 @@
+import config
 from utils import getRequestType
+from cache import ENTITY_CACHE, ROOT_CACHE, SCRYFALL_CACHE
+from metrics import UPSTREAM_RESPONSES, UPSTREAM_LATENCY
+from replay import recordResponse, replayResponse
+from deadline import upstreamTimeout, DeadlineExceeded
+from tracing import traceSpan
+from index import ENTITY_INDEX, loadIndexSnapshot, saveIndexSnapshot, snapshotModified, snapshotIsFresh
+from urllib.parse import urlsplit
 import requests
 import logging
+import time
 
 LOGGER = logging.getLogger(__name__)
 
 
+def getUpstream(query: str):
+    """
+    FUNC NAME: getUpstream
+    FUNC DESC: Sends a GET request to an upstream API, recording how long it took and the status code it returned.
+               Depending on UPSTREAM_MODE the response is also saved as a fixture, or answered from one instead.
+               The request times out at the current command's deadline, raising DeadlineExceeded if it has already passed
+    FUNC TYPE: Function
+    """
+    host = urlsplit(query).hostname
+    timeout = upstreamTimeout(f"request to {host}")
+    requestStart = time.perf_counter()
+    with traceSpan("scryfall fetch" if query.startswith(config.SCRYFALL_API_URL) else "open5e fetch", query=query) as fetchSpan:
+        try:
+            if config.UPSTREAM_MODE == "replay":
+                response = replayResponse(query)
+            else:
+                response = requests.get(query, timeout=timeout)
+        except requests.RequestException as requestError:
+            UPSTREAM_RESPONSES.inc(host, "error")
+            # A request cut short by the command's deadline (rather than the upstream timeout) means the command is out of time
+            if isinstance(requestError, requests.Timeout) and timeout < config.UPSTREAM_TIMEOUT:
+                raise DeadlineExceeded(f"request to {host}") from requestError
+            raise
+        finally:
+            elapsed = time.perf_counter() - requestStart
+            UPSTREAM_LATENCY.observe(elapsed, host)
+        if fetchSpan.recording:
+            fetchSpan.set(status=response.status_code, bytes=len(response.content))
+    UPSTREAM_RESPONSES.inc(host, str(response.status_code))
+    if config.UPSTREAM_MODE == "record":
+        recordResponse(query, response, elapsed)
+    return response
+
+
+def scryfallSearchUrl(searchTerm: str):
+    """
+    FUNC NAME: scryfallSearchUrl
+    FUNC DESC: Builds the Scryfall card search url for a search term
+    FUNC TYPE: Function
+    """
+    return f"{config.SCRYFALL_API_URL}/cards/search?q={searchTerm}&include_extras=true&include_multilingual=true&include_variations=true"
+
+
 def searchResponse(responseResults, filteredEntityInput: str):
     """
     FUNC NAME: searchResponse
@@ -38,21 +90,34 @@ def searchResponse(responseResults, filteredEntityInput: str):
     return matches
 
 
+def cachedScryfallImage(splitSearchTerm: list):
+    """
+    FUNC NAME: cachedScryfallImage
+    FUNC DESC: Returns the cached Scryfall image for a search term, or None if it hasn't been found yet
+    FUNC TYPE: Function
+    """
+    return SCRYFALL_CACHE.get(tuple(splitSearchTerm))
+
+
 def requestScryfall(splitSearchTerm: list):
     """
     FUNC NAME: requestScryfall
-    FUNC DESC: Queries the Scryfall API to obtain a thumbnail image.
+    FUNC DESC: Queries the Scryfall API to obtain a thumbnail image. Found images are cached
     FUNC TYPE: Function
     """
-    requestStr = f"https://api.scryfall.com/cards/search?q={' '.join(splitSearchTerm)}&include_extras=true&include_multilingual=true&include_variations=true"
-    scryfallRequest = requests.get(requestStr)
+    cachedImage = cachedScryfallImage(splitSearchTerm)
+    if cachedImage is not None:
+        return cachedImage
+
+    requestStr = scryfallSearchUrl(' '.join(splitSearchTerm))
+    scryfallRequest = getUpstream(requestStr)
 
     # Try again with the first arg if nothing was found
     foundItem = {}
     if scryfallRequest.status_code == 404:
         LOGGER.info(f"Scryfall 1st Attempt - No matches found for: {requestStr}")
-        requestStr = f"https://api.scryfall.com/cards/search?q={splitSearchTerm[0]}&include_extras=true&include_multilingual=true&include_variations=true"
-        scryfallWordRequest = requests.get(requestStr)
+        requestStr = scryfallSearchUrl(splitSearchTerm[0])
+        scryfallWordRequest = getUpstream(requestStr)
 
         if scryfallWordRequest.status_code != 200:
             LOGGER.info(f"Scryfall 2nd Attempt - No matches found for: {requestStr}")
@@ -75,6 +140,7 @@ def requestScryfall(splitSearchTerm: list):
         if "image_uris" in foundCardFace.keys() and len(foundCardFace["image_uris"].keys()) >= 1:
             imageUris = dict(foundCardFace["image_uris"])
             if "art_crop" in imageUris.keys():
+                SCRYFALL_CACHE.put(tuple(splitSearchTerm), imageUris["art_crop"])
                 return imageUris["art_crop"]
     # Otherwise, no valid image found
     return 404
@@ -88,14 +154,17 @@ def requestOpen5e(query: str, filteredEntityInput: str, wideSearch: bool, listRe
     FUNC TYPE: Function
     """
     # API Request
-    request = requests.get(query)
+    request = getUpstream(query)
 
     # Return code if not successful
     if request.status_code != 200:
         return {"code": request.status_code, "query": query}
 
     # Iterate through the results
-    results = searchResponse(request.json()["results"], filteredEntityInput)
+    with traceSpan("match", entity=filteredEntityInput) as matchSpan:
+        responseResults = request.json()["results"]
+        results = searchResponse(responseResults, filteredEntityInput)
+        matchSpan.set(candidates=len(responseResults), results=len(results))
 
     if results == []:
         # No full or partial matches were found
@@ -113,23 +182,26 @@ def requestOpen5e(query: str, filteredEntityInput: str, wideSearch: bool, listRe
             filterType = getRequestType(route)
 
             if "title" in results:
-                directoryRequest = requests.get(
-                    f"https://api.open5e.com/{route}?format=json&limit=10000&{filterType}={firstMatchedEntity['entity']['title'].split()[0]}"
+                directoryRequest = getUpstream(
+                    f"{config.OPEN5E_API_URL}/{route}?format=json&limit=10000&{filterType}={firstMatchedEntity['entity']['title'].split()[0]}"
                 )
             else:
-                directoryRequest = requests.get(
-                    f"https://api.open5e.com/{route}?format=json&limit=10000&{filterType}={firstMatchedEntity['entity']['name'].split()[0]}"
+                directoryRequest = getUpstream(
+                    f"{config.OPEN5E_API_URL}/{route}?format=json&limit=10000&{filterType}={firstMatchedEntity['entity']['name'].split()[0]}"
                 )
 
             # Return code if not successful
             if directoryRequest.status_code != 200:
                 return {
                     "code": directoryRequest.status_code,
-                    "query": f"https://api.open5e.com/{route}?format=json&limit=10000&search={firstMatchedEntity['entity']['name'].split()[0]}"
+                    "query": f"{config.OPEN5E_API_URL}/{route}?format=json&limit=10000&search={firstMatchedEntity['entity']['name'].split()[0]}"
                 }
 
             # Search response again for the actual object, return empty array if none was found
-            actualMatch = searchResponse(directoryRequest.json()["results"], filteredEntityInput)
+            with traceSpan("match", entity=filteredEntityInput, route=route) as matchSpan:
+                directoryResults = directoryRequest.json()["results"]
+                actualMatch = searchResponse(directoryResults, filteredEntityInput)
+                matchSpan.set(candidates=len(directoryResults), results=len(actualMatch))
             if actualMatch != []:
                 actualMatch[0]["route"] = route
                 return actualMatch[0]
@@ -140,21 +212,180 @@ def requestOpen5e(query: str, filteredEntityInput: str, wideSearch: bool, listRe
             return firstMatchedEntity
 
 
+def requestDirectoryNames(query: str):
+    """
+    FUNC NAME: requestDirectoryNames
+    FUNC DESC: Downloads a whole directory listing and returns the name (or title) of every entity in it
+    FUNC TYPE: Function
+    """
+    directoryRequest = getUpstream(query)
+
+    # Return code if not successful
+    if directoryRequest.status_code != 200:
+        return {"code": directoryRequest.status_code, "query": query}
+
+    return [apiEntity["title"] if "title" in apiEntity.keys() else apiEntity["name"] for apiEntity in directoryRequest.json()["results"]]
+
+
+def requestEntity(scope: str, filteredEntityInput: str):
+    """
+    FUNC NAME: requestEntity
+    FUNC DESC: Finds the best match for an entity in the search/ directory or a specific directory (scope), checking the entity cache first
+    FUNC TYPE: Function
+    """
+    with traceSpan("entity lookup", scope=scope, entity=filteredEntityInput) as lookupSpan:
+        cachedMatch = ENTITY_CACHE.get((scope, filteredEntityInput))
+        lookupSpan.set(cached=cachedMatch is not None)
+        if cachedMatch is not None:
+            return cachedMatch
+
+        # Use first word to narrow search results down for quicker response on some directories
+        firstWord = filteredEntityInput.split(" ")[0]
+        indexedMatches = searchIndex(scope, filteredEntityInput)
+        lookupSpan.set(indexed=indexedMatches is not None)
+        if indexedMatches is not None:
+            match = indexedMatches[0] if len(indexedMatches) > 0 else []
+            if match != []:
+                match = {**match, "route": match["entity"]["route"] if scope == "search" else scope}
+        elif scope == "search":
+            match = requestOpen5e(f"{config.OPEN5E_API_URL}/search/?format=json&limit=10000&text={firstWord}", filteredEntityInput, True, False)
+        else:
+            match = requestOpen5e(f"{config.OPEN5E_API_URL}/{scope}/?format=json&limit=10000&{getRequestType(scope)}={firstWord}", filteredEntityInput, False, False)
+            if isinstance(match, dict) and "entity" in match.keys():
+                match = {**match, "route": scope}
+
+        # Only cache actual matches, failures and misses should be retried
+        if isinstance(match, dict) and "entity" in match.keys():
+            route = match.get("route", match["entity"].get("route", scope))
+            ENTITY_CACHE.put((scope, filteredEntityInput), match, route.strip("/"))
+            lookupSpan.set(route=route)
+        return match
+
+
+def searchIndex(scope: str, filteredEntityInput: str):
+    """
+    FUNC NAME: searchIndex
+    FUNC DESC: Finds the full & partial matches for an entity in the entity index, or returns None if the index isn't ready
+    FUNC TYPE: Function
+    """
+    candidates = ENTITY_INDEX.candidates(scope)
+    if candidates is None:
+        return None
+    with traceSpan("match", entity=filteredEntityInput, indexed=True) as matchSpan:
+        matches = searchResponse(candidates, filteredEntityInput)
+        matchSpan.set(candidates=len(candidates), results=len(matches))
+    return matches
+
+
+def requestEntityList(scope: str, filteredEntityInput: str, firstWord: str):
+    """
+    FUNC NAME: requestEntityList
+    FUNC DESC: Finds every full & partial match for an entity in the search/ directory or a specific directory (scope).
+               Uses the entity index once it's ready, otherwise asks Open5e for the entities matching firstWord
+    FUNC TYPE: Function
+    """
+    indexedMatches = searchIndex(scope, filteredEntityInput)
+    if indexedMatches is not None:
+        return indexedMatches
+    if scope == "search":
+        return requestOpen5e(f"{config.OPEN5E_API_URL}/search?format=json&limit=10000&text={firstWord}", filteredEntityInput, True, True)
+    return requestOpen5e(f"{config.OPEN5E_API_URL}/{scope}/?format=json&limit=10000&{getRequestType(scope)}={firstWord}", filteredEntityInput, False, True)
+
+
+def buildEntityIndex():
+    """
+    FUNC NAME: buildEntityIndex
+    FUNC DESC: Builds the entity index, from the snapshot if it's recent enough or by downloading every directory otherwise.
+               If the download fails an old snapshot is better than nothing, without either commands keep using the live API
+    FUNC TYPE: Function
+    """
+    buildStart = time.perf_counter()
+    snapshot = loadIndexSnapshot()
+    if snapshot is not None and snapshotIsFresh(snapshot[1]):
+        ENTITY_INDEX.load(*snapshot)
+        LOGGER.info(f"Loaded entity index snapshot in {time.perf_counter() - buildStart:.2f} seconds")
+        return
+
+    try:
+        directories = downloadDirectories()
+    except (requests.RequestException, DeadlineExceeded) as downloadError:
+        directories = None
+        LOGGER.warning(f"Failed to download Open5e directories for the entity index: {downloadError}")
+
+    if directories is not None:
+        builtAt = time.time()
+        saveIndexSnapshot(directories, builtAt)
+        ENTITY_INDEX.load(directories, builtAt)
+        LOGGER.info(f"Built entity index from Open5e in {time.perf_counter() - buildStart:.2f} seconds")
+    elif snapshot is not None and not ENTITY_INDEX.ready():
+        LOGGER.warning("Using an out of date entity index snapshot until Open5e can be downloaded again")
+        ENTITY_INDEX.load(*snapshot)
+
+
+def followEntityIndex(lastModified: float = None):
+    """
+    FUNC NAME: followEntityIndex
+    FUNC DESC: Loads the entity index snapshot saved by the primary shard if it has been saved again since lastModified, returning when the loaded
+               snapshot was saved. Used by every other shard process instead of downloading Open5e themselves
+    FUNC TYPE: Function
+    """
+    modified = snapshotModified()
+    if modified is None or modified == lastModified:
+        return lastModified
+
+    snapshot = loadIndexSnapshot()
+    if snapshot is None:
+        return lastModified
+    # An out of date snapshot is only better than nothing, the primary shard replaces it once Open5e can be downloaded
+    if snapshotIsFresh(snapshot[1]) or not ENTITY_INDEX.ready():
+        ENTITY_INDEX.load(*snapshot)
+    return modified
+
+
+def downloadDirectories():
+    """
+    FUNC NAME: downloadDirectories
+    FUNC DESC: Downloads every entity in every Open5e directory, returning None if any of them couldn't be downloaded
+    FUNC TYPE: Function
+    """
+    directoryNames = getOpen5eRoot()
+    if isinstance(directoryNames, int):
+        return None
+
+    directories = {}
+    for directoryName in directoryNames:
+        directoryRequest = getUpstream(f"{config.OPEN5E_API_URL}/{directoryName}/?format=json&limit=10000")
+        # A partial index would answer "no match" for everything in the missing directories
+        if directoryRequest.status_code != 200:
+            LOGGER.warning(f"Failed to download the {directoryName} directory for the entity index. Code: {directoryRequest.status_code}")
+            return None
+        directories[directoryName] = directoryRequest.json()["results"]
+    return directories
+
+
 def getOpen5eRoot():
     """
     FUNC NAME: getOpen5eRoot
-    FUNC DESC: Retrieves the open5e root dir, which contains the directory urls and names
+    FUNC DESC: Retrieves the open5e root dir, which contains the directory urls and names. Cached for ROOT_CACHE_TTL seconds
     FUNC TYPE: Function
     """
-    # Get API Root
-    rootRequest = requests.get("https://api.open5e.com?format=json")
+    with traceSpan("root lookup") as rootSpan:
+        cachedDirectories = ROOT_CACHE.get(None)
+        rootSpan.set(cached=cachedDirectories is not None)
+        if cachedDirectories is not None:
+            return list(cachedDirectories)
 
-    if rootRequest.status_code == 200:
-        # Remove search directory from list (not used)
-        allDirectories = list(rootRequest.json().keys())
-        allDirectories.remove("search")
-        return allDirectories
-    else:
-        # Throw if Root request wasn't successful
-        LOGGER.error(f"API Request to Open5e root directory FAILED. Code: {rootRequest.status_code}")
-        return rootRequest.status_code
+        # Get API Root
+        rootRequest = getUpstream(f"{config.OPEN5E_API_URL}?format=json")
+
+        if rootRequest.status_code == 200:
+            # Remove search directory from list (not used)
+            allDirectories = list(rootRequest.json().keys())
+            allDirectories.remove("search")
+            ROOT_CACHE.put(None, allDirectories)
+            rootSpan.set(directories=len(allDirectories))
+            return list(allDirectories)
+        else:
+            # Throw if Root request wasn't successful
+            LOGGER.error(f"API Request to Open5e root directory FAILED. Code: {rootRequest.status_code}")
+            return rootRequest.status_code
@@ -0,0 +1,103 @@
+"""
+# Project: oghma
+# Author: M-Davies
+# https://github.com/M-Davies/oghma
+"""
+
+import config
+from dice import rollCalculation
+from logger import AUDIT_LOGGER
+
+import logging
+import secrets
+import random
+import glob
+import json
+import time
+import sys
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+
+def newSeed():
+    """
+    FUNC NAME: newSeed
+    FUNC DESC: Generates a fresh seed for a roll
+    FUNC TYPE: Function
+    """
+    return secrets.randbits(config.ROLL_SEED_BITS)
+
+
+def seededRoll(calculation: str, seed: int, repeats: int = 1):
+    """
+    FUNC NAME: seededRoll
+    FUNC DESC: Rolls a calculation with its own RNG stream created from seed, so the same seed always gives the same rolls
+    FUNC TYPE: Function
+    """
+    return rollCalculation(calculation, random.Random(seed), repeats)
+
+
+def recordRoll(seed: int, calculation: str, repeats: int, totals: list):
+    """
+    FUNC NAME: recordRoll
+    FUNC DESC: Appends a roll to the audit log as a single line of JSON. No user information is stored, the seed identifies the roll.
+               The line is queued for the audit log's writer thread (see logger.setupAuditLogging), so this never blocks
+    FUNC TYPE: Function
+    """
+    auditEntry = json.dumps({"t": round(time.time()), "s": seed, "c": calculation, "r": repeats, "x": totals}, separators=(",", ":"))
+    AUDIT_LOGGER.info(auditEntry)
+
+
+def findRolls(seed: int):
+    """
+    FUNC NAME: findRolls
+    FUNC DESC: Yields every audit log entry for a seed, searching every process' audit logs (rotated ones included) from the most recently written
+    FUNC TYPE: Function
+    """
+    auditFiles = sorted(glob.glob(config.AUDIT_LOG_FILES), key=os.path.getmtime, reverse=True)
+
+    # Only parse lines that could be for this seed, the rest are skipped without decoding them
+    seedField = f'"s":{seed},'
+    for auditFileName in auditFiles:
+        try:
+            with open(auditFileName, "r", encoding="utf-8") as auditFile:
+                for line in auditFile:
+                    if seedField in line:
+                        auditEntry = json.loads(line)
+                        if auditEntry["s"] == seed:
+                            yield auditEntry
+        except (OSError, ValueError) as readError:
+            LOGGER.warning(f"Failed to read audit log {auditFileName}: {readError}")
+
+
+def findRoll(seed: int):
+    """
+    FUNC NAME: findRoll
+    FUNC DESC: Returns the newest audit log entry for a seed, or None if it was never rolled
+    FUNC TYPE: Function
+    """
+    return next(findRolls(seed), None)
+
+
+def verifyRoll(auditEntry: dict):
+    """
+    FUNC NAME: verifyRoll
+    FUNC DESC: Replays an audit log entry and checks it still produces the recorded totals
+    FUNC TYPE: Function
+    """
+    totals, _ = seededRoll(auditEntry["c"], auditEntry["s"], auditEntry["r"])
+    return totals == auditEntry["x"]
+
+
+if __name__ == "__main__":
+    # Usage: python audit.py SEED
+    if len(sys.argv) != 2 or not sys.argv[1].isdigit():
+        sys.exit("Usage: python audit.py SEED")
+
+    auditEntries = list(findRolls(int(sys.argv[1])))
+    if auditEntries == []:
+        sys.exit(f"No rolls found for seed {sys.argv[1]} in {config.AUDIT_LOG_FILES}")
+
+    for auditEntry in auditEntries:
+        print(f"{time.strftime('%d-%m-%Y %H:%M:%S', time.localtime(auditEntry['t']))} | /roll {auditEntry['c']} (x{auditEntry['r']}) = {auditEntry['x']} | {'VERIFIED' if verifyRoll(auditEntry) else 'MISMATCH'}")
@@ -0,0 +1,235 @@
+"""
+# Project: oghma
+# Author: M-Davies
+# https://github.com/M-Davies/oghma
+"""
+
+# Offline benchmarks for the hot paths of the bot, run against the fixtures in benchmarks/fixtures. No network is used.
+# Usage:
+#   python benchmarks/benchmark.py                   Run every benchmark and print the results
+#   python benchmarks/benchmark.py --save-baseline   ...and store them as the baseline to compare against
+#   python benchmarks/benchmark.py --compare         ...and fail if any benchmark is slower than the baseline by more than --threshold
+
+import os
+import sys
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, "fixtures")
+BASELINE_FILE = os.path.join(BENCHMARK_DIRECTORY, "baseline.json")
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIRECTORY))
+
+import config
+import cache
+import api
+from utils import constructResponse, collectResponse, constructRollResponse
+from dice import parseNormalisedCalculation
+from audit import seededRoll
+
+from urllib.parse import urlsplit, parse_qs
+from types import SimpleNamespace
+import statistics
+import tracemalloc
+import argparse
+import tempfile
+import shutil
+import json
+import gzip
+import time
+
+# Each round of a benchmark runs it enough times to take at least this long, so quick benchmarks aren't all timer noise
+MIN_ROUND_SECONDS = 0.05
+
+
+def loadFixture(fileName: str):
+    """
+    FUNC NAME: loadFixture
+    FUNC DESC: Loads a (optionally gzipped) JSON fixture
+    FUNC TYPE: Function
+    """
+    fixturePath = os.path.join(FIXTURE_DIRECTORY, fileName)
+    openFixture = gzip.open if fileName.endswith(".gz") else open
+    with openFixture(fixturePath, "rt", encoding="utf-8") as fixtureFile:
+        return json.load(fixtureFile)
+
+
+class FixtureResponse:
+    """
+    Stands in for a requests.Response built from a fixture
+    """
+    def __init__(self, statusCode: int, body: dict):
+        self.status_code = statusCode
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+def serveFixture(query: str):
+    """
+    FUNC NAME: serveFixture
+    FUNC DESC: Answers an upstream request from the fixtures, in place of api.getUpstream
+    FUNC TYPE: Function
+    """
+    url = urlsplit(query)
+    if url.hostname == "api.scryfall.com":
+        return FixtureResponse(200, FIXTURES["scryfall"])
+
+    # Directory requests are answered with the fixture search results that live in that directory
+    directory = url.path.strip("/").split("/")[0]
+    results = FIXTURES["search"]["results"]
+    if directory not in ("", "search"):
+        parameters = parse_qs(url.query)
+        filterWord = (parameters.get("search") or parameters.get("text") or [""])[0]
+        results = [result for result in results if result["route"] == f"{directory}/" and filterWord.lower() in result.get("name", result.get("title", "")).lower()]
+    return FixtureResponse(200, {"count": len(results), "results": results})
+
+
+def freshCaches():
+    """
+    FUNC NAME: freshCaches
+    FUNC DESC: Swaps in an empty cache store so lookups benchmark the work rather than a cache hit
+    FUNC TYPE: Function
+    """
+    cache.useSharedStore(cache.CacheStore())
+
+
+def benchmarkCases():
+    """
+    FUNC NAME: benchmarkCases
+    FUNC DESC: Returns every benchmark as (name, function to time)
+    FUNC TYPE: Function
+    """
+    searchResults = FIXTURES["search"]["results"]
+    entities = FIXTURES["entities"]
+    author = SimpleNamespace(name="benchmark", display_avatar="https://i.imgur.com/HxuMICy.jpg")
+
+    cases = [
+        ("searchResponse/exact", lambda: api.searchResponse(searchResults, "adultblackdragon")),
+        ("searchResponse/partial", lambda: api.searchResponse(searchResults, "dragon")),
+        ("requestOpen5e/wide", lambda: api.requestOpen5e("https://api.open5e.com/search/?format=json&limit=10000&text=adult", "adultblackdragon", True, False)),
+        ("requestOpen5e/list", lambda: api.requestOpen5e("https://api.open5e.com/search/?format=json&limit=10000&text=shadow", "shadow", False, True)),
+        ("requestScryfall/uncached", lambda: (freshCaches(), api.requestScryfall(["adult", "black", "dragon"]))),
+    ]
+    for route, entity in entities.items():
+        cases.append((f"constructResponse/{route}", lambda route=route, entity=entity: collectResponse(constructResponse(entity.get("name", entity.get("title")), route, entity))))
+    for calculation, repeats in config.BENCHMARK_ROLLS:
+        cases.append((f"roll/{calculation} x{repeats}", lambda calculation=calculation, repeats=repeats: seededRoll(calculation, 1234, repeats)))
+        cases.append((f"constructRollResponse/{calculation} x{repeats}", lambda calculation=calculation, repeats=repeats: constructRollResponse(calculation, 1234, *seededRoll(calculation, 1234, repeats), author)))
+    cases.append(("parseCalculation/uncached", lambda: parseNormalisedCalculation.__wrapped__("(2d20kh1 + 5) * 2 - 1d4r1 + 3d6!")))
+    return cases
+
+
+def runBenchmark(benchmark, rounds: int):
+    """
+    FUNC NAME: runBenchmark
+    FUNC DESC: Times a benchmark over several rounds, returning seconds per call (median & best) and the memory one call allocates
+    FUNC TYPE: Function
+    """
+    # Warm up & find out how many calls make a round long enough to time
+    benchmark()
+    calls = 1
+    while True:
+        roundStart = time.perf_counter()
+        for _ in range(calls):
+            benchmark()
+        if time.perf_counter() - roundStart >= MIN_ROUND_SECONDS or calls >= 1000000:
+            break
+        calls *= 2
+
+    timings = []
+    for _ in range(rounds):
+        roundStart = time.perf_counter()
+        for _ in range(calls):
+            benchmark()
+        timings.append((time.perf_counter() - roundStart) / calls)
+
+    tracemalloc.start()
+    benchmark()
+    _, peakBytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"median": statistics.median(timings), "best": min(timings), "calls": calls, "peakBytes": peakBytes}
+
+
+def compareResults(results: dict, baseline: dict, threshold: float):
+    """
+    FUNC NAME: compareResults
+    FUNC DESC: Returns the benchmarks whose median time grew by more than threshold (a fraction) over the baseline
+    FUNC TYPE: Function
+    """
+    regressions = []
+    for name, result in results.items():
+        if name in baseline and result["median"] > baseline[name]["median"] * (1 + threshold):
+            regressions.append((name, baseline[name]["median"], result["median"]))
+    return regressions
+
+
+def formatSeconds(seconds: float):
+    """
+    FUNC NAME: formatSeconds
+    FUNC DESC: Formats a duration with a unit suited to its size
+    FUNC TYPE: Function
+    """
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+FIXTURES = {
+    "entities": loadFixture("open5e-entities.json"),
+    "search": loadFixture("open5e-search.json.gz"),
+    "scryfall": loadFixture("scryfall-search.json")
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Runs the offline benchmarks")
+    parser.add_argument("--filter", default="", help="Only run benchmarks whose name contains this")
+    parser.add_argument("--rounds", type=int, default=config.BENCHMARK_ROUNDS, help="Timed rounds per benchmark")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the new baseline")
+    parser.add_argument("--compare", action="store_true", help="Fail if any benchmark regressed against the baseline")
+    parser.add_argument("--threshold", type=float, default=config.BENCHMARK_REGRESSION_THRESHOLD, help="Allowed slowdown before failing, as a fraction (0.25 = 25%%)")
+    arguments = parser.parse_args()
+
+    # Never touch the network & keep generated files out of the repo. Files go to $CWD + "data", so run from inside a scratch directory
+    outputPath = os.path.abspath(arguments.output) if arguments.output else None
+    api.getUpstream = serveFixture
+    scratchDirectory = tempfile.mkdtemp(prefix="oghma-benchmark-")
+    os.makedirs(os.path.join(scratchDirectory, "run"))
+    os.makedirs(os.path.join(scratchDirectory, "rundata"))
+    os.chdir(os.path.join(scratchDirectory, "run"))
+    freshCaches()
+
+    results = {}
+    try:
+        print(f"{'BENCHMARK':<48} {'MEDIAN':>10} {'BEST':>10} {'PEAK MEMORY':>12}")
+        for name, benchmark in benchmarkCases():
+            if arguments.filter not in name:
+                continue
+            results[name] = runBenchmark(benchmark, arguments.rounds)
+            print(f"{name:<48} {formatSeconds(results[name]['median']):>10} {formatSeconds(results[name]['best']):>10} {results[name]['peakBytes'] / 1024:>9.1f}KiB")
+    finally:
+        os.chdir(BENCHMARK_DIRECTORY)
+        shutil.rmtree(scratchDirectory, ignore_errors=True)
+
+    if outputPath:
+        with open(outputPath, "w") as outputFile:
+            json.dump(results, outputFile, indent=2)
+
+    if arguments.save_baseline:
+        with open(BASELINE_FILE, "w") as baselineFile:
+            json.dump(results, baselineFile, indent=2, sort_keys=True)
+        print(f"Saved baseline to {BASELINE_FILE}")
+
+    if arguments.compare:
+        if not os.path.exists(BASELINE_FILE):
+            sys.exit(f"No baseline at {BASELINE_FILE}, create one with --save-baseline")
+        with open(BASELINE_FILE, "r") as baselineFile:
+            regressions = compareResults(results, json.load(baselineFile), arguments.threshold)
+        for name, baselineMedian, median in regressions:
+            print(f"REGRESSION: {name} took {formatSeconds(median)}, baseline {formatSeconds(baselineMedian)} ({median / baselineMedian - 1:+.0%})")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {arguments.threshold:.0%}")
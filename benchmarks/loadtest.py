@@ -0,0 +1,373 @@
+"""
+# Project: oghma
+# Author: M-Davies
+# https://github.com/M-Davies/oghma
+"""
+
+# End to end load test. Runs the command handlers in client.py with fake interactions against a local stand-in for Open5e & Scryfall,
+# reporting throughput & latency percentiles at each concurrency level. No bot key or network is used.
+# Usage:
+#   python benchmarks/loadtest.py --command search --concurrency 1,8,32 --latency 0.1
+#   python benchmarks/loadtest.py --serve-only --port 8080   Just run the stand-in, e.g. to point a real bot at with OPEN5E_API_URL & SCRYFALL_API_URL
+
+import os
+import sys
+
+from benchmark import FIXTURES, freshCaches, BENCHMARK_DIRECTORY
+
+import config
+import client
+from metrics import UPSTREAM_RESPONSES, DUPLICATE_RESPONSES
+from lanes import shutdownLanes
+from tracing import startTrace, finishTrace, stopTracing
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+from types import SimpleNamespace
+import multiprocessing
+import statistics
+import argparse
+import tempfile
+import logging
+import asyncio
+import shutil
+import random
+import json
+import itertools
+import time
+
+# Ids for channels no other command has been sent in
+UNIQUE_CHANNELS = itertools.count(1000000)
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """
+    Impersonates the parts of api.open5e.com (at /) and api.scryfall.com (at /scryfall) the bot uses, answering from the fixtures
+    with the latency, errors & payload size given to serveStandIn
+    """
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        options = self.server.options
+        time.sleep(options.latency + random.uniform(0, options.jitter))
+
+        if random.random() < options.error_rate:
+            self.sendJson(503, {"detail": "Stand-in error"})
+            return
+
+        url = urlsplit(self.path)
+        parameters = parse_qs(url.query)
+        if url.path.startswith("/scryfall/cards/search"):
+            self.sendJson(200, FIXTURES["scryfall"])
+            return
+
+        directory = url.path.strip("/").split("/")[0]
+        if directory == "":
+            self.sendJson(200, self.server.root)
+            return
+        if directory == "search":
+            results = self.server.searchResults
+            filterWord = parameters.get("text", [""])[0]
+        elif directory in self.server.directories:
+            results = self.server.directories[directory]
+            filterWord = (parameters.get("search") or parameters.get("text") or [""])[0]
+        else:
+            self.sendJson(404, {"detail": "Not found."})
+            return
+
+        results = [result for result in results if filterWord.lower() in result.get("name", result.get("title", "")).lower()] * options.payload_scale
+        self.sendJson(200, {"count": len(results), "next": None, "previous": None, "results": results})
+
+    def sendJson(self, statusCode: int, body: dict):
+        encodedBody = json.dumps(body).encode("utf-8")
+        self.send_response(statusCode)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(encodedBody)))
+        self.end_headers()
+        self.wfile.write(encodedBody)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def buildDirectories():
+    """
+    FUNC NAME: buildDirectories
+    FUNC DESC: Builds full directory listings from the search fixture, each result filled out with the fields of its directory's example entity
+    FUNC TYPE: Function
+    """
+    directories = {}
+    for result in FIXTURES["search"]["results"]:
+        directory = result["route"].strip("/")
+        if directory in FIXTURES["entities"]:
+            directories.setdefault(directory, []).append({**FIXTURES["entities"][directory], **result})
+    return directories
+
+
+def serveStandIn(options: argparse.Namespace, portPipe=None):
+    """
+    FUNC NAME: serveStandIn
+    FUNC DESC: Serves the stand-in APIs until killed. Runs in its own process so serving doesn't compete with the bot for the GIL
+    FUNC TYPE: Function
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", options.port), StandInHandler)
+    server.daemon_threads = True
+    server.options = options
+    server.searchResults = FIXTURES["search"]["results"]
+    server.directories = buildDirectories()
+    server.root = {directory: f"http://127.0.0.1:{server.server_address[1]}/{directory}/" for directory in [*server.directories, "search"]}
+    if portPipe is not None:
+        portPipe.send(server.server_address[1])
+    else:
+        print(f"Serving Open5e on http://127.0.0.1:{server.server_address[1]} and Scryfall on http://127.0.0.1:{server.server_address[1]}/scryfall")
+    server.serve_forever()
+
+
+class FakeResponse:
+    """
+    Stands in for discord.InteractionResponse, recording what the handler did with it
+    """
+    def __init__(self, interaction):
+        self.interaction = interaction
+        self.deferred = False
+
+    async def defer(self, **kwargs):
+        self.deferred = True
+
+    async def send_message(self, **kwargs):
+        self.interaction.recordMessage(kwargs)
+
+
+class FakeMessage:
+    """
+    Stands in for a discord.WebhookMessage sent as a followup
+    """
+    def __init__(self, interaction, message: dict):
+        self.interaction = interaction
+        self.message = message
+        self.id = len(interaction.messages)
+        self.jump_url = f"https://discord.com/channels/{interaction.guild_id}/{interaction.channel_id}/{self.id}"
+
+    async def edit(self, **kwargs):
+        self.message.update(kwargs)
+        self.interaction.edits += 1
+
+
+class FakeFollowup:
+    """
+    Stands in for discord.Webhook, the interaction's followup
+    """
+    def __init__(self, interaction):
+        self.interaction = interaction
+
+    async def send(self, **kwargs):
+        self.interaction.recordMessage(kwargs)
+        return FakeMessage(self.interaction, kwargs)
+
+
+class FakeInteraction:
+    """
+    Stands in for a discord.Interaction, with enough of its attributes for the command handlers in client.py
+    """
+    def __init__(self, commandName: str, options: dict, guildId: int, channelId: int, userId: int):
+        self.command = SimpleNamespace(name=commandName)
+        self.namespace = SimpleNamespace(**options)
+        self.extras = {}
+        self.guild = None
+        self.guild_id = guildId
+        self.channel_id = channelId
+        self.user = SimpleNamespace(id=userId, name=f"user{userId}", display_name=f"User {userId}", display_avatar="https://i.imgur.com/HxuMICy.jpg")
+        self.response = FakeResponse(self)
+        self.followup = FakeFollowup(self)
+        self.messages = []
+        self.edits = 0
+        self.created = time.perf_counter()
+        self.firstMessageAt = None
+
+    def recordMessage(self, message: dict):
+        if self.firstMessageAt is None:
+            self.firstMessageAt = time.perf_counter()
+        self.messages.append(message)
+
+
+def commandPool(commandName: str, distinctEntities: int):
+    """
+    FUNC NAME: commandPool
+    FUNC DESC: Picks the (command name, options) pairs the load test will run, drawn from distinctEntities entities in the fixtures
+    FUNC TYPE: Function
+    """
+    generator = random.Random(0)
+    entities = [result for result in FIXTURES["search"]["results"] if result["route"].strip("/") in FIXTURES["entities"]]
+    pool = []
+    for entity in generator.sample(entities, min(distinctEntities, len(entities))):
+        # Search terms keep their spaces, so ask for one word of the name like a user would
+        searchTerm = max(entity.get("name", entity.get("title")).split(" "), key=len)
+        directory = entity["route"].strip("/")
+        chosenCommand = generator.choice(["search", "searchdir", "lst"]) if commandName == "mix" else commandName
+        if chosenCommand == "search":
+            pool.append(("search", {"entityInput": searchTerm}))
+        elif chosenCommand == "searchdir":
+            pool.append(("searchdir", {"directoryInput": directory, "entityInput": searchTerm}))
+        else:
+            pool.append(("lst", {"entityInput": searchTerm, "directoryInput": directory}))
+    return pool
+
+
+async def runCommand(commandName: str, options: dict, channelId: int):
+    """
+    FUNC NAME: runCommand
+    FUNC DESC: Runs one command's handler with a fake interaction in a channel, returning the interaction & any error it raised.
+               Commands are sampled for tracing like the bot does before calling a handler
+    FUNC TYPE: Function
+    """
+    interaction = FakeInteraction(commandName, options, random.randrange(1, 100), channelId, random.randrange(1, 10000))
+    trace = startTrace(commandName, guild=interaction.guild_id, options=options)
+    outcome = "ok"
+    try:
+        await client.CLIENT.tree.get_command(commandName).callback(interaction, **options)
+        return interaction, None
+    except Exception as commandError:
+        outcome = "error"
+        return interaction, commandError
+    finally:
+        if trace is not None:
+            finishTrace(trace, outcome)
+
+
+async def runLevel(pool: list, concurrency: int, commands: int, channels: list):
+    """
+    FUNC NAME: runLevel
+    FUNC DESC: Runs commands commands from the pool, concurrency at a time, returning the results for that level.
+               Each command is sent in a random channel from channels, or a channel of its own if there are none
+    FUNC TYPE: Function
+    """
+    generator = random.Random(concurrency)
+    queue = [(*generator.choice(pool), generator.choice(channels) if channels else next(UNIQUE_CHANNELS)) for _ in range(commands)]
+    latencies = []
+    firstMessageLatencies = []
+    errors = 0
+
+    async def worker():
+        nonlocal errors
+        while queue:
+            commandName, options, channelId = queue.pop()
+            interaction, commandError = await runCommand(commandName, options, channelId)
+            latencies.append(time.perf_counter() - interaction.created)
+            if interaction.firstMessageAt is not None:
+                firstMessageLatencies.append(interaction.firstMessageAt - interaction.created)
+            if commandError is not None or any(message.get("embed") is not None and (message["embed"].title or "").startswith("ERROR") for message in interaction.messages):
+                errors += 1
+
+    upstreamBefore = sum(UPSTREAM_RESPONSES.values.values())
+    duplicatesBefore = sum(DUPLICATE_RESPONSES.values.values())
+    levelStart = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - levelStart
+    # Scryfall pictures & request counts are handled after the commands finish, don't let them spill over into the next level
+    await asyncio.gather(*client.THUMBNAIL_TASKS, *client.BACKGROUND_TASKS)
+
+    return {
+        "concurrency": concurrency,
+        "commands": commands,
+        "errors": errors,
+        "upstreamRequests": sum(UPSTREAM_RESPONSES.values.values()) - upstreamBefore,
+        "duplicates": sum(DUPLICATE_RESPONSES.values.values()) - duplicatesBefore,
+        "throughput": commands / elapsed,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "firstMessageP50": percentile(firstMessageLatencies, 50)
+    }
+
+
+def percentile(values: list, rank: int):
+    """
+    FUNC NAME: percentile
+    FUNC DESC: Returns the rank-th percentile of values (0 if there are none)
+    FUNC TYPE: Function
+    """
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method="inclusive")[rank - 1]
+
+
+async def runLoadTest(arguments: argparse.Namespace):
+    """
+    FUNC NAME: runLoadTest
+    FUNC DESC: Runs every concurrency level, printing each level's results as it finishes
+    FUNC TYPE: Function
+    """
+    pool = commandPool(arguments.command, arguments.distinct)
+    results = []
+    print(f"{'CONCURRENCY':>11} {'COMMANDS':>9} {'ERRORS':>7} {'UPSTREAM':>9} {'DUPES':>6} {'CMD/S':>8} {'P50':>8} {'P95':>8} {'P99':>8} {'FIRST P50':>10}")
+    for concurrency in arguments.concurrency:
+        # Cold levels also get new channels, so nothing is answered from a command sent in an earlier level
+        channels = list(range(1, arguments.channels + 1))
+        if not arguments.warm:
+            freshCaches()
+            channels = [next(UNIQUE_CHANNELS) for _ in range(arguments.channels)]
+        result = await runLevel(pool, concurrency, arguments.commands, channels)
+        results.append(result)
+        print(
+            f"{result['concurrency']:>11} {result['commands']:>9} {result['errors']:>7} {result['upstreamRequests']:>9} {result['duplicates']:>6} {result['throughput']:>8.1f} "
+            f"{result['p50']:>8.3f} {result['p95']:>8.3f} {result['p99']:>8.3f} {result['firstMessageP50']:>10.3f}"
+        )
+    shutdownLanes()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load tests the command handlers against a local stand-in for Open5e & Scryfall")
+    parser.add_argument("--command", choices=["search", "searchdir", "lst", "mix"], default="search", help="Which command to run, mix picks one per entity")
+    parser.add_argument("--concurrency", type=lambda levels: [int(level) for level in levels.split(",")], default=config.LOADTEST_CONCURRENCY, help="Comma separated concurrency levels")
+    parser.add_argument("--commands", type=int, default=config.LOADTEST_COMMANDS, help="Commands to run at each level")
+    parser.add_argument("--distinct", type=int, default=config.LOADTEST_DISTINCT_ENTITIES, help="How many different entities the commands ask for")
+    parser.add_argument("--channels", type=int, default=0, help="Send the commands in this many channels so repeats are answered as duplicates, 0 gives every command its own channel")
+    parser.add_argument("--warm", action="store_true", help="Keep the caches between levels instead of starting each level cold")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds the stand-in waits before answering")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many seconds are randomly added to --latency")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests the stand-in fails with a 503")
+    parser.add_argument("--payload-scale", type=int, default=1, help="Repeat every listing's results this many times to make payloads bigger")
+    parser.add_argument("--port", type=int, default=0, help="Port for the stand-in, 0 picks a free one")
+    parser.add_argument("--serve-only", action="store_true", help="Only run the stand-in")
+    parser.add_argument("--trace-rate", type=float, default=0.0, help=f"Fraction of commands to trace, traces are written to {config.TRACE_DIRECTORY}")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--verbose", action="store_true", help="Show the bot's logs")
+    arguments = parser.parse_args()
+
+    if arguments.serve_only:
+        serveStandIn(arguments)
+        sys.exit(0)
+
+    receivePort, sendPort = multiprocessing.Pipe(duplex=False)
+    standIn = multiprocessing.Process(target=serveStandIn, args=(arguments, sendPort), daemon=True)
+    standIn.start()
+    standInPort = receivePort.recv()
+    config.OPEN5E_API_URL = f"http://127.0.0.1:{standInPort}"
+    config.SCRYFALL_API_URL = f"http://127.0.0.1:{standInPort}/scryfall"
+
+    if arguments.verbose:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s: %(levelname)s: %(name)s: %(message)s")
+    else:
+        logging.getLogger().setLevel(logging.CRITICAL)
+
+    # Keep generated files out of the repo. Files go to $CWD + "data", so run from inside a scratch directory
+    outputPath = os.path.abspath(arguments.output) if arguments.output else None
+    scratchDirectory = tempfile.mkdtemp(prefix="oghma-loadtest-")
+    os.makedirs(os.path.join(scratchDirectory, "run"))
+    os.makedirs(os.path.join(scratchDirectory, "rundata"))
+    os.chdir(os.path.join(scratchDirectory, "run"))
+    config.DATA_DIRECTORY = os.path.join(scratchDirectory, "")
+    config.POPULARITY_FILE = os.path.join(scratchDirectory, "popularity.json")
+    config.TRACE_SAMPLE_RATE = arguments.trace_rate
+
+    try:
+        results = asyncio.run(runLoadTest(arguments))
+    finally:
+        stopTracing()
+        os.chdir(BENCHMARK_DIRECTORY)
+        shutil.rmtree(scratchDirectory, ignore_errors=True)
+        standIn.terminate()
+
+    if outputPath:
+        with open(outputPath, "w") as outputFile:
+            json.dump(results, outputFile, indent=2)
@@ -0,0 +1,122 @@
+"""
+# Project: oghma
+# Author: M-Davies
+# https://github.com/M-Davies/oghma
+"""
+
+# Re-records the upstream fixtures from the live APIs, then rebuilds the benchmark fixtures from them so benchmarks & load tests run
+# against the real shapes of Open5e & Scryfall data.
+# Usage:
+#   python benchmarks/refresh.py                  Re-record every fixture (plus the ones the benchmarks need) and rebuild the benchmark fixtures
+#   python benchmarks/refresh.py --rebuild-only   Just rebuild the benchmark fixtures from the recordings already on disk
+
+import os
+import sys
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, "fixtures")
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIRECTORY))
+
+import config
+import api
+from replay import fixturePath, loadRecording, recordedQueries
+
+import argparse
+import requests
+import gzip
+import json
+
+# The Scryfall search the benchmarks time
+SCRYFALL_SEARCH_TERM = "adult black dragon"
+
+
+def defaultQueries():
+    """
+    FUNC NAME: defaultQueries
+    FUNC DESC: Returns the requests the benchmark fixtures are built from: the root, the whole search/ directory, every other directory & a Scryfall search
+    FUNC TYPE: Function
+    """
+    rootQuery = f"{config.OPEN5E_API_URL}?format=json"
+    queries = [rootQuery, f"{config.OPEN5E_API_URL}/search/?format=json&limit=10000", api.scryfallSearchUrl(SCRYFALL_SEARCH_TERM)]
+    queries += [f"{config.OPEN5E_API_URL}/{directory}/?format=json&limit=10000" for directory in FIXTURE_DIRECTORIES]
+    return queries
+
+
+def recordQueries(queries: list):
+    """
+    FUNC NAME: recordQueries
+    FUNC DESC: Sends every request upstream in record mode, so each response replaces its fixture. Failed requests keep their old fixture
+    FUNC TYPE: Function
+    """
+    config.UPSTREAM_MODE = "record"
+    failures = 0
+    for query in dict.fromkeys(queries):
+        try:
+            response = api.getUpstream(query)
+            print(f"{response.status_code} {query}")
+        except requests.RequestException as requestError:
+            failures += 1
+            print(f"FAILED {query}: {requestError}")
+    return failures
+
+
+def recordedBody(query: str):
+    """
+    FUNC NAME: recordedBody
+    FUNC DESC: Returns the parsed body of a successful recorded response, or None if it wasn't recorded or failed
+    FUNC TYPE: Function
+    """
+    try:
+        recording = loadRecording(fixturePath(query))
+    except FileNotFoundError:
+        return None
+    return json.loads(recording["body"]) if recording["status"] == 200 else None
+
+
+def rebuildBenchmarkFixtures():
+    """
+    FUNC NAME: rebuildBenchmarkFixtures
+    FUNC DESC: Rewrites the benchmark fixtures from the recordings. Each directory keeps its example entity if it still exists, otherwise the first one is used
+    FUNC TYPE: Function
+    """
+    searchListing = recordedBody(f"{config.OPEN5E_API_URL}/search/?format=json&limit=10000")
+    if searchListing is not None:
+        with gzip.open(os.path.join(FIXTURE_DIRECTORY, "open5e-search.json.gz"), "wt", encoding="utf-8") as searchFile:
+            json.dump(searchListing, searchFile)
+        print(f"Rebuilt open5e-search.json.gz with {len(searchListing['results'])} results")
+
+    entities = {}
+    for directory, example in EXAMPLE_ENTITIES.items():
+        listing = recordedBody(f"{config.OPEN5E_API_URL}/{directory}/?format=json&limit=10000")
+        if listing is None or len(listing["results"]) == 0:
+            entities[directory] = example
+            continue
+        entities[directory] = next((apiEntity for apiEntity in listing["results"] if apiEntity.get("slug") == example.get("slug")), listing["results"][0])
+    with open(os.path.join(FIXTURE_DIRECTORY, "open5e-entities.json"), "w", encoding="utf-8") as entitiesFile:
+        json.dump(entities, entitiesFile, indent=2)
+    print(f"Rebuilt open5e-entities.json with {len(entities)} entities")
+
+    scryfallSearch = recordedBody(api.scryfallSearchUrl(SCRYFALL_SEARCH_TERM))
+    if scryfallSearch is not None:
+        with open(os.path.join(FIXTURE_DIRECTORY, "scryfall-search.json"), "w", encoding="utf-8") as scryfallFile:
+            json.dump(scryfallSearch, scryfallFile, indent=2)
+        print("Rebuilt scryfall-search.json")
+
+
+# Only directories the bot can render get an example entity
+with open(os.path.join(FIXTURE_DIRECTORY, "open5e-entities.json"), "r", encoding="utf-8") as exampleFile:
+    EXAMPLE_ENTITIES = json.load(exampleFile)
+FIXTURE_DIRECTORIES = list(EXAMPLE_ENTITIES)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-records the upstream fixtures and rebuilds the benchmark fixtures from them")
+    parser.add_argument("--rebuild-only", action="store_true", help="Don't touch the network, just rebuild the benchmark fixtures from the recordings")
+    arguments = parser.parse_args()
+
+    failures = 0
+    if not arguments.rebuild_only:
+        failures = recordQueries(defaultQueries() + recordedQueries())
+    rebuildBenchmarkFixtures()
+    if failures:
+        sys.exit(f"{failures} requests failed, their old fixtures were kept")
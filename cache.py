@@ -0,0 +1,446 @@
+import config
+from utils import constructResponse, collectResponse
+from metrics import CACHE_EVENTS, Gauge, registerMetric
+from logger import noteCommandField
+from deadline import checkDeadline
+from tracing import traceSpan
+
+from multiprocessing.managers import BaseManager
+from collections import OrderedDict
+import threading
+import heapq
+import logging
+import json
+import time
+import sys
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+
+class BudgetedEntries:
+    """
+    Entries of a namespace limited by roughly how much memory they take up. Entries are split into groups that each keep their own
+    least recently used order, and the group using the most memory gives up entries first. Pinned keys are only evicted once nothing else is left
+    """
+    def __init__(self):
+        self.groups = {}
+        self.groupBytes = {}
+        self.evictions = {}
+        self.keyGroups = {}
+        self.pinned = set()
+        self.totalBytes = 0
+
+    def get(self, key):
+        group = self.keyGroups.get(key)
+        if group is None:
+            return None
+        self.groups[group].move_to_end(key)
+        return self.groups[group][key][1]
+
+    def remove(self, key):
+        group = self.keyGroups.pop(key)
+        size, _ = self.groups[group].pop(key)
+        self.groupBytes[group] -= size
+        self.totalBytes -= size
+        return group
+
+    def put(self, key, value, size: int, group: str, budget: int):
+        if key in self.keyGroups:
+            self.remove(key)
+        # Something bigger than the whole budget would just evict everything else
+        if size > budget:
+            return 0
+        self.groups.setdefault(group, OrderedDict())[key] = (size, value)
+        self.groupBytes[group] = self.groupBytes.get(group, 0) + size
+        self.keyGroups[key] = group
+        self.totalBytes += size
+
+        evicted = 0
+        while self.totalBytes > budget:
+            victim = self.findVictim(key)
+            if victim is None:
+                break
+            victimGroup = self.remove(victim)
+            self.evictions[victimGroup] = self.evictions.get(victimGroup, 0) + 1
+            evicted += 1
+        return evicted
+
+    def findVictim(self, newKey):
+        for evictPinned in (False, True):
+            for group in sorted(self.groups, key=self.groupBytes.get, reverse=True):
+                for key in self.groups[group]:
+                    if key != newKey and (evictPinned or key not in self.pinned):
+                        return key
+        return None
+
+    def usage(self):
+        return {
+            group: {"bytes": self.groupBytes[group], "entries": len(entries), "pinned": len(self.pinned.intersection(entries)), "evictions": self.evictions.get(group, 0)}
+            for group, entries in self.groups.items()
+        }
+
+
+class CacheStore:
+    """
+    Thread safe key-value store split into namespaces, each evicting its least recently used entries once full.
+    Budgeted namespaces are limited by memory rather than entries instead.
+    launcher.py serves one of these to every shard process so they share cached Open5e & Scryfall data
+    """
+    def __init__(self):
+        self.namespaces = {}
+        self.budgeted = {}
+        self.lock = threading.Lock()
+
+    def get(self, namespace: str, key):
+        with self.lock:
+            entries = self.namespaces.get(namespace)
+            if entries is None or key not in entries:
+                return None
+            entries.move_to_end(key)
+            return entries[key]
+
+    def put(self, namespace: str, key, value, maxEntries: int = None):
+        """
+        Stores a value, returning how many entries were evicted to make room for it
+        """
+        evicted = 0
+        with self.lock:
+            entries = self.namespaces.setdefault(namespace, OrderedDict())
+            entries[key] = value
+            entries.move_to_end(key)
+            while maxEntries is not None and len(entries) > maxEntries:
+                entries.popitem(last=False)
+                evicted += 1
+        return evicted
+
+    def increment(self, namespace: str, key, amount: int = 1):
+        with self.lock:
+            entries = self.namespaces.setdefault(namespace, OrderedDict())
+            entries[key] = entries.get(key, 0) + amount
+
+    def snapshot(self, namespace: str):
+        with self.lock:
+            return dict(self.namespaces.get(namespace, {}))
+
+    def top(self, namespace: str, limit: int):
+        """
+        Returns the limit (key, value) pairs with the highest values (like request counts), highest first.
+        Among equal values the most recently added keys come first
+        """
+        with self.lock:
+            entries = self.namespaces.get(namespace, {})
+            return heapq.nlargest(limit, reversed(entries.items()), key=lambda item: item[1])
+
+    def trim(self, namespace: str, keep: int):
+        """
+        Drops every entry but the keep with the highest values, returning how many were dropped
+        """
+        with self.lock:
+            entries = self.namespaces.get(namespace)
+            if entries is None or len(entries) <= keep:
+                return 0
+            kept = heapq.nlargest(keep, reversed(entries.items()), key=lambda item: item[1])
+            dropped = len(entries) - len(kept)
+            self.namespaces[namespace] = OrderedDict(reversed(kept))
+            return dropped
+
+    def getBudgeted(self, namespace: str, key):
+        with self.lock:
+            entries = self.budgeted.get(namespace)
+            return None if entries is None else entries.get(key)
+
+    def putBudgeted(self, namespace: str, key, value, size: int, group: str, budget: int):
+        """
+        Stores a value taking up roughly size bytes in a group of a budgeted namespace, returning how many entries were evicted to make room for it
+        """
+        with self.lock:
+            return self.budgeted.setdefault(namespace, BudgetedEntries()).put(key, value, size, group, budget)
+
+    def pinBudgeted(self, namespace: str, keys: list):
+        """
+        Replaces the keys of a budgeted namespace that are kept while anything else can be evicted
+        """
+        with self.lock:
+            self.budgeted.setdefault(namespace, BudgetedEntries()).pinned = set(keys)
+
+    def budgetUsage(self, namespace: str):
+        """
+        Returns the memory, entries, pinned entries & evictions of each group in a budgeted namespace
+        """
+        with self.lock:
+            entries = self.budgeted.get(namespace)
+            return {} if entries is None else entries.usage()
+
+
+class CacheManager(BaseManager):
+    """
+    Serves a CacheStore over a local socket, launcher.py registers the store it serves
+    """
+
+
+class CacheClient(BaseManager):
+    """
+    Connects to the CacheStore served by a CacheManager
+    """
+
+
+CacheClient.register("getStore")
+
+
+# Stores used by this process. SHARED_STORE is swapped for a proxy by connectSharedStore, or for a stand-in in tests
+LOCAL_STORE = CacheStore()
+SHARED_STORE = LOCAL_STORE
+
+
+def useSharedStore(store):
+    """
+    FUNC NAME: useSharedStore
+    FUNC DESC: Sets the store that shared caches read from & write to. Anything with the CacheStore methods will do
+    FUNC TYPE: Function
+    """
+    global SHARED_STORE
+    SHARED_STORE = store
+
+
+def connectSharedStore(address: str, authkey: str):
+    """
+    FUNC NAME: connectSharedStore
+    FUNC DESC: Connects to the cache store served by launcher.py (at "host:port") and uses it for all shared caches
+    FUNC TYPE: Function
+    """
+    host, port = address.rsplit(":", 1)
+    client = CacheClient(address=(host, int(port)), authkey=authkey.encode("utf-8"))
+    client.connect()
+    useSharedStore(client.getStore())
+    LOGGER.info(f"Connected to shared cache at {address}")
+
+
+class ResponseCache:
+    """
+    LRU cache living in one namespace of either the shared store or this process's own store. Entries optionally expire after ttl seconds
+    """
+    def __init__(self, namespace: str, maxEntries: int, ttl: float = None, shared: bool = True):
+        self.namespace = namespace
+        self.maxEntries = maxEntries
+        self.ttl = ttl
+        self.shared = shared
+
+    def store(self):
+        return SHARED_STORE if self.shared else LOCAL_STORE
+
+    def get(self, key):
+        cached = self.store().get(self.namespace, key)
+        if cached is None or (self.ttl is not None and time.time() - cached[0] > self.ttl):
+            CACHE_EVENTS.inc(self.namespace, "miss")
+            noteCommandField("cache", f"{self.namespace}:miss")
+            return None
+        CACHE_EVENTS.inc(self.namespace, "hit")
+        noteCommandField("cache", f"{self.namespace}:hit")
+        return cached[1]
+
+    def put(self, key, value):
+        evicted = self.store().put(self.namespace, key, (time.time(), value), self.maxEntries)
+        if evicted:
+            CACHE_EVENTS.inc(self.namespace, "eviction", amount=evicted)
+
+
+class BudgetedCache:
+    """
+    Cache living in a budgeted namespace of the shared store, so it is limited by roughly how much memory its entries use
+    """
+    def __init__(self, namespace: str, budget: int):
+        self.namespace = namespace
+        self.budget = budget
+
+    def get(self, key):
+        cached = SHARED_STORE.getBudgeted(self.namespace, key)
+        event = "miss" if cached is None else "hit"
+        CACHE_EVENTS.inc(self.namespace, event)
+        noteCommandField("cache", f"{self.namespace}:{event}")
+        return cached
+
+    def put(self, key, value, group: str):
+        evicted = SHARED_STORE.putBudgeted(self.namespace, key, value, approximateSize(value), group, self.budget)
+        if evicted:
+            CACHE_EVENTS.inc(self.namespace, "eviction", amount=evicted)
+
+    def pin(self, keys: list):
+        SHARED_STORE.pinBudgeted(self.namespace, list(keys))
+
+    def usage(self):
+        return SHARED_STORE.budgetUsage(self.namespace)
+
+
+def approximateSize(value):
+    """
+    FUNC NAME: approximateSize
+    FUNC DESC: Roughly how many bytes a value (usually parsed JSON) takes up in memory, including everything it contains
+    FUNC TYPE: Function
+    """
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(approximateSize(itemKey) + approximateSize(item) for itemKey, item in value.items())
+    elif isinstance(value, (list, tuple, set)):
+        size += sum(approximateSize(item) for item in value)
+    return size
+
+
+# Matches from requestEntity keyed by (scope, filteredEntityInput), grouped by the directory of the matched entity
+ENTITY_CACHE = BudgetedCache("entities", config.ENTITY_CACHE_BUDGET)
+# Open5e root directory list, keyed by None as there's only one
+ROOT_CACHE = ResponseCache("root", 1, ttl=config.ROOT_CACHE_TTL)
+# Scryfall art urls keyed by the search term
+SCRYFALL_CACHE = ResponseCache("scryfall", config.SCRYFALL_CACHE_SIZE)
+# Output of constructResponse keyed by (route, slug). Embeds & the files they point to only exist in this process so aren't shared
+RENDER_CACHE = ResponseCache("renders", config.RENDER_CACHE_SIZE, shared=False)
+
+# Request counts are kept in the shared store too, under "scope|filteredEntityInput" keys
+POPULARITY_NAMESPACE = "popularity"
+POPULARITY_UNSAVED = 0
+POPULARITY_LOCK = threading.Lock()
+POPULARITY_SAVE_LOCK = threading.Lock()
+
+
+def streamResponse(entityInput: str, route: str, matchedObj: dict):
+    """
+    FUNC NAME: streamResponse
+    FUNC DESC: Yields the parts of an entity's response like constructResponse, replaying them from the render cache on a hit.
+               On a miss each part is yielded as soon as it is built and the whole response is cached once finished
+    FUNC TYPE: Generator
+    """
+    renderKey = (route, matchedObj.get("slug", matchedObj.get("name", matchedObj.get("title"))))
+    cached = RENDER_CACHE.get(renderKey)
+
+    # Files are removed by cleanup.py, so re-render if any have gone missing since.
+    # Callers set thumbnails & footers on the embeds so never hand out the cached ones
+    if cached is not None and all(os.path.exists(filePath) for filePath in cached["files"]):
+        for embed in cached["embeds"]:
+            yield "embed", embed.copy()
+        for filePath in cached["files"]:
+            yield "file", filePath
+        return
+
+    checkDeadline("rendering")
+    rendered = {"files": list(), "embeds": list()}
+    with traceSpan("render", route=route) as renderSpan:
+        for partType, part in constructResponse(entityInput, route, matchedObj):
+            rendered[f"{partType}s"].append(part)
+            yield partType, part.copy() if partType == "embed" else part
+        renderSpan.set(embeds=len(rendered["embeds"]), files=len(rendered["files"]))
+    RENDER_CACHE.put(renderKey, rendered)
+
+
+def renderResponse(entityInput: str, route: str, matchedObj: dict):
+    """
+    FUNC NAME: renderResponse
+    FUNC DESC: Returns a copy of the constructed responses for an entity, only building them on a render cache miss
+    FUNC TYPE: Function
+    """
+    return collectResponse(streamResponse(entityInput, route, matchedObj))
+
+
+def recordPopularity(scope: str, filteredEntityInput: str):
+    """
+    FUNC NAME: recordPopularity
+    FUNC DESC: Increments the request count of an entity, saving the counts to disk every so often. Commands only record entities they found,
+               so misses never get a count. Talks to the shared store & the disk, so run it in the background lane rather than on the event loop
+    FUNC TYPE: Function
+    """
+    global POPULARITY_UNSAVED
+    SHARED_STORE.increment(POPULARITY_NAMESPACE, f"{scope}|{filteredEntityInput}")
+    with POPULARITY_LOCK:
+        POPULARITY_UNSAVED += 1
+        shouldSave = POPULARITY_UNSAVED >= config.POPULARITY_SAVE_INTERVAL
+        if shouldSave:
+            POPULARITY_UNSAVED = 0
+    if shouldSave:
+        savePopularity()
+
+
+def getPopularEntities(limit: int):
+    """
+    FUNC NAME: getPopularEntities
+    FUNC DESC: Returns the most requested (scope, filteredEntityInput) pairs, most popular first. They're ranked by the store,
+               so only limit of them are sent back from the shared store
+    FUNC TYPE: Function
+    """
+    return [tuple(popularityKey.split("|", 1)) for popularityKey, _ in SHARED_STORE.top(POPULARITY_NAMESPACE, limit)]
+
+
+def loadPopularity():
+    """
+    FUNC NAME: loadPopularity
+    FUNC DESC: Loads the request counts saved by a previous run of the bot. Only the primary shard loads them, as the store is shared
+    FUNC TYPE: Function
+    """
+    if not config.PRIMARY_SHARD:
+        return
+    if not os.path.exists(config.POPULARITY_FILE):
+        LOGGER.info(f"No popularity file found at {config.POPULARITY_FILE}, starting with no request counts")
+        return
+
+    try:
+        with open(config.POPULARITY_FILE, "r") as popularityFile:
+            savedCounts = json.load(popularityFile)
+    except (OSError, ValueError) as loadError:
+        LOGGER.warning(f"Failed to load popularity file {config.POPULARITY_FILE}: {loadError}")
+        return
+
+    for popularityKey, count in savedCounts.items():
+        SHARED_STORE.increment(POPULARITY_NAMESPACE, popularityKey, int(count))
+    LOGGER.info(f"Loaded request counts for {len(savedCounts)} entities")
+    SHARED_STORE.trim(POPULARITY_NAMESPACE, config.POPULARITY_MAX_ENTRIES)
+    pinPopularEntities()
+
+
+def savePopularity():
+    """
+    FUNC NAME: savePopularity
+    FUNC DESC: Drops all but the POPULARITY_MAX_ENTRIES most requested entities, writes their counts to disk (replacing the old file in one step
+               so it is never half written) and re-pins the most requested entities. Only the primary shard does any of these,
+               the counts from every shard are in the shared store
+    FUNC TYPE: Function
+    """
+    global POPULARITY_UNSAVED
+    with POPULARITY_LOCK:
+        POPULARITY_UNSAVED = 0
+    if not config.PRIMARY_SHARD:
+        return
+
+    # Saves run in the background lane, so two can overlap. Only one writes the temp file at a time
+    with POPULARITY_SAVE_LOCK:
+        dropped = SHARED_STORE.trim(POPULARITY_NAMESPACE, config.POPULARITY_MAX_ENTRIES)
+        if dropped > 0:
+            LOGGER.info(f"Dropped the request counts of {dropped} rarely requested entities")
+        pinPopularEntities()
+        try:
+            snapshot = SHARED_STORE.snapshot(POPULARITY_NAMESPACE)
+            os.makedirs(config.DATA_DIRECTORY, exist_ok=True)
+            tempFileName = f"{config.POPULARITY_FILE}.tmp"
+            with open(tempFileName, "w") as popularityFile:
+                json.dump(snapshot, popularityFile)
+            os.replace(tempFileName, config.POPULARITY_FILE)
+        except OSError as saveError:
+            LOGGER.warning(f"Failed to save popularity file {config.POPULARITY_FILE}: {saveError}")
+
+
+def pinPopularEntities():
+    """
+    FUNC NAME: pinPopularEntities
+    FUNC DESC: Pins the ENTITY_CACHE_PINNED most requested entities in the entity cache. Popularity keys are the entity cache's keys
+    FUNC TYPE: Function
+    """
+    ENTITY_CACHE.pin(getPopularEntities(config.ENTITY_CACHE_PINNED))
+
+
+def collectEntityCacheUsage():
+    """
+    FUNC NAME: collectEntityCacheUsage
+    FUNC DESC: Returns the entity cache's memory, entries, pinned entries & evictions per directory for the metrics endpoint
+    FUNC TYPE: Function
+    """
+    return {(directory, measure): value for directory, usage in ENTITY_CACHE.usage().items() for measure, value in usage.items()}
+
+
+registerMetric(Gauge("oghma_entity_cache", "Entity cache usage per Open5e directory: approximate bytes, entries, pinned entries & evictions so far", ("directory", "measure"), collectEntityCacheUsage))
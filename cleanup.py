@@ -4,18 +4,19 @@
 # https://github.com/M-Davies/oghma
 ###
 
-from utils import getFileDelimiter
+# Deliberately avoids importing utils, which would drag discord in for a cron job that just deletes files
+from config import FILE_DELIMITER
+from datetime import datetime
 import os
 import logging
-import datetime
 import sys
 
 
-CURRENT_DIR = f"{os.path.dirname(os.path.realpath(__file__))}{getFileDelimiter()}"
+CURRENT_DIR = f"{os.path.dirname(os.path.realpath(__file__))}{FILE_DELIMITER}"
 
 LOGGER = logging.getLogger()
 LOGGER.setLevel(logging.INFO)
-LOG_FILE_HANDLER = logging.FileHandler(filename=f"{CURRENT_DIR}{getFileDelimiter()}logs{getFileDelimiter()}oghma-{datetime.now().strftime('%d-%m-%Y')}.log", encoding="utf-8", mode="a")
+LOG_FILE_HANDLER = logging.FileHandler(filename=f"{CURRENT_DIR}{FILE_DELIMITER}logs{FILE_DELIMITER}oghma-{datetime.now().strftime('%d-%m-%Y')}.log", encoding="utf-8", mode="a")
 LOG_FILE_HANDLER.setFormatter(logging.Formatter("%(asctime)s: %(levelname)s: %(name)s: %(message)s"))
 LOGGER.addHandler(LOG_FILE_HANDLER)
 LOG_OUTPUT_HANDLER = logging.StreamHandler(sys.stdout)
@@ -29,9 +30,9 @@ def cleanup():
     FUNC DESC: Cleans up all txt files created from commands. Fires on a schedule set by Heroku
     FUNC TYPE: Function
     """
-    FOLDER = os.getcwd() + getFileDelimiter()
+    FOLDER = os.getcwd() + FILE_DELIMITER
     for filename in os.listdir(FOLDER):
-        FILE = f"{FOLDER}{getFileDelimiter()}{filename}"
+        FILE = f"{FOLDER}{FILE_DELIMITER}{filename}"
         if ".md" in filename:
             LOGGER.info(f"Trying to clean { FILE }")
 
@@ -0,0 +1,920 @@
+"""
+# Project: oghma
+# Author: M-Davies
+# https://github.com/M-Davies/oghma
+"""
+
+# pyright: reportOptionalMemberAccess=false, reportGeneralTypeIssues=false
+
+# Measure startup from before the first import
+import time
+STARTUP_TIME = time.perf_counter()
+
+import config
+from utils import generateFileName, constructRollResponse, constructDistributionResponse
+from errors import codeError, argLengthError, invalidArgSupplied, invalidSizeSupplied, unrecognisedNumericOperator, rateLimited, commandTimedOut, unknownSeed
+from api import requestScryfall, cachedScryfallImage, requestEntityList, requestEntity, requestDirectoryNames, getOpen5eRoot, buildEntityIndex, followEntityIndex
+from dice import compileCalculation, countRolls, DiceSyntaxError, DiceSizeError, DiceOperatorError
+from probability import calculateDistribution
+from simulate import runSimulation, shutdownSimulationPool
+from audit import newSeed, seededRoll, recordRoll, findRoll
+from admission import ADMISSION, getCommandCost
+from lanes import runInLane, streamInLane, shutdownLanes
+from deadline import DeadlineExceeded, getCommandDeadline, startDeadline, clearDeadline, checkDeadline
+from profiler import PROFILER, writeProfile
+from tracing import startTrace, finishTrace, traceSpan, stopTracing
+from logger import setupLogging, stopLogging, startCommandFields, LazyPayload, shouldLogPayload
+from metrics import COMMAND_REQUESTS, COMMAND_LATENCY, THUMBNAIL_OUTCOMES, startMetricsServer, monitorEventLoopLag
+from cache import renderResponse, streamResponse, recordPopularity, getPopularEntities, loadPopularity, savePopularity, connectSharedStore
+from duplicates import duplicateKey, findRecentResponse, rememberResponse, sendRecentResponse, getDuplicateSettings, setDuplicateSettings, loadGuildSettings, saveGuildSettings
+
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import discord
+from discord import app_commands
+from typing import Optional, Literal
+
+# Import dotenv (it's troublesome to install on mac for some reason)
+from dotenv import load_dotenv
+load_dotenv()
+
+# Handlers are set up by setupLogging when the bot is run
+LOGGER = logging.getLogger()
+# Scryfall pictures still being added to sent messages
+THUMBNAIL_TASKS = set()
+# Bookkeeping handed to the background lane by commands (like request counts), which they don't wait for
+BACKGROUND_TASKS = set()
+
+
+class OghmaCommandTree(app_commands.CommandTree):
+    """
+    Command tree that turns away commands from guilds & users that have run out of tokens before they reach their handler
+    """
+    async def interaction_check(self, interaction: discord.Interaction):
+        commandName = interaction.command.name if interaction.command is not None else ""
+        options = dict(interaction.namespace)
+        cost = getCommandCost(commandName, options)
+        retryAfter = ADMISSION.admit(interaction.guild_id, interaction.user.id, cost)
+        if retryAfter == 0:
+            startCommandFields(command=commandName, guild=interaction.guild_id, shard=interaction.guild.shard_id if interaction.guild is not None else None, cache=[])
+            interaction.extras["admittedAt"] = time.perf_counter()
+            # Replies are only accepted until the interaction expires, there's no point working past that
+            startDeadline(min(getCommandDeadline(commandName), (interaction.expires_at - discord.utils.utcnow()).total_seconds()))
+            interaction.extras["profile"] = PROFILER.start(commandName, options)
+            interaction.extras["trace"] = startTrace(commandName, guild=interaction.guild_id, options=options)
+            return True
+
+        COMMAND_REQUESTS.inc(commandName, "rejected")
+        LOGGER.info(f"Rejected /{commandName} (cost {cost}) in guild {interaction.guild_id}, retry after {retryAfter:.1f} seconds")
+        await interaction.response.send_message(embed=rateLimited(retryAfter), ephemeral=True)
+        return False
+
+    async def on_error(self, interaction: discord.Interaction, error: app_commands.AppCommandError):
+        if isinstance(getattr(error, "original", error), DeadlineExceeded):
+            recordCommand(interaction, "timeout")
+            LOGGER.warning(f"Gave up on /{interaction.command.name if interaction.command is not None else ''}: {error.original}")
+            if not interaction.is_expired():
+                try:
+                    await interaction.followup.send(embed=commandTimedOut())
+                except discord.HTTPException as sendError:
+                    LOGGER.warning(f"Failed to send timeout message: {sendError}")
+            return
+        recordCommand(interaction, "error")
+        await super().on_error(interaction, error)
+
+
+class OghmaClient(discord.AutoShardedClient):
+    """
+    Sets up the root client that communicates with Discord. Runs every shard unless launcher.py has given this process some of them
+    """
+    def __init__(self, *, intents: discord.Intents):
+        super().__init__(intents=intents, shard_ids=config.SHARD_IDS, shard_count=config.SHARD_COUNT)
+        self.tree = OghmaCommandTree(self)
+        self.readyTime = None
+
+    async def setup_hook(self):
+        LOGGER.info(f"Imports and login took {time.perf_counter() - STARTUP_TIME:.2f} seconds")
+        startMetricsServer()
+        self.lagMonitorTask = asyncio.create_task(monitorEventLoopLag())
+        LOGGER.info(f"Setting up shards {self.shard_ids if self.shard_ids is not None else 'ALL'}...")
+
+        # Commands and request counts are global, so only one process needs to sync/warm them
+        if config.PRIMARY_SHARD:
+            if os.environ['ENVIRONMENT'] is not None and os.environ['ENVIRONMENT'] != "PRODUCTION":
+                LOGGER.info(f"Non-production environment ({os.environ['ENVIRONMENT']}) detected. Syncing with testing guild...")
+                supportGuild = discord.Object(id=723473275803533323)
+                self.tree.clear_commands(guild=supportGuild)
+                self.tree.copy_global_to(guild=supportGuild)
+
+            # Syncing is slow and rate limited, so skip it when the commands haven't changed since the last sync
+            treeHash = hashCommandTree(self.tree)
+            if readCommandTreeHash() != treeHash:
+                syncStart = time.perf_counter()
+                await self.tree.sync()
+                writeCommandTreeHash(treeHash)
+                LOGGER.info(f"Command tree changed, synced in {time.perf_counter() - syncStart:.2f} seconds")
+            else:
+                LOGGER.info("Command tree unchanged since last sync, skipping")
+
+            # Warm the caches with the most requested entities without holding up login
+            loadPopularity()
+            loadGuildSettings()
+            self.warmSetTask = asyncio.create_task(warmPopularEntities())
+
+        # Each process searches its own copy of the index, but only the primary shard downloads it. Login doesn't wait for it, commands use the live API until it's ready
+        if config.ENTITY_INDEX:
+            self.indexTask = asyncio.create_task(indexEntitiesInBackground())
+        LOGGER.info("Setup Finished.")
+
+    async def on_app_command_completion(self, interaction: discord.Interaction, command):
+        recordCommand(interaction, "ok")
+
+    async def close(self):
+        savePopularity()
+        shutdownSimulationPool()
+        shutdownLanes()
+        await super().close()
+        stopTracing()
+        stopLogging()
+
+
+def recordCommand(interaction: discord.Interaction, outcome: str):
+    """
+    FUNC NAME: recordCommand
+    FUNC DESC: Records the outcome of an admitted command, and how long its handler took, for the metrics endpoint.
+               Also finishes the command's profile & trace if it was being profiled or traced
+    FUNC TYPE: Function
+    """
+    commandName = interaction.command.name if interaction.command is not None else ""
+    COMMAND_REQUESTS.inc(commandName, outcome)
+    if "admittedAt" in interaction.extras:
+        latency = time.perf_counter() - interaction.extras["admittedAt"]
+        COMMAND_LATENCY.observe(latency, commandName)
+        LOGGER.info(f"Finished /{commandName} ({outcome}) in {latency:.3f} seconds", extra={"outcome": outcome, "latency": round(latency, 4)})
+    if interaction.extras.get("profile") is not None:
+        asyncio.get_running_loop().run_in_executor(None, writeProfile, PROFILER.finish(interaction.extras["profile"]))
+    if interaction.extras.get("trace") is not None:
+        finishTrace(interaction.extras["trace"], outcome)
+
+
+def hashCommandTree(tree: app_commands.CommandTree):
+    """
+    FUNC NAME: hashCommandTree
+    FUNC DESC: Hashes the definitions of every command in the tree, along with the environment they'd be synced to
+    FUNC TYPE: Function
+    """
+    definitions = [command.to_dict(tree) for command in sorted(tree.get_commands(), key=lambda command: command.name)]
+    payload = json.dumps({"environment": os.environ.get("ENVIRONMENT"), "commands": definitions}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def readCommandTreeHash():
+    """
+    FUNC NAME: readCommandTreeHash
+    FUNC DESC: Returns the hash of the command tree last synced with Discord, or None if it has never been synced
+    FUNC TYPE: Function
+    """
+    try:
+        with open(config.COMMAND_HASH_FILE, "r") as hashFile:
+            return hashFile.read().strip()
+    except OSError:
+        return None
+
+
+def writeCommandTreeHash(treeHash: str):
+    """
+    FUNC NAME: writeCommandTreeHash
+    FUNC DESC: Remembers the hash of the command tree that was just synced with Discord
+    FUNC TYPE: Function
+    """
+    try:
+        os.makedirs(config.DATA_DIRECTORY, exist_ok=True)
+        with open(config.COMMAND_HASH_FILE, "w") as hashFile:
+            hashFile.write(treeHash)
+    except OSError as hashError:
+        LOGGER.warning(f"Failed to save command tree hash to {config.COMMAND_HASH_FILE}: {hashError}")
+
+
+def writeDataFile(fileName: str, contents: str):
+    """
+    FUNC NAME: writeDataFile
+    FUNC DESC: Writes a generated file of results into the data directory
+    FUNC TYPE: Function
+    """
+    checkDeadline("writing files")
+    LOGGER.info(f"Creating file: {fileName}")
+    with traceSpan("write file", file=fileName) as writeSpan:
+        with open(f"{os.getcwd()}data{config.FILE_DELIMITER}{fileName}", "w+") as dataFile:
+            dataFile.write(contents)
+            writeSpan.set(bytes=dataFile.tell())
+
+
+def warmEntity(scope: str, filteredEntityInput: str):
+    """
+    FUNC NAME: warmEntity
+    FUNC DESC: Fetches and renders a single entity so that it lands in the entity and render caches
+    FUNC TYPE: Function
+    """
+    match = requestEntity(scope, filteredEntityInput)
+    if isinstance(match, dict) and "entity" in match.keys():
+        renderResponse(filteredEntityInput, match["route"], match["entity"])
+
+
+async def warmPopularEntities():
+    """
+    FUNC NAME: warmPopularEntities
+    FUNC DESC: Pre-fetches and pre-renders the most requested entities in the background lane, a few at a time
+    FUNC TYPE: Function
+    """
+    popularEntities = getPopularEntities(config.WARM_SET_SIZE)
+    LOGGER.info(f"Warming caches with {len(popularEntities)} popular entities...")
+
+    async def warmInBackground(scope: str, filteredEntityInput: str):
+        try:
+            await runInLane("background", warmEntity, scope, filteredEntityInput)
+        except Exception as warmError:
+            LOGGER.warning(f"Failed to warm {scope}/{filteredEntityInput}: {warmError}")
+
+    await asyncio.gather(*(warmInBackground(scope, filteredEntityInput) for scope, filteredEntityInput in popularEntities))
+    LOGGER.info("Cache warming finished.")
+
+
+async def indexEntitiesInBackground():
+    """
+    FUNC NAME: indexEntitiesInBackground
+    FUNC DESC: Builds the entity index in the background lane, then rebuilds it every ENTITY_INDEX_MAX_AGE seconds so it keeps up with Open5e.
+               Processes without the primary shard load the snapshot it saves instead, so Open5e is only downloaded once
+    FUNC TYPE: Function
+    """
+    if not config.PRIMARY_SHARD:
+        lastModified = None
+        while True:
+            try:
+                lastModified = await runInLane("background", followEntityIndex, lastModified)
+            except Exception as indexError:
+                LOGGER.warning(f"Failed to load the entity index snapshot: {indexError}")
+            await asyncio.sleep(config.ENTITY_INDEX_POLL_INTERVAL)
+
+    while True:
+        try:
+            await runInLane("background", buildEntityIndex)
+        except Exception as indexError:
+            LOGGER.warning(f"Failed to build the entity index: {indexError}")
+        await asyncio.sleep(config.ENTITY_INDEX_MAX_AGE)
+
+
+def runInBackground(func, *args):
+    """
+    FUNC NAME: runInBackground
+    FUNC DESC: Runs blocking bookkeeping in the background lane without the current command waiting for it, or being cut short by its deadline
+    FUNC TYPE: Function
+    """
+    async def runWithoutDeadline():
+        # This task has its own copy of the command's context, so clearing the deadline doesn't affect the command
+        clearDeadline()
+        try:
+            await runInLane("background", func, *args)
+        except Exception as backgroundError:
+            LOGGER.warning(f"Background {func.__name__} failed: {backgroundError}")
+
+    # Hold a reference to the task until it's done, the event loop only keeps weak ones
+    backgroundTask = asyncio.create_task(runWithoutDeadline())
+    BACKGROUND_TASKS.add(backgroundTask)
+    backgroundTask.add_done_callback(BACKGROUND_TASKS.discard)
+
+
+async def sendEntityResponses(interaction: discord.Interaction, responseParts, splitEntityInput: list, footer: str = None, recentKey: tuple = None):
+    """
+    FUNC NAME: sendEntityResponses
+    FUNC DESC: Sends each of an entity's embeds as soon as it's rendered, then its files. Unless a Scryfall picture for it is already cached,
+               the picture is looked up afterwards and the sent embeds are edited to show it, so users never wait on Scryfall.
+               The response is remembered under recentKey for duplicate commands
+    FUNC TYPE: Function
+    """
+    # The cached picture lives in the shared store, so look it up in a lane rather than on the event loop
+    image = await runInLane("lookup", cachedScryfallImage, splitEntityInput)
+    messages = []
+    embeds = []
+    files = []
+    async for partType, part in responseParts:
+        if partType == "file":
+            files.append(part)
+            continue
+
+        if footer is not None:
+            part.set_footer(text=footer)
+        if image is not None:
+            part.set_thumbnail(url=image)
+        if shouldLogPayload():
+            LOGGER.info("Sending embed - %s", LazyPayload(part.to_dict))
+        with traceSpan("send", embeds=1, part=len(messages) + 1):
+            messages.append(await interaction.followup.send(embed=part, wait=True))
+        embeds.append(part)
+
+    if len(files) > 0:
+        LOGGER.info(f"Sending files - {files}")
+        with traceSpan("send", files=len(files)):
+            await interaction.followup.send(files=[discord.File(filePath) for filePath in files])
+
+    if recentKey is not None:
+        rememberResponse(recentKey, messages, embeds, files)
+
+    if image is not None:
+        THUMBNAIL_OUTCOMES.inc("cached")
+    else:
+        # Hold a reference to the task until it's done, the event loop only keeps weak ones
+        thumbnailTask = asyncio.create_task(addScryfallThumbnail(messages, embeds, splitEntityInput))
+        THUMBNAIL_TASKS.add(thumbnailTask)
+        thumbnailTask.add_done_callback(THUMBNAIL_TASKS.discard)
+
+
+async def addScryfallThumbnail(messages: list, embeds: list, splitEntityInput: list):
+    """
+    FUNC NAME: addScryfallThumbnail
+    FUNC DESC: Looks up a Scryfall picture for sent embeds & edits them to show it, giving up after THUMBNAIL_DEADLINE seconds
+    FUNC TYPE: Function
+    """
+    # This task has its own copy of the command's context, so this deadline doesn't affect the command
+    startDeadline(config.THUMBNAIL_DEADLINE)
+    try:
+        with traceSpan("scryfall", searchTerm=" ".join(splitEntityInput)):
+            image = await runInLane("lookup", requestScryfall, splitEntityInput)
+    except DeadlineExceeded:
+        THUMBNAIL_OUTCOMES.inc("timeout")
+        return
+    except Exception as scryfallError:
+        THUMBNAIL_OUTCOMES.inc("error")
+        LOGGER.warning(f"Failed to find a Scryfall picture for {' '.join(splitEntityInput)}: {scryfallError}")
+        return
+
+    if isinstance(image, int):
+        THUMBNAIL_OUTCOMES.inc("none")
+        return
+
+    for message, embed in zip(messages, embeds):
+        embed.set_thumbnail(url=image)
+        try:
+            with traceSpan("edit", message=message.id):
+                await message.edit(embed=embed)
+        except discord.HTTPException as editError:
+            THUMBNAIL_OUTCOMES.inc("error")
+            LOGGER.warning(f"Failed to add Scryfall picture to message {message.id}: {editError}")
+            return
+    THUMBNAIL_OUTCOMES.inc("edited")
+
+
+async def sendRemembered(interaction: discord.Interaction, recentKey: tuple, embed: discord.Embed, filePath: str = None):
+    """
+    FUNC NAME: sendRemembered
+    FUNC DESC: Sends an embed (and optionally a file) & remembers them under recentKey for duplicate commands
+    FUNC TYPE: Function
+    """
+    with traceSpan("send", embeds=1, files=0 if filePath is None else 1):
+        if filePath is None:
+            message = await interaction.followup.send(embed=embed, wait=True)
+        else:
+            message = await interaction.followup.send(embed=embed, file=discord.File(filePath), wait=True)
+    rememberResponse(recentKey, [message], [embed], [] if filePath is None else [filePath])
+    return message
+
+
+CLIENT = OghmaClient(intents=discord.Intents.default())
+
+
+@CLIENT.event
+async def on_ready():
+    """
+    FUNC NAME: on_ready
+    FUNC DESC: Tells you when bot is ready to accept commands. Also cleans up temp files
+    FUNC TYPE: Event
+    """
+    LOGGER.info(f"Logged in as {CLIENT.user.name} ({CLIENT.user.id})")
+
+    # on_ready fires again on every reconnect, only the first one is part of startup
+    if CLIENT.readyTime is None:
+        CLIENT.readyTime = time.perf_counter() - STARTUP_TIME
+        LOGGER.info(f"Ready {CLIENT.readyTime:.2f} seconds after startup")
+
+
+@CLIENT.tree.command(description="Displays a help message that shows usage information")
+async def help(interaction: discord.Interaction):
+    """
+    FUNC NAME: /help
+    FUNC DESC: Displays a help message that shows the bot is live
+    FUNC TYPE: Command
+    """
+    with traceSpan("defer"):
+        await interaction.response.defer(thinking=True)
+    helpEmbed = discord.Embed(
+        title="Oghma",
+        url="https://top.gg/bot/658336624647733258",
+        description=f"__Current Latency__\n\n{round(CLIENT.latency, 1)} seconds\n\n__Available commands__\n\n**/help** - Displays this message (duh)\n\n**/roll [ROLLS]d[SIDES]** - Dice roller with calculator logic\n\n**/search [ENTITY]** - Searches the whole Open5e D&D database for your chosen entity.\n\n**/searchdir [DIRECTORY] [ENTITY]** - Searches a specific category of the Open5e D&D database for your chosen entity a lot faster than */search*.\n\n**/lst [DIRECTORY] [ENTITY]** - Queries the API to get all the fully and partially matching entities based on the search term.",
+        color=discord.Colour.purple()
+    )
+
+    helpEmbed.set_author(
+        name="Intoxication#0001",
+        url="https://github.com/M-Davies",
+        icon_url="https://github.com/M-Davies.png"
+    )
+    helpEmbed.set_thumbnail(url="https://i.imgur.com/HxuMICy.jpg")
+
+    helpEmbed.add_field(name="LINKS", value="------------------", inline=False)
+    helpEmbed.add_field(name="GitHub", value="https://github.com/M-Davies/oghma", inline=True)
+    helpEmbed.add_field(name="Discord", value="https://discord.gg/8YZ2NZ5", inline=True)
+    helpEmbed.set_footer(text="Feedback? Hate? Make it known to us! (see links above)")
+    return await interaction.followup.send(embed=helpEmbed)
+
+
+@CLIENT.tree.command(description="Runs a quick & easy dice roller")
+@app_commands.describe(
+    calculation="The calculation to conduct",
+    repeat="How many times to roll the calculation (e.g. 6 for a set of stats)",
+    mode="Roll the dice, show the exact odds of every outcome or estimate the odds by simulating lots of rolls",
+    target="When showing odds, the total you need to meet or beat",
+    trials="When simulating, how many times to roll the calculation"
+)
+async def roll(
+    interaction: discord.Interaction,
+    calculation: str,
+    repeat: Optional[app_commands.Range[int, 1, config.ROLL_MAX_REPEATS]] = 1,
+    mode: Literal["roll", "stats", "simulate"] = "roll",
+    target: Optional[float] = None,
+    trials: Optional[app_commands.Range[int, 1, config.SIMULATION_MAX_TRIALS]] = None
+):
+    """
+    FUNC NAME: /roll
+    FUNC DESC: Runs a dice roller
+    FUNC TYPE: Command
+    """
+    LOGGER.info(f"Executing: /roll {calculation}")
+    with traceSpan("defer"):
+        await interaction.response.defer(thinking=True)
+
+    # Verify arg length isn't over limits
+    if len(calculation) >= 201:
+        LOGGER.info(f"Failed to execute /roll, args lengths too long = {calculation}")
+        return await interaction.response.send_message(embed=argLengthError())
+
+    # Calculate or simulate the odds of the calculation rather than rolling it
+    if mode != "roll":
+        try:
+            if mode == "stats":
+                _, summary, histogram = await runInLane("interactive", calculateDistribution, calculation, target)
+            else:
+                _, summary, histogram = await runInLane("simulate", runSimulation, calculation, target, trials)
+        except DiceOperatorError as operatorError:
+            return await interaction.followup.send(embed=unrecognisedNumericOperator(operatorError.culprit))
+        except DiceSizeError as sizeError:
+            return await interaction.followup.send(embed=invalidSizeSupplied(sizeError.culprit, sizeError.limit))
+        except DiceSyntaxError as syntaxError:
+            return await interaction.followup.send(embed=invalidArgSupplied(syntaxError.culprit))
+        return await interaction.followup.send(embed=constructDistributionResponse(calculation, summary, histogram))
+
+    # Parse & roll the calculation with its own seeded RNG, handing big rolls to the interactive lane so they don't hold up the event loop.
+    # Seeds are always fresh, earlier rolls can only be reproduced with /replay
+    seed = newSeed()
+    try:
+        rollCount = countRolls(compileCalculation(calculation)) * repeat
+        if rollCount >= config.ROLL_OFFLOAD_THRESHOLD:
+            totals, allSteps = await runInLane("interactive", seededRoll, calculation, seed, repeat)
+        else:
+            totals, allSteps = seededRoll(calculation, seed, repeat)
+    except DiceOperatorError as operatorError:
+        return await interaction.followup.send(embed=unrecognisedNumericOperator(operatorError.culprit))
+    except DiceSizeError as sizeError:
+        return await interaction.followup.send(embed=invalidSizeSupplied(sizeError.culprit, sizeError.limit))
+    except DiceSyntaxError as syntaxError:
+        return await interaction.followup.send(embed=invalidArgSupplied(syntaxError.culprit))
+    recordRoll(seed, calculation, repeat, totals)
+
+    # Summarising huge rolls and compressing their faces is just as slow as rolling them
+    if rollCount >= config.ROLL_OFFLOAD_THRESHOLD:
+        diceRollEmbed, resultsFile = await runInLane("interactive", constructRollResponse, calculation, seed, totals, allSteps, interaction.user)
+    else:
+        diceRollEmbed, resultsFile = constructRollResponse(calculation, seed, totals, allSteps, interaction.user)
+
+    if resultsFile is not None:
+        return await interaction.followup.send(embed=diceRollEmbed, file=resultsFile)
+    return await interaction.followup.send(embed=diceRollEmbed)
+
+
+@CLIENT.tree.command(description="Replays an earlier roll from its seed, to check it was rolled fairly")
+@app_commands.describe(seed="The seed shown at the bottom of the roll")
+async def replay(interaction: discord.Interaction, seed: int):
+    """
+    FUNC NAME: /replay [SEED]
+    FUNC DESC: Rolls the calculation of an audited roll again with its seed & shows whether it still matches the audit log.
+               Only seeds in the audit log can be replayed, and replays aren't recorded as new rolls
+    FUNC TYPE: Command
+    """
+    LOGGER.info(f"EXECUTING: /replay {seed}")
+    with traceSpan("defer"):
+        await interaction.response.defer(thinking=True)
+
+    auditEntry = await runInLane("interactive", findRoll, seed)
+    if auditEntry is None:
+        return await interaction.followup.send(embed=unknownSeed(seed))
+
+    totals, allSteps = await runInLane("interactive", seededRoll, auditEntry["c"], seed, auditEntry["r"])
+    diceRollEmbed, resultsFile = await runInLane("interactive", constructRollResponse, auditEntry["c"], seed, totals, allSteps, interaction.user, auditEntry)
+    if resultsFile is not None:
+        return await interaction.followup.send(embed=diceRollEmbed, file=resultsFile)
+    return await interaction.followup.send(embed=diceRollEmbed)
+
+
+@CLIENT.tree.command(description="Queries the Open5e API to get the requested entity")
+@app_commands.rename(entityInput="entity")
+@app_commands.describe(entityInput="The entity you would like to search for")
+async def search(interaction: discord.Interaction, entityInput: Optional[str] = ""):
+    """
+    FUNC NAME: /search [ENTITY]
+    FUNC DESC: Queries the Open5e search API, basically searches the whole thing for the ENTITY.
+    FUNC TYPE: Command
+    """
+    LOGGER.info(f"Executing: /search {entityInput}")
+    with traceSpan("defer"):
+        await interaction.response.defer(thinking=True)
+
+    # Verify arg length isn't over limits
+    if len(entityInput) >= 201:
+        LOGGER.warning(f"Failed to execute /search, args lengths too long = {entityInput}")
+        return await interaction.response.send_message(embed=argLengthError())
+
+    # Answer from an identical command recently sent to this channel
+    recentKey = duplicateKey(interaction.channel_id, "search", entityInput)
+    recent = await runInLane("lookup", findRecentResponse, interaction.guild_id, recentKey)
+    if recent is not None:
+        return await sendRecentResponse(interaction, "search", recent)
+
+    # Send directory contents if no search term given
+    if len(entityInput) <= 0:
+
+        # Get objects from directory, store in file. Whole directories are big so they go in the bulk lane
+        entityNames = await runInLane("bulk", requestDirectoryNames, f"{config.OPEN5E_API_URL}/search/?format=json&limit=10000")
+
+        if isinstance(entityNames, dict):
+            return await interaction.followup.send(embed=codeError(entityNames["code"], entityNames["query"]))
+
+        # Generate a unique filename and write to it
+        entityFileName = generateFileName("entsearch")
+        await runInLane("bulk", writeDataFile, entityFileName, "".join(f"{entityName}\n" for entityName in entityNames))
+
+        # Send embed notifying start of the spam stream
+        detailsEmbed = discord.Embed(
+            colour=discord.Colour.orange(),
+            title=f"See `{entityFileName}` for all searchable entities in this directory",
+            description="Due to discord character limits regarding embeds, the results have to be sent in a file"
+        )
+        return await sendRemembered(interaction, recentKey, detailsEmbed, f"{os.getcwd()}data/{entityFileName}")
+
+    # Filter input to remove whitespaces and set lowercase
+    filteredEntityInput = "".join(entityInput).lower()
+
+    splitEntityInput = entityInput.split(' ')
+    match = await runInLane("lookup", requestEntity, "search", filteredEntityInput)
+
+    # An API Request failed
+    if isinstance(match, dict) and "code" in match.keys():
+        LOGGER.error(f"Open5e search/ API Request FAILED: {match}")
+        return await interaction.followup.send(embed=codeError(match["code"], match["query"]))
+
+    # No entity was found
+    elif match == []:
+        LOGGER.info(f"No match found for {filteredEntityInput} in search/ directory")
+        noMatchEmbed = discord.Embed(
+            colour=discord.Colour.orange(),
+            title="ERROR",
+            description=f"No matches found for **{filteredEntityInput}** in the search/ directory"
+        )
+        noMatchEmbed.set_thumbnail(url="https://i.imgur.com/obEXyeX.png")
+        return await interaction.followup.send(embed=noMatchEmbed)
+
+    # Otherwise, construct & send responses
+    else:
+        runInBackground(recordPopularity, "search", filteredEntityInput)
+        # Note partial match in footer of embed
+        if match['partial'] is True:
+            footer = f"NOTE: Your search term ({filteredEntityInput}) was a PARTIAL match to this entity.\nIf this isn't the entity you were expecting, try refining your search term or use /searchdir instead"
+        else:
+            footer = "NOTE: If this isn't the entity you were expecting, try refining your search term or use `/searchdir` instead"
+        responseParts = streamInLane("lookup", streamResponse, entityInput, match["route"], match["entity"])
+        return await sendEntityResponses(interaction, responseParts, splitEntityInput, footer, recentKey)
+
+
+@CLIENT.tree.command(description="Queries the Open5e API to get an entity's information from a specified directory.")
+@app_commands.rename(directoryInput="directory", entityInput="entity")
+@app_commands.describe(directoryInput="The category to search for the entity in", entityInput="The entity you would like to search for")
+async def searchdir(interaction: discord.Interaction, directoryInput: str, entityInput: Optional[str] = ""):
+    """
+    FUNC NAME: /searchdir [DIRECTORY] [ENTITY]
+    FUNC DESC: Queries the Open5e DIRECTORY API.
+    FUNC TYPE: Command
+    """
+    LOGGER.info(f"EXECUTING: /searchdir {directoryInput} {entityInput}")
+    with traceSpan("defer"):
+        await interaction.response.defer(thinking=True)
+
+    # Answer from an identical command recently sent to this channel
+    recentKey = duplicateKey(interaction.channel_id, "searchdir", directoryInput, entityInput)
+    recent = await runInLane("lookup", findRecentResponse, interaction.guild_id, recentKey)
+    if recent is not None:
+        return await sendRecentResponse(interaction, "searchdir", recent)
+
+    # Get api root directories
+    directories = await runInLane("lookup", getOpen5eRoot)
+    if isinstance(directories, int):
+        return await interaction.followup.send(embed=codeError(directories, f"{config.OPEN5E_API_URL}?format=json"))
+
+    # Filter inputs
+    filteredDirectoryInput = directoryInput.lower()
+    filteredEntityInput = "".join(entityInput).lower()
+
+    # Verify arg length isn't over limits
+    if len(filteredEntityInput) >= 201:
+        return await interaction.followup.send(embed=argLengthError())
+
+    # search/ directory is best used with the dedicated /search command
+    if "search" in filteredDirectoryInput:
+
+        searchEmbed = discord.Embed(
+            colour=discord.Colour.orange(),
+            title=f"Requested Directory (`{directoryInput}`) is not a valid directory name",
+            description=f"**Available Directories**\n{', '.join(directories)}"
+        )
+
+        searchEmbed.add_field(name="NOTE", value="Use `/search` for searching the `search/` directory")
+        searchEmbed.set_thumbnail(url="https://i.imgur.com/obEXyeX.png")
+
+        return await interaction.followup.send(embed=searchEmbed)
+    
+    # Verify directory exists
+    if directories.count(filteredDirectoryInput) <= 0:
+
+        noDirectoryEmbed = discord.Embed(
+            colour=discord.Colour.orange(),
+            title=f"Requested Directory (`{filteredDirectoryInput}`) is not a valid directory name",
+            description=f"**Available Directories**\n{', '.join(directories)}"
+        )
+
+        noDirectoryEmbed.set_thumbnail(url="https://i.imgur.com/obEXyeX.png")
+
+        return await interaction.followup.send(embed=noDirectoryEmbed)
+    
+    # Send directory contents if no search term given
+    if len(filteredEntityInput) <= 0:
+
+        # Get objects from directory, store in file. Whole directories are big so they go in the bulk lane
+        entityNames = await runInLane("bulk", requestDirectoryNames, f"{config.OPEN5E_API_URL}/{filteredDirectoryInput}/?format=json&limit=10000")
+
+        if isinstance(entityNames, dict):
+            return await interaction.followup.send(embed=codeError(entityNames["code"], entityNames["query"]))
+
+        # Keep description word count low to account for names with lots of characters
+        if len(entityNames) <= 200:
+            detailsEmbed = discord.Embed(
+                colour=discord.Colour.orange(),
+                title="All searchable entities in this directory",
+                description="\n".join(entityNames)
+            )
+            detailsEmbed.set_thumbnail(url="https://i.imgur.com/obEXyeX.png")
+            return await sendRemembered(interaction, recentKey, detailsEmbed)
+
+        # Generate a unique filename and write to it
+        entityDirFileName = generateFileName("entsearchdir")
+        await runInLane("bulk", writeDataFile, entityDirFileName, "\n".join(entityNames))
+
+        # Send embed notifying start of the spam stream
+        detailsEmbed = discord.Embed(
+            colour=discord.Colour.orange(),
+            title=f"See `{entityDirFileName}` for all searchable entities in this directory",
+            description="Due to discord character limits regarding embeds, the results have to be sent in a file"
+        )
+        detailsEmbed.set_thumbnail(url="https://i.imgur.com/obEXyeX.png")
+        return await sendRemembered(interaction, recentKey, detailsEmbed, f"{os.getcwd()}data/{entityDirFileName}")
+
+    splitEntityInput = entityInput.split(" ")
+    match = await runInLane("lookup", requestEntity, filteredDirectoryInput, filteredEntityInput)
+
+    # An API Request failed
+    if isinstance(match, dict) and "code" in match.keys():
+        return await interaction.followup.send(embed=codeError(match['code'], match['query']))
+
+    # No entity was found
+    elif match == []:
+        noMatchEmbed = discord.Embed(
+            colour=discord.Colour.orange(),
+            title="ERROR",
+            description=f"No matches found for **{filteredEntityInput.upper()}** in the {filteredDirectoryInput} directory"
+        )
+
+        noMatchEmbed.set_thumbnail(url="https://i.imgur.com/obEXyeX.png")
+
+        return await interaction.followup.send(embed=noMatchEmbed)
+
+    # Otherwise, construct & send responses
+    else:
+        runInBackground(recordPopularity, filteredDirectoryInput, filteredEntityInput)
+        # Note partial match in footer of embed
+        footer = None
+        if match['partial'] is True:
+            footer = f"NOTE: Your search term ({filteredEntityInput}) was a PARTIAL match to this entity.\nIf this isn't the entity you were expecting, try refining your search term"
+        responseParts = streamInLane("lookup", streamResponse, entityInput, filteredDirectoryInput, match['entity'])
+        return await sendEntityResponses(interaction, responseParts, splitEntityInput, footer, recentKey)
+
+
+@CLIENT.tree.command(description="Queries the Open5e API to get all the fully and partially matching entities based on the search term")
+@app_commands.rename(entityInput="entity", directoryInput="directory")
+@app_commands.describe(entityInput="The entity you would like to search for", directoryInput="The category to search for the entity in")
+async def lst(interaction: discord.Interaction, entityInput: str, directoryInput: Optional[str] = ""):
+    """
+    FUNC NAME: /lst [DIRECTORY] [ENTITY]
+    FUNC DESC: Queries the Open5e API to get all the fully and partially matching entities information in a list embed format.
+    FUNC TYPE: Command
+    """
+    LOGGER.info(f"EXECUTING: /lst {entityInput} {directoryInput}")
+    with traceSpan("defer"):
+        await interaction.response.defer(thinking=True)
+    
+    # Verify arg length isn't over limits
+    if len(entityInput) >= 201:
+        return await interaction.response.send_message(embed=argLengthError())
+
+    # Answer from an identical command recently sent to this channel
+    recentKey = duplicateKey(interaction.channel_id, "lst", entityInput, directoryInput)
+    recent = await runInLane("lookup", findRecentResponse, interaction.guild_id, recentKey)
+    if recent is not None:
+        return await sendRecentResponse(interaction, "lst", recent)
+
+    # Check if we are searching in a directory or on all directories
+    matches = None
+    filteredEntityInput = "".join(entityInput).lower()
+    splitEntityInput = entityInput.split(" ")
+    filteredDirectoryInput = directoryInput.lower()
+
+    # Get api root directories
+    directories = await runInLane("lookup", getOpen5eRoot)
+    if isinstance(directories, int):
+        LOGGER.error(f"Open5e Root API Request FAILED: {directories}")
+        return await interaction.followup.send(embed=codeError(directories, f"{config.OPEN5E_API_URL}?format=json"))
+
+    # Verify directory exists
+    wideSearching = False
+    if len(directoryInput) <= 0 or directories.count(directoryInput) <= 0:
+        filteredDirectoryInput = "search"
+        wideSearching = True
+        await interaction.followup.send(
+            embed=discord.Embed(
+                color=discord.Colour.blue(),
+                title="FINDING ALL ENTITIES IN SEARCH/ DIRECTORY...",
+                description=f"WARNING: {directoryInput} is not a valid directory name. Your query will use the search/ directory instead. If this behaviour is unexpected, pass a valid directory name as your first parameter."
+            ).set_footer(text=f"Valid directory names = {', '.join(directories)}")
+        )
+
+    # If an invalid or empty directory is given, default to wide search using search/ directory.
+    # Use first word to narrow search results down for quicker response on some directories
+    matches = await runInLane("bulk", requestEntityList, filteredDirectoryInput, filteredEntityInput, splitEntityInput[0])
+
+    # An API Request failed
+    if isinstance(matches, dict) and "code" in matches.keys():
+        return await interaction.followup.send(embed=codeError(matches['code'], matches['query']))
+    # Nothing was found
+    elif matches is []:
+        noMatchEmbed = discord.Embed(
+            colour=discord.Colour.orange(),
+            title="ERROR",
+            description=f"No matches found for **{filteredEntityInput}** in the database or requested directory"
+        )
+        noMatchEmbed.set_thumbnail(url="https://i.imgur.com/obEXyeX.png")
+        LOGGER.info(f"No match found for {filteredEntityInput} in {filteredDirectoryInput}/ directory")
+        return await interaction.followup.send(embed=noMatchEmbed)
+    else:
+        # Embeds have a max of 25 fields, so stick it in a file if we can't fit all of them in
+        matchesEmbed = discord.Embed(
+            colour=discord.Colour.green(),
+            title=f"SEARCH RESULTS FOR {filteredEntityInput}",
+            description="Results ***in italics*** are partial matches and may be less accurate. All others are full matches and line up with your search term as it is."
+        )
+        matchesEmbed.set_author(name=f"Requested by {interaction.user.display_name}", icon_url=f"{interaction.user.display_avatar}")
+        
+        if len(matches) < 25:
+            for match in matches:
+                # Documents do not have a name identifier key
+                identifier = "name"
+                if "title" in match['entity'].keys():
+                    identifier = "title"
+
+                # Display result in field title, directory in value
+                entityDirectory = filteredDirectoryInput
+                if wideSearching:
+                    entityDirectory = match['entity']['route']
+
+                if match['partial'] is True:
+                    matchesEmbed.add_field(
+                        name=f"*{match['entity'][identifier]}*",
+                        value=f"*Directory = {entityDirectory[:-1]}*",
+                        inline=True
+                    )
+                else:
+                    matchesEmbed.add_field(
+                        name=match['entity'][identifier],
+                        value=f"Directory = {entityDirectory[:-1]}",
+                        inline=True
+                    )
+
+            return await sendRemembered(interaction, recentKey, matchesEmbed)
+        else:
+            formattedMatches = ""
+            for match in matches:
+                # Documents do not have a name identifier key
+                identifier = "name"
+                if "title" in match['entity'].keys():
+                    identifier = "title"
+
+                # Display result in field title, directory in value
+                if match['partial'] is True:
+                    formattedMatches += f"*{match['entity'][identifier]} : Directory = {match['entity']['route'] if filteredDirectoryInput == '' else filteredDirectoryInput}*\n"
+                else:
+                    formattedMatches += f"{match['entity'][identifier]} : Directory = {match['entity']['route'] if filteredDirectoryInput == '' else filteredDirectoryInput}\n"
+
+            # Create file and store matches in there
+            matchesFileName = generateFileName("matches")
+            await runInLane("bulk", writeDataFile, matchesFileName, formattedMatches)
+
+            matchesEmbed.add_field(name=f"See `{matchesFileName}` for the matched entities", value="Due to discord character limits regarding embeds, the results have to be sent in a file", inline=False)
+            return await sendRemembered(interaction, recentKey, matchesEmbed, f"{os.getcwd()}data/{matchesFileName}")
+
+
+@CLIENT.tree.command(description="Sets how repeats of a recent /search, /searchdir or /lst in the same channel are answered")
+@app_commands.guild_only()
+@app_commands.default_permissions(manage_guild=True)
+@app_commands.describe(
+    mode="Send the earlier answer again (reuse), link to it (point) or run every command (off)",
+    window="How many seconds a command counts as a repeat for, leave empty to keep the current window"
+)
+async def duplicates(interaction: discord.Interaction, mode: Literal["reuse", "point", "off"], window: Optional[app_commands.Range[int, 0, config.DUPLICATE_MAX_WINDOW]] = None):
+    """
+    FUNC NAME: /duplicates [MODE] [?WINDOW]
+    FUNC DESC: Sets how this server answers a command repeated in the same channel within WINDOW seconds. Server managers only
+    FUNC TYPE: Command
+    """
+    LOGGER.info(f"EXECUTING: /duplicates {mode} {window}")
+    if window is None:
+        _, window = await runInLane("lookup", getDuplicateSettings, interaction.guild_id)
+    await runInLane("lookup", setDuplicateSettings, interaction.guild_id, mode, window)
+    runInBackground(saveGuildSettings)
+
+    descriptions = {
+        "reuse": f"Commands repeated in the same channel within **{window}** seconds will be sent the earlier answer again",
+        "point": f"Commands repeated in the same channel within **{window}** seconds will be sent a link to the earlier answer",
+        "off": "Every command will be run, even if it was just sent in the same channel"
+    }
+    return await interaction.response.send_message(embed=discord.Embed(
+        colour=discord.Colour.purple(),
+        title=f"Duplicate commands set to `{mode}`",
+        description=descriptions[mode]
+    ), ephemeral=True)
+
+
+@CLIENT.tree.command(description="Profiles the next few commands (owner only)")
+@app_commands.describe(
+    commands="How many of the next commands to profile, 0 turns profiling off",
+    memory="Whether to also compare memory snapshots from before & after each command"
+)
+async def profile(interaction: discord.Interaction, commands: app_commands.Range[int, 0, 100], memory: Optional[bool] = False):
+    """
+    FUNC NAME: /profile [COMMANDS] [?MEMORY]
+    FUNC DESC: Turns on profiling for the next COMMANDS commands. Profiles are written to logs/profiles
+    FUNC TYPE: Command
+    """
+    LOGGER.info(f"EXECUTING: /profile {commands} {memory}")
+    applicationOwner = CLIENT.application.owner if CLIENT.application is not None else None
+    if interaction.user.id not in config.OWNER_IDS and (applicationOwner is None or interaction.user.id != applicationOwner.id):
+        return await interaction.response.send_message(embed=discord.Embed(
+            colour=discord.Colour.red(),
+            title="ERROR",
+            description="Only the owners of this bot can use `/profile`"
+        ), ephemeral=True)
+
+    PROFILER.enable(commands, memory)
+    return await interaction.response.send_message(embed=discord.Embed(
+        colour=discord.Colour.purple(),
+        title=f"Profiling the next {commands} commands" if commands > 0 else "Profiling turned off",
+        description=f"Profiles{' and memory snapshots' if memory else ''} will be written to `{config.PROFILE_DIRECTORY}`"
+    ), ephemeral=True)
+
+
+def main():
+    """
+    FUNC NAME: main
+    FUNC DESC: Runs the bot until it is stopped. Called by bot.py
+    FUNC TYPE: Function
+    """
+    setupLogging()
+    # Share Open5e & Scryfall data with the other shard processes started by launcher.py
+    if config.CACHE_ADDRESS:
+        connectSharedStore(config.CACHE_ADDRESS, config.CACHE_AUTHKEY)
+    CLIENT.run(os.environ['BOT_KEY'])
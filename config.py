@@ -1,7 +1,190 @@
-from utils import getFileDelimiter
+import os
 
 # Constants
-FILE_DELIMITER = getFileDelimiter()
+FILE_DELIMITER = os.sep
 NUMERIC_OPERATORS = ["+", "-", "*", "/"]
 COMMAND_LIST = ["roll", "search", "searchdir", "help", "lst"]
 ROLL_MAX_PARAM_VALUE = 10001
+
+# Upstream APIs, overridable so load tests can point the bot at a local stand-in (no trailing slash)
+OPEN5E_API_URL = os.environ.get("OPEN5E_API_URL", "https://api.open5e.com").rstrip("/")
+SCRYFALL_API_URL = os.environ.get("SCRYFALL_API_URL", "https://api.scryfall.com").rstrip("/")
+# "live" sends requests upstream, "record" also saves every response as a fixture & "replay" answers from the fixtures without the network
+UPSTREAM_MODE = os.environ.get("UPSTREAM_MODE", "live").lower()
+UPSTREAM_FIXTURE_DIRECTORY = os.environ.get("UPSTREAM_FIXTURE_DIRECTORY", f"{os.path.dirname(os.path.abspath(__file__))}{FILE_DELIMITER}benchmarks{FILE_DELIMITER}fixtures{FILE_DELIMITER}recorded")
+# Whether replayed responses take as long as the recorded ones did
+UPSTREAM_REPLAY_TIMING = os.environ.get("UPSTREAM_REPLAY_TIMING", "").lower() in ("1", "true", "yes")
+
+# Caching & warm set
+DATA_DIRECTORY = f"{os.getcwd()}{FILE_DELIMITER}data{FILE_DELIMITER}"
+POPULARITY_FILE = f"{DATA_DIRECTORY}popularity.json"
+POPULARITY_SAVE_INTERVAL = 10
+# Only the most requested entities keep their counts, the rest are dropped on each save so typos & one-offs don't pile up forever
+POPULARITY_MAX_ENTRIES = int(os.environ.get("POPULARITY_MAX_ENTRIES", 5000))
+# Hash of the command definitions last synced with Discord, the tree is only synced again when it changes
+COMMAND_HASH_FILE = f"{DATA_DIRECTORY}command-tree.sha256"
+# Roughly how many bytes of Open5e entities the entity cache can hold. Each directory evicts its least recently used entities,
+# starting with the directory using the most memory, but the ENTITY_CACHE_PINNED most requested entities stay while anything else can go
+ENTITY_CACHE_BUDGET = int(os.environ.get("ENTITY_CACHE_BUDGET", 64 * 1024 * 1024))
+ENTITY_CACHE_PINNED = int(os.environ.get("ENTITY_CACHE_PINNED", 50))
+RENDER_CACHE_SIZE = 500
+ROOT_CACHE_TTL = 3600
+SCRYFALL_CACHE_SIZE = 1000
+WARM_SET_SIZE = int(os.environ.get("WARM_SET_SIZE", 200))
+WARM_SET_CONCURRENCY = int(os.environ.get("WARM_SET_CONCURRENCY", 4))
+# Entity index. When on, every Open5e directory is kept in memory & searched locally rather than asking Open5e on every command.
+# It's built in the background after startup, from the snapshot if that's younger than ENTITY_INDEX_MAX_AGE seconds or by downloading
+# every directory otherwise, and rebuilt once it gets that old. Commands use the live API until it's ready.
+# Only the primary shard builds it, the other processes load the snapshot it saves, checking for a new one every ENTITY_INDEX_POLL_INTERVAL seconds.
+# Every process still holds its own copy in memory, several times the size of the uncompressed snapshot (all of Open5e's JSON) as Python objects,
+# so budget for that per process when running more than one with launcher.py
+ENTITY_INDEX = os.environ.get("ENTITY_INDEX", "").lower() in ("1", "true", "yes")
+ENTITY_INDEX_SNAPSHOT = f"{DATA_DIRECTORY}entity-index.json.gz"
+ENTITY_INDEX_MAX_AGE = int(os.environ.get("ENTITY_INDEX_MAX_AGE", 86400))
+ENTITY_INDEX_POLL_INTERVAL = int(os.environ.get("ENTITY_INDEX_POLL_INTERVAL", 60))
+
+# Duplicate commands. A /search, /searchdir or /lst repeated in the same channel within DUPLICATE_WINDOW seconds is answered from the first one,
+# either by sending its response again ("reuse") or by linking to it ("point"). "off" runs every command. Servers can change both with /duplicates
+DUPLICATE_MODES = ("reuse", "point", "off")
+DUPLICATE_MODE = os.environ.get("DUPLICATE_MODE", "reuse").lower()
+DUPLICATE_WINDOW = int(os.environ.get("DUPLICATE_WINDOW", 60))
+DUPLICATE_MAX_WINDOW = 600
+DUPLICATE_CACHE_SIZE = 500
+GUILD_SETTINGS_FILE = f"{DATA_DIRECTORY}guild-settings.json"
+
+# Logging. Records go through a queue to a background writer, the file gets JSON lines and rotates daily or when it gets too big
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+# launcher.py numbers the processes it starts. Each process rotates the files it writes on its own, so they can't share them:
+# every process gets its own log (e.g. oghma-1.log), a single process keeps the plain name
+PROCESS_INDEX = os.environ.get("PROCESS_INDEX", "")
+PROCESS_FILE_SUFFIX = f"-{PROCESS_INDEX}" if PROCESS_INDEX else ""
+LOG_FILE = f"{os.getcwd()}{FILE_DELIMITER}logs{FILE_DELIMITER}oghma{PROCESS_FILE_SUFFIX}.log"
+LOG_ROTATE_WHEN = "midnight"
+LOG_MAX_BYTES = int(os.environ.get("LOG_MAX_BYTES", 50 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get("LOG_BACKUP_COUNT", 30))
+# Fraction of sent embeds whose whole payload is logged
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", 0))
+LOG_STRUCTURED_FIELDS = ("command", "guild", "shard", "outcome", "latency", "cache")
+
+# Priority lanes. Each class of blocking work gets its own threads, so cheap commands always have a free slot
+LANE_WORKERS = {
+    # /roll offloads & exact odds, should never wait
+    "interactive": int(os.environ.get("LANE_INTERACTIVE_WORKERS", 4)),
+    # Single entity lookups, Scryfall pictures & rendering
+    "lookup": int(os.environ.get("LANE_LOOKUP_WORKERS", 8)),
+    # Whole directory downloads & the files generated from them
+    "bulk": int(os.environ.get("LANE_BULK_WORKERS", 2)),
+    # Simulations, these threads just wait on the simulation process pool
+    "simulate": int(os.environ.get("LANE_SIMULATE_WORKERS", 2)),
+    # Cache warming
+    "background": WARM_SET_CONCURRENCY
+}
+
+# Metrics endpoint, only served when METRICS_PORT is set. launcher.py gives each shard process the next port up
+METRICS_PORT = int(os.environ.get("METRICS_PORT", 0))
+METRICS_HOST = os.environ.get("METRICS_HOST", "127.0.0.1")
+METRICS_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+METRICS_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5)
+METRICS_LAG_INTERVAL = 1.0
+
+# Profiling. Set PROFILE_COMMANDS to profile the next N commands after startup, or use /profile at runtime
+PROFILE_COMMANDS = int(os.environ.get("PROFILE_COMMANDS", 0))
+PROFILE_MEMORY = os.environ.get("PROFILE_MEMORY", "").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL = 0.005
+PROFILE_MEMORY_FRAMES = 5
+PROFILE_TOP_FUNCTIONS = 30
+PROFILE_DIRECTORY = f"{os.getcwd()}{FILE_DELIMITER}logs{FILE_DELIMITER}profiles"
+# Users allowed to run owner only commands like /profile, as a comma separated list of ids. The application's owner always can
+OWNER_IDS = {int(ownerId) for ownerId in os.environ.get("OWNER_IDS", "").split(",") if ownerId.strip()}
+
+# Tracing. This fraction of commands get each stage (defer, lookups, upstream requests, matching, rendering, files & sends) timed as spans.
+# Spans are written in the Chrome trace event format to a file per process, open them with chrome://tracing or ui.perfetto.dev
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", 0))
+TRACE_DIRECTORY = f"{os.getcwd()}{FILE_DELIMITER}logs{FILE_DELIMITER}traces"
+# Trace files move on to a new numbered file once they reach this size, and only the newest TRACE_MAX_FILES in TRACE_DIRECTORY are kept
+TRACE_MAX_BYTES = int(os.environ.get("TRACE_MAX_BYTES", 50 * 1024 * 1024))
+TRACE_MAX_FILES = int(os.environ.get("TRACE_MAX_FILES", 20))
+
+# Offline benchmarks (benchmarks/benchmark.py)
+BENCHMARK_ROUNDS = 5
+BENCHMARK_REGRESSION_THRESHOLD = 0.25
+# (calculation, repeats) pairs to benchmark rolling & rendering
+BENCHMARK_ROLLS = [("1d20 + 5", 1), ("4d6kh3", 6), ("100d20 + 5d8!", 1), ("10000d6", 1)]
+# Load tests (benchmarks/loadtest.py). Commands run at each concurrency level, picked from this many different entities
+LOADTEST_CONCURRENCY = [1, 4, 16, 64]
+LOADTEST_COMMANDS = 200
+LOADTEST_DISTINCT_ENTITIES = 50
+
+# Sharding. SHARD_IDS is a comma separated list of the shards this process runs, unset means discord.py decides
+SHARD_COUNT = int(os.environ["SHARD_COUNT"]) if os.environ.get("SHARD_COUNT") else None
+SHARD_IDS = [int(shardId) for shardId in os.environ["SHARD_IDS"].split(",")] if os.environ.get("SHARD_IDS") else None
+# The process running shard 0 owns the state every shard shares (command syncing, request counts & cache warming)
+PRIMARY_SHARD = SHARD_IDS is None or 0 in SHARD_IDS
+# Address ("host:port") & key of the cache store launcher.py shares between shard processes, unset means a process local cache
+CACHE_ADDRESS = os.environ.get("CACHE_ADDRESS")
+CACHE_AUTHKEY = os.environ.get("CACHE_AUTHKEY", "")
+SHARD_PROCESSES = int(os.environ.get("SHARD_PROCESSES", 1))
+
+# Admission control. Commands spend tokens from their guild's & user's buckets, which refill by the second
+ADMISSION_GUILD_CAPACITY = float(os.environ.get("ADMISSION_GUILD_CAPACITY", 60))
+ADMISSION_GUILD_REFILL = float(os.environ.get("ADMISSION_GUILD_REFILL", 1))
+ADMISSION_USER_CAPACITY = float(os.environ.get("ADMISSION_USER_CAPACITY", 20))
+ADMISSION_USER_REFILL = float(os.environ.get("ADMISSION_USER_REFILL", 0.25))
+ADMISSION_MAX_BUCKETS = 10000
+COMMAND_COSTS = {"help": 1, "roll": 1, "replay": 4, "search": 4, "searchdir": 3}
+COMMAND_DEFAULT_COST = 1
+# Commands that download a whole directory (/lst and /search or /searchdir without an entity)
+COMMAND_LISTING_COST = 15
+COMMAND_SIMULATE_COST = 8
+
+# Deadlines. Commands must finish within this many seconds, after which their upstream requests, rendering & files are abandoned.
+# Discord only accepts replies for 15 minutes, so deadlines are also cut short by that
+COMMAND_DEFAULT_DEADLINE = float(os.environ.get("COMMAND_DEFAULT_DEADLINE", 30))
+COMMAND_DEADLINES = {"lst": 60, "roll": 45}
+# No single upstream request may take longer than this, even outside of a command (like cache warming)
+UPSTREAM_TIMEOUT = float(os.environ.get("UPSTREAM_TIMEOUT", 10))
+# Entity responses are sent straight away & edited to add their Scryfall picture once found, unless it takes longer than this
+THUMBNAIL_DEADLINE = float(os.environ.get("THUMBNAIL_DEADLINE", 10))
+
+# Dice
+DICE_EXPRESSION_CACHE_SIZE = 512
+ROLL_MAX_ROLLS = 1000000
+ROLL_MAX_TOTAL_ROLLS = 1000000
+ROLL_MAX_REPEATS = 20
+ROLL_OFFLOAD_THRESHOLD = 10000
+ROLL_MAX_EXPLOSIONS = 100
+# Dice steps whose faces would take more characters than this are summarised, with the full list sent as an attachment
+ROLL_SUMMARY_CHARACTERS = 200
+ROLL_SUMMARY_BUCKETS = 10
+# Embeds have a max of 25 fields, 5 are used for the query, total, results header, more steps & full results notes
+ROLL_MAX_STEP_FIELDS = 20
+# Discord rejects embeds with a field value over 1024 characters or over 6000 characters in total.
+# Repeated rolls leave room for the full results note, otherwise they only show each total
+EMBED_MAX_FIELD_CHARACTERS = 1024
+EMBED_MAX_CHARACTERS = 6000
+ROLL_RESULTS_NOTE_CHARACTERS = 100
+# Discord can only send integers up to 2^53 back to us
+ROLL_SEED_BITS = 48
+# Like the main log, each process started by launcher.py has its own audit log. /replay & audit.py search every process' files, rotated ones included
+AUDIT_LOG_FILE = f"{os.getcwd()}{FILE_DELIMITER}logs{FILE_DELIMITER}rolls-audit{PROCESS_FILE_SUFFIX}.jsonl"
+AUDIT_LOG_FILES = f"{os.getcwd()}{FILE_DELIMITER}logs{FILE_DELIMITER}rolls-audit*.jsonl*"
+# The audit log rotates on the same schedule as the main log, or once it reaches this size
+AUDIT_LOG_MAX_BYTES = int(os.environ.get("AUDIT_LOG_MAX_BYTES", 50 * 1024 * 1024))
+AUDIT_LOG_BACKUP_COUNT = int(os.environ.get("AUDIT_LOG_BACKUP_COUNT", 30))
+
+# Exact roll statistics
+STATS_CACHE_SIZE = 256
+STATS_MAX_WORK = 2000000
+STATS_PERCENTILES = (5, 25, 50, 75, 95)
+STATS_HISTOGRAM_ROWS = 15
+STATS_HISTOGRAM_WIDTH = 20
+STATS_HISTOGRAM_TAIL = 0.0005
+
+# Simulated roll statistics
+SIMULATION_WORKERS = int(os.environ.get("SIMULATION_WORKERS", 0))
+SIMULATION_DEFAULT_TRIALS = 1000000
+SIMULATION_MAX_TRIALS = 10000000
+SIMULATION_TIME_BUDGET = 10.0
+SIMULATION_BATCH_SIZE = 50000
+SIMULATION_BATCH_ROLLS = 2000000
+SIMULATION_CONFIDENCE_Z = 1.96
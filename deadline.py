@@ -0,0 +1,76 @@
+import config
+
+from contextvars import ContextVar
+import time
+
+# When the current command has to be finished by (time.monotonic()), None outside of commands.
+# Lanes copy the context into their threads, so blocking work can check it too
+COMMAND_DEADLINE = ContextVar("commandDeadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """
+    Raised when the current command runs out of time, so no more work is done for it
+    """
+    def __init__(self, stage: str):
+        super().__init__(f"Ran out of time during {stage}")
+        self.stage = stage
+
+
+def getCommandDeadline(commandName: str):
+    """
+    FUNC NAME: getCommandDeadline
+    FUNC DESC: Returns how many seconds a command gets to finish
+    FUNC TYPE: Function
+    """
+    return config.COMMAND_DEADLINES.get(commandName, config.COMMAND_DEFAULT_DEADLINE)
+
+
+def startDeadline(seconds: float):
+    """
+    FUNC NAME: startDeadline
+    FUNC DESC: Gives the rest of the current command seconds to finish
+    FUNC TYPE: Function
+    """
+    COMMAND_DEADLINE.set(time.monotonic() + seconds)
+
+
+def clearDeadline():
+    """
+    FUNC NAME: clearDeadline
+    FUNC DESC: Takes the deadline off the current context, for background work started by a command that shouldn't share its deadline
+    FUNC TYPE: Function
+    """
+    COMMAND_DEADLINE.set(None)
+
+
+def remainingTime():
+    """
+    FUNC NAME: remainingTime
+    FUNC DESC: Returns the seconds left before the current command's deadline (negative once it has passed), or None if there is no deadline
+    FUNC TYPE: Function
+    """
+    deadline = COMMAND_DEADLINE.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def checkDeadline(stage: str):
+    """
+    FUNC NAME: checkDeadline
+    FUNC DESC: Raises DeadlineExceeded if the current command's deadline has passed. Called before each stage of work
+    FUNC TYPE: Function
+    """
+    remaining = remainingTime()
+    if remaining is not None and remaining <= 0:
+        raise DeadlineExceeded(stage)
+
+
+def upstreamTimeout(stage: str):
+    """
+    FUNC NAME: upstreamTimeout
+    FUNC DESC: Returns the timeout for an upstream request, which can never outlive the current command's deadline
+    FUNC TYPE: Function
+    """
+    checkDeadline(stage)
+    remaining = remainingTime()
+    return config.UPSTREAM_TIMEOUT if remaining is None else min(config.UPSTREAM_TIMEOUT, remaining)
@@ -0,0 +1,441 @@
+import config
+
+from typing import NamedTuple, Union
+from functools import lru_cache
+from collections import Counter
+import random
+import heapq
+import re
+
+# Matches (in order) whitespace, advantage keywords, dice (with any modifiers), numbers, operators & brackets. Anything else is unrecognised
+TOKEN_REGEX = re.compile(
+    r"\s+|(?P<keyword>adv|dis)"
+    r"|(?P<dice>(?P<rolls>[0-9]*)d(?P<sides>[0-9]+)(?P<modifiers>(?:!|r[0-9]+|k[hl]?[0-9]+|d[hl][0-9]+)*))"
+    r"|(?P<number>[0-9]*\.?[0-9]+)|(?P<symbol>[-+*/()])"
+)
+MODIFIER_REGEX = re.compile(r"(?P<explode>!)|r(?P<reroll>[0-9]+)|(?P<select>k[hl]?|d[hl])(?P<count>[0-9]+)")
+# Advantage & disadvantage are shorthand for keeping the highest or lowest of 2d20
+KEYWORD_DICE = {"adv": ("2", "20", "kh1"), "dis": ("2", "20", "kl1")}
+
+
+class DiceSyntaxError(Exception):
+    """
+    Raised when a calculation can't be understood, culprit is the offending part of it
+    """
+    def __init__(self, culprit):
+        super().__init__(culprit)
+        self.culprit = culprit
+
+
+class DiceSizeError(DiceSyntaxError):
+    """
+    Raised when a number or dice in a calculation is too low or high, limit is the maximum it can be
+    """
+    def __init__(self, culprit, limit: int = config.ROLL_MAX_PARAM_VALUE):
+        super().__init__(culprit)
+        self.limit = limit
+        # Keep both arguments so the error survives being pickled back from a simulation worker
+        self.args = (culprit, limit)
+
+
+class DiceOperatorError(DiceSyntaxError):
+    """
+    Raised when a calculation contains an operator that isn't supported
+    """
+
+
+# Nodes of a parsed calculation. NamedTuples are hashable so parsed calculations can be cached and shared
+class Number(NamedTuple):
+    value: Union[int, float]
+
+
+class Dice(NamedTuple):
+    rolls: int
+    sides: int
+    # ("h" or "l", count) to only keep the highest or lowest count dice
+    keep: tuple = None
+    # Roll another dice every time a dice lands on its highest side
+    explode: bool = False
+    # Reroll (once) any dice that lands on this side
+    reroll: int = None
+
+
+class Negate(NamedTuple):
+    operand: "Node"
+
+
+class BinaryOperation(NamedTuple):
+    operator: str
+    left: "Node"
+    right: "Node"
+
+
+Node = Union[Number, Dice, Negate, BinaryOperation]
+
+
+def parseDice(rollsText: str, sidesText: str, modifiersText: str):
+    """
+    FUNC NAME: parseDice
+    FUNC DESC: Builds and validates a dice node from the rolls, sides and modifiers (e.g. kh3, !, r1) of a dice token
+    FUNC TYPE: Function
+    """
+    # Default to 1 roll if none are supplied
+    rolls = int(rollsText) if rollsText != "" else 1
+    sides = int(sidesText)
+    if rolls < 1 or rolls > config.ROLL_MAX_ROLLS:
+        raise DiceSizeError(rolls, config.ROLL_MAX_ROLLS)
+    if sides < 2 or sides >= config.ROLL_MAX_PARAM_VALUE:
+        raise DiceSizeError(sides)
+
+    keep = None
+    explode = False
+    reroll = None
+    for modifier in MODIFIER_REGEX.finditer(modifiersText):
+        if modifier.group("explode") is not None:
+            explode = True
+
+        elif modifier.group("reroll") is not None:
+            reroll = int(modifier.group("reroll"))
+            if reroll < 1 or reroll > sides:
+                raise DiceSizeError(reroll, sides)
+
+        else:
+            if keep is not None:
+                raise DiceSyntaxError(f"{rolls}d{sides}{modifiersText} CAN ONLY KEEP OR DROP ONCE")
+            count = int(modifier.group("count"))
+            if count < 1 or count > rolls:
+                raise DiceSizeError(count, rolls)
+
+            # Dropping the lowest dice is the same as keeping the highest of the rest (and vice versa)
+            select = modifier.group("select")
+            if select in ("k", "kh"):
+                keep = ("h", count)
+            elif select == "kl":
+                keep = ("l", count)
+            elif select == "dl":
+                keep = ("h", rolls - count)
+            else:
+                keep = ("l", rolls - count)
+            if keep[1] == 0:
+                raise DiceSizeError(count, rolls - 1)
+
+    return Dice(rolls, sides, keep, explode, reroll)
+
+
+def isPlainDice(node: Node):
+    """
+    FUNC NAME: isPlainDice
+    FUNC DESC: Checks if a node is dice without any modifiers
+    FUNC TYPE: Function
+    """
+    return isinstance(node, Dice) and node.keep is None and not node.explode and node.reroll is None
+
+
+def tokenise(calculation: str):
+    """
+    FUNC NAME: tokenise
+    FUNC DESC: Splits a calculation into dice, number and symbol tokens. Spaces between tokens are optional
+    FUNC TYPE: Function
+    """
+    tokens = []
+    position = 0
+    while position < len(calculation):
+        tokenMatch = TOKEN_REGEX.match(calculation, position)
+
+        if tokenMatch is None:
+            culprit = calculation[position]
+            if culprit.isalnum() or culprit == ".":
+                raise DiceSyntaxError(calculation[position:].split()[0])
+            raise DiceOperatorError(culprit)
+
+        if tokenMatch.group("keyword") is not None:
+            tokens.append(("dice", parseDice(*KEYWORD_DICE[tokenMatch.group("keyword")])))
+
+        elif tokenMatch.group("dice") is not None:
+            tokens.append(("dice", parseDice(tokenMatch.group("rolls"), tokenMatch.group("sides"), tokenMatch.group("modifiers"))))
+
+        elif tokenMatch.group("number") is not None:
+            numberText = tokenMatch.group("number")
+            number = float(numberText) if "." in numberText else int(numberText)
+            if number > config.ROLL_MAX_PARAM_VALUE:
+                raise DiceSizeError(number)
+            tokens.append(("number", Number(number)))
+
+        elif tokenMatch.group("symbol") is not None:
+            tokens.append(("symbol", tokenMatch.group("symbol")))
+
+        position = tokenMatch.end()
+
+    return tokens
+
+
+class Parser:
+    """
+    Recursive descent parser turning tokens into a tree of nodes, applying * and / before + and -
+    """
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.position = 0
+
+    def peek(self):
+        if self.position < len(self.tokens):
+            return self.tokens[self.position]
+        return (None, None)
+
+    def advance(self):
+        token = self.peek()
+        self.position += 1
+        return token
+
+    def parse(self):
+        if len(self.tokens) == 0:
+            raise DiceSyntaxError("NO DICE SIDES DETECTED! TRY CHECKING YOUR SYNTAX AND /roll USAGE")
+        node = self.parseExpression()
+        if self.position < len(self.tokens):
+            tokenType, tokenValue = self.peek()
+            raise DiceSyntaxError(tokenValue if tokenType == "symbol" else describeNode(tokenValue))
+        return node
+
+    def parseExpression(self):
+        node = self.parseTerm()
+        while self.peek() in (("symbol", "+"), ("symbol", "-")):
+            operator = self.advance()[1]
+            node = BinaryOperation(operator, node, self.parseTerm())
+        return node
+
+    def parseTerm(self):
+        node = self.parseUnary()
+        while self.peek() in (("symbol", "*"), ("symbol", "/")):
+            operator = self.advance()[1]
+            node = BinaryOperation(operator, node, self.parseUnary())
+        return node
+
+    def parseUnary(self):
+        if self.peek() == ("symbol", "-"):
+            self.advance()
+            return Negate(self.parseUnary())
+        return self.parsePrimary()
+
+    def parsePrimary(self):
+        tokenType, tokenValue = self.advance()
+        if tokenType in ("dice", "number"):
+            return tokenValue
+        if tokenValue == "(":
+            node = self.parseExpression()
+            if self.advance() != ("symbol", ")"):
+                raise DiceSyntaxError("MISSING CLOSING BRACKET")
+            return node
+        if tokenValue is None:
+            raise DiceSyntaxError("CALCULATION ENDS WITH AN OPERATOR")
+        raise DiceSyntaxError(tokenValue)
+
+
+def normaliseCalculation(calculation: str):
+    """
+    FUNC NAME: normaliseCalculation
+    FUNC DESC: Lowercases a calculation and collapses whitespace so equivalent calculations share a cache entry
+    FUNC TYPE: Function
+    """
+    return " ".join(calculation.lower().split())
+
+
+@lru_cache(maxsize=config.DICE_EXPRESSION_CACHE_SIZE)
+def parseNormalisedCalculation(normalisedCalculation: str):
+    return Parser(tokenise(normalisedCalculation)).parse()
+
+
+def compileCalculation(calculation: str):
+    """
+    FUNC NAME: compileCalculation
+    FUNC DESC: Parses a calculation into a tree of nodes. Repeated calculations are served from an LRU cache
+    FUNC TYPE: Function
+    """
+    return parseNormalisedCalculation(normaliseCalculation(calculation))
+
+
+def describeNode(node: Node):
+    """
+    FUNC NAME: describeNode
+    FUNC DESC: Turns a node back into dice notation for displaying to the user
+    FUNC TYPE: Function
+    """
+    if isinstance(node, Number):
+        return str(node.value)
+    if isinstance(node, Dice):
+        return "{}d{}{}{}{}".format(
+            node.rolls,
+            node.sides,
+            "!" if node.explode else "",
+            f"r{node.reroll}" if node.reroll is not None else "",
+            f"k{node.keep[0]}{node.keep[1]}" if node.keep is not None else ""
+        )
+    if isinstance(node, Negate):
+        return f"-{describeNode(node.operand)}"
+    return f"({describeNode(node.left)} {node.operator} {describeNode(node.right)})"
+
+
+def countRolls(node: Node):
+    """
+    FUNC NAME: countRolls
+    FUNC DESC: Counts how many dice a single roll of a parsed calculation throws
+    FUNC TYPE: Function
+    """
+    if isinstance(node, Dice):
+        return node.rolls
+    if isinstance(node, Negate):
+        return countRolls(node.operand)
+    if isinstance(node, BinaryOperation):
+        return countRolls(node.left) + countRolls(node.right)
+    return 0
+
+
+def rollFaces(dice: Dice, rng: random.Random = random, repeats: int = 1):
+    """
+    FUNC NAME: rollFaces
+    FUNC DESC: Rolls a dice term for every repeat with a single bulk call to the RNG, returning one list of faces per repeat.
+               Rerolls and explosions are applied here, keeping & dropping is left to selectFaces
+    FUNC TYPE: Function
+    """
+    sides = range(1, dice.sides + 1)
+    faces = rng.choices(sides, k=dice.rolls * repeats)
+    allFaces = [faces] if repeats == 1 else [faces[index:index + dice.rolls] for index in range(0, len(faces), dice.rolls)]
+
+    if dice.reroll is not None or dice.explode:
+        for faces in allFaces:
+            if dice.reroll is not None and dice.reroll in faces:
+                faces[:] = [rng.choice(sides) if face == dice.reroll else face for face in faces]
+
+            # Each round rolls one more dice per maximum in the last round, capped so a lucky streak can't go on forever
+            newFaces = faces
+            for _ in range(config.ROLL_MAX_EXPLOSIONS if dice.explode else 0):
+                explosions = newFaces.count(dice.sides)
+                if explosions == 0:
+                    break
+                newFaces = rng.choices(sides, k=explosions)
+                faces.extend(newFaces)
+
+    return allFaces
+
+
+def selectFaces(dice: Dice, faces: list):
+    """
+    FUNC NAME: selectFaces
+    FUNC DESC: Splits rolled faces into the kept and dropped ones. Only the kept dice are ordered (with a bounded heap),
+               the dropped ones are whatever is left over after counting
+    FUNC TYPE: Function
+    """
+    if dice.keep is None:
+        return faces, []
+    direction, count = dice.keep
+    kept = heapq.nlargest(count, faces) if direction == "h" else heapq.nsmallest(count, faces)
+    return kept, list((Counter(faces) - Counter(kept)).elements())
+
+
+def applyOperator(operator: str, left, right):
+    """
+    FUNC NAME: applyOperator
+    FUNC DESC: Applies a numeric operator to two values
+    FUNC TYPE: Function
+    """
+    if operator == "+":
+        return left + right
+    elif operator == "-":
+        return left - right
+    elif operator == "*":
+        return left * right
+    elif operator == "/":
+        if right == 0:
+            raise DiceSyntaxError("DIVISION BY ZERO")
+        return left / right
+    raise DiceOperatorError(operator)
+
+
+def evaluate(node: Node, rng: random.Random = random, repeats: int = 1, steps: list = None):
+    """
+    FUNC NAME: evaluate
+    FUNC DESC: Rolls and calculates a parsed calculation repeats times in one batch, returning a total per repeat.
+               If steps (a list per repeat) is given, each dice roll and operation is appended to it in the order they happened
+    FUNC TYPE: Function
+    """
+    if isinstance(node, Number):
+        return [node.value] * repeats
+
+    if isinstance(node, Dice):
+        allFaces = rollFaces(node, rng, repeats)
+        if node.keep is None:
+            totals = [sum(faces) for faces in allFaces]
+            if steps is not None:
+                notation = describeNode(node)
+                for repeatSteps, faces, total in zip(steps, allFaces, totals):
+                    repeatSteps.append({"type": "dice", "notation": notation, "sides": node.sides, "results": faces, "dropped": [], "total": total})
+            return totals
+
+        # Only work out the dropped dice when they are going to be displayed
+        direction, count = node.keep
+        if steps is None:
+            select = heapq.nlargest if direction == "h" else heapq.nsmallest
+            return [sum(select(count, faces)) for faces in allFaces]
+
+        totals = []
+        notation = describeNode(node)
+        for repeatSteps, faces in zip(steps, allFaces):
+            kept, dropped = selectFaces(node, faces)
+            totals.append(sum(kept))
+            repeatSteps.append({"type": "dice", "notation": notation, "sides": node.sides, "results": kept, "dropped": dropped, "total": totals[-1]})
+        return totals
+
+    if isinstance(node, Negate):
+        return [-total for total in evaluate(node.operand, rng, repeats, steps)]
+
+    lefts = evaluate(node.left, rng, repeats, steps)
+    rights = evaluate(node.right, rng, repeats, steps)
+    totals = [applyOperator(node.operator, left, right) for left, right in zip(lefts, rights)]
+    if steps is not None:
+        for repeatSteps, left, right, total in zip(steps, lefts, rights, totals):
+            repeatSteps.append({"type": "operator", "operator": node.operator, "left": left, "right": right, "total": total})
+    return totals
+
+
+def summariseFaces(faces: list, sides: int, buckets: int = None):
+    """
+    FUNC NAME: summariseFaces
+    FUNC DESC: Summarises a big list of rolled faces with how often each face (or range of faces for big dice) came up,
+               plus the lowest, highest, mean and total
+    FUNC TYPE: Function
+    """
+    buckets = buckets or config.ROLL_SUMMARY_BUCKETS
+    total = sum(faces)
+    faceCounts = Counter(faces)
+
+    # Group faces into even ranges when there are too many sides to list each one
+    bucketSize = -(-sides // buckets)
+    histogram = []
+    for start in range(1, sides + 1, bucketSize):
+        end = min(start + bucketSize - 1, sides)
+        label = str(start) if start == end else f"{start}-{end}"
+        histogram.append((label, sum(faceCounts[face] for face in range(start, end + 1))))
+
+    return {
+        "count": len(faces),
+        "minimum": min(faces),
+        "maximum": max(faces),
+        "mean": total / len(faces),
+        "total": total,
+        "histogram": histogram
+    }
+
+
+def rollCalculation(calculation: str, rng: random.Random = random, repeats: int = 1):
+    """
+    FUNC NAME: rollCalculation
+    FUNC DESC: Compiles and rolls a calculation repeats times, returning the total and the steps taken to get there for each repeat
+    FUNC TYPE: Function
+    """
+    node = compileCalculation(calculation)
+    rollCount = countRolls(node) * repeats
+    if rollCount > config.ROLL_MAX_TOTAL_ROLLS:
+        raise DiceSizeError(rollCount, config.ROLL_MAX_TOTAL_ROLLS)
+
+    steps = [[] for _ in range(repeats)]
+    totals = evaluate(node, rng, repeats, steps)
+    return totals, steps
@@ -0,0 +1,150 @@
+import config
+import cache
+from cache import ResponseCache
+from metrics import DUPLICATE_RESPONSES
+from tracing import traceSpan
+
+import discord
+import logging
+import json
+import time
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+# Responses recently sent to each channel keyed by (channel id, command, normalised arguments). Messages & embeds only exist in
+# this process, which is fine as a channel's commands always arrive at the process running its shard
+RECENT_RESPONSES = ResponseCache("recent", config.DUPLICATE_CACHE_SIZE, ttl=config.DUPLICATE_MAX_WINDOW, shared=False)
+
+# Duplicate settings each server has chosen with /duplicates, kept in the shared store under the guild id
+GUILD_SETTINGS_NAMESPACE = "guild settings"
+
+
+def duplicateKey(channelId: int, commandName: str, *arguments):
+    """
+    FUNC NAME: duplicateKey
+    FUNC DESC: Returns the key a command's response is remembered under. Arguments are lowercased & their whitespace collapsed,
+               so "Adult  Black Dragon" and "adult black dragon" are the same command
+    FUNC TYPE: Function
+    """
+    return (channelId, commandName, tuple(" ".join(str(argument).lower().split()) for argument in arguments))
+
+
+def getDuplicateSettings(guildId: int):
+    """
+    FUNC NAME: getDuplicateSettings
+    FUNC DESC: Returns the (mode, window) a server has chosen for duplicate commands, or the defaults from config.py
+    FUNC TYPE: Function
+    """
+    settings = cache.SHARED_STORE.get(GUILD_SETTINGS_NAMESPACE, guildId) if guildId is not None else None
+    if settings is None:
+        return config.DUPLICATE_MODE, config.DUPLICATE_WINDOW
+    return settings.get("mode", config.DUPLICATE_MODE), settings.get("window", config.DUPLICATE_WINDOW)
+
+
+def setDuplicateSettings(guildId: int, mode: str, window: int):
+    """
+    FUNC NAME: setDuplicateSettings
+    FUNC DESC: Stores a server's duplicate command settings in the shared store. They aren't saved to disk until saveGuildSettings is called,
+               which commands hand to the background lane
+    FUNC TYPE: Function
+    """
+    cache.SHARED_STORE.put(GUILD_SETTINGS_NAMESPACE, guildId, {"mode": mode, "window": window})
+
+
+def loadGuildSettings():
+    """
+    FUNC NAME: loadGuildSettings
+    FUNC DESC: Loads the settings servers chose in a previous run of the bot. Only the primary shard loads them, as the store is shared
+    FUNC TYPE: Function
+    """
+    if not config.PRIMARY_SHARD or not os.path.exists(config.GUILD_SETTINGS_FILE):
+        return
+
+    try:
+        with open(config.GUILD_SETTINGS_FILE, "r") as settingsFile:
+            savedSettings = json.load(settingsFile)
+    except (OSError, ValueError) as loadError:
+        LOGGER.warning(f"Failed to load guild settings file {config.GUILD_SETTINGS_FILE}: {loadError}")
+        return
+
+    # JSON keys are always strings, guild ids aren't
+    for guildId, settings in savedSettings.items():
+        cache.SHARED_STORE.put(GUILD_SETTINGS_NAMESPACE, int(guildId), settings)
+    LOGGER.info(f"Loaded settings for {len(savedSettings)} servers")
+
+
+def saveGuildSettings():
+    """
+    FUNC NAME: saveGuildSettings
+    FUNC DESC: Writes every server's settings to disk, replacing the old file in one step so it is never half written.
+               Any process can save them, as the settings from every shard are in the shared store
+    FUNC TYPE: Function
+    """
+    try:
+        snapshot = cache.SHARED_STORE.snapshot(GUILD_SETTINGS_NAMESPACE)
+        os.makedirs(config.DATA_DIRECTORY, exist_ok=True)
+        tempFileName = f"{config.GUILD_SETTINGS_FILE}.{os.getpid()}.tmp"
+        with open(tempFileName, "w") as settingsFile:
+            json.dump({str(guildId): settings for guildId, settings in snapshot.items()}, settingsFile)
+        os.replace(tempFileName, config.GUILD_SETTINGS_FILE)
+    except OSError as saveError:
+        LOGGER.warning(f"Failed to save guild settings file {config.GUILD_SETTINGS_FILE}: {saveError}")
+
+
+def findRecentResponse(guildId: int, key: tuple):
+    """
+    FUNC NAME: findRecentResponse
+    FUNC DESC: Returns the response remembered under key (with the server's mode added) if it was sent within the server's window
+               & its files still exist, otherwise None. Asks the shared store for the server's settings, so commands run it in the lookup lane
+    FUNC TYPE: Function
+    """
+    mode, window = getDuplicateSettings(guildId)
+    if mode == "off" or window <= 0:
+        return None
+    recent = RECENT_RESPONSES.get(key)
+    if recent is None or time.time() - recent["sentAt"] > window:
+        return None
+    # Files are removed by cleanup.py, so run the command again if any have gone missing since
+    if not all(os.path.exists(filePath) for filePath in recent["files"]):
+        return None
+    return {**recent, "mode": mode}
+
+
+def rememberResponse(key: tuple, messages: list, embeds: list, files: list):
+    """
+    FUNC NAME: rememberResponse
+    FUNC DESC: Remembers a response sent to a channel so identical commands can be answered from it. The embeds are kept as they are,
+               so a Scryfall picture added to them after sending is reused too
+    FUNC TYPE: Function
+    """
+    if len(messages) <= 0:
+        return
+    RECENT_RESPONSES.put(key, {"sentAt": time.time(), "jumpUrl": messages[0].jump_url, "embeds": embeds, "files": list(files)})
+
+
+async def sendRecentResponse(interaction, commandName: str, recent: dict):
+    """
+    FUNC NAME: sendRecentResponse
+    FUNC DESC: Answers a duplicate command from the response found by findRecentResponse, either linking to it or sending it again
+    FUNC TYPE: Function
+    """
+    mode = recent["mode"]
+    DUPLICATE_RESPONSES.inc(commandName, mode)
+    LOGGER.info(f"Answering duplicate /{commandName} in channel {interaction.channel_id} with {mode}")
+
+    if mode == "point":
+        pointerEmbed = discord.Embed(
+            colour=discord.Colour.blue(),
+            title="Already answered!",
+            description=f"The same `/{commandName}` was sent in this channel **{int(time.time() - recent['sentAt'])}** seconds ago. [See the answer here]({recent['jumpUrl']})"
+        )
+        with traceSpan("send", embeds=1, duplicate=mode):
+            return await interaction.followup.send(embed=pointerEmbed)
+
+    for embed in recent["embeds"]:
+        with traceSpan("send", embeds=1, duplicate=mode):
+            await interaction.followup.send(embed=embed.copy())
+    if len(recent["files"]) > 0:
+        with traceSpan("send", files=len(recent["files"]), duplicate=mode):
+            await interaction.followup.send(files=[discord.File(filePath) for filePath in recent["files"]])
@@ -1,6 +1,8 @@
+from logger import LazyPayload
 import discord
 import logging
 import config
+import math
 
 LOGGER = logging.getLogger(__name__)
 
@@ -24,7 +26,7 @@ def codeError(statusCode: int, query: str):
     )
 
     codeEmbed.set_thumbnail(url="https://i.imgur.com/j3OoT8F.png")
-    LOGGER.error(f"Sending Open5e Root API Request FAILED embed = {codeEmbed.to_dict()}")
+    LOGGER.error("Sending Open5e Root API Request FAILED embed = %s", LazyPayload(codeEmbed.to_dict))
     return codeEmbed
 
 
@@ -57,14 +59,14 @@ def invalidArgSupplied(culprit):
     return invalidArgsEmbed
 
 
-def invalidSizeSupplied(culprit):
+def invalidSizeSupplied(culprit, limit: int = config.ROLL_MAX_PARAM_VALUE):
     """
     Returns an invalid size of args supplied embed
     """
     invalidSizeEmbed = discord.Embed(
         color=discord.Colour.red(),
         title=f"Invalid size of argument (`{culprit}`) supplied to /roll",
-        description=f"ROLLS and SIDES and STATIC NUMBERS supplied to `/roll` must be numbers of a reasonable value (CURRENT LIMIT = {config.ROLL_MAX_PARAM_VALUE}).\n\n**USAGE**\n`?roll [ROLLS]d[SIDES]`\n*Example:* `?roll 3d20 + 3`"
+        description=f"ROLLS and SIDES and STATIC NUMBERS supplied to `/roll` must be numbers of a reasonable value (CURRENT LIMIT = {limit}).\n\n**USAGE**\n`?roll [ROLLS]d[SIDES]`\n*Example:* `?roll 3d20 + 3`"
     )
     invalidSizeEmbed.set_thumbnail(url="https://i.imgur.com/j3OoT8F.png")
     LOGGER.info(f"Invalid size of argument supplied to /roll = {culprit}")
@@ -83,3 +85,51 @@ def unrecognisedNumericOperator(numericOperator):
     invalidOperatorEmbed.set_thumbnail(url="https://i.imgur.com/j3OoT8F.png")
     LOGGER.info(f"Unrecognised numeric operator supplied to /roll = {numericOperator}")
     return invalidOperatorEmbed
+
+
+def rateLimited(retryAfter: float):
+    """
+    FUNC NAME: rateLimited
+    FUNC DESC: Sends an embed informing the user that they (or their server) are sending commands too quickly
+    FUNC TYPE: Error
+    """
+    # The wait can only be infinite if the limits are misconfigured (e.g. nothing refills), which has no number of seconds to show
+    retryMessage = f"Please try again in **{math.ceil(retryAfter)}** seconds." if math.isfinite(retryAfter) else "Please try again later."
+    rateLimitedEmbed = discord.Embed(
+        color=discord.Colour.orange(),
+        title="Slow down a little!",
+        description=f"Too many commands have been sent from here recently. {retryMessage}\n\nCommands that list whole directories (like `/lst`) use up more of the limit than quick ones like `/roll`."
+    )
+    rateLimitedEmbed.set_thumbnail(url="https://i.imgur.com/j3OoT8F.png")
+    return rateLimitedEmbed
+
+
+def unknownSeed(seed: int):
+    """
+    FUNC NAME: unknownSeed
+    FUNC DESC: Sends an embed informing the user that there is no audited roll with the seed they asked /replay for
+    FUNC TYPE: Error
+    """
+    unknownSeedEmbed = discord.Embed(
+        color=discord.Colour.red(),
+        title=f"NO ROLL WITH SEED `{seed}`",
+        description="Only rolls made by this bot can be replayed. Check the seed at the bottom of the roll and try again."
+    )
+    unknownSeedEmbed.set_thumbnail(url="https://i.imgur.com/j3OoT8F.png")
+    LOGGER.info(f"Unknown seed supplied to /replay = {seed}")
+    return unknownSeedEmbed
+
+
+def commandTimedOut():
+    """
+    FUNC NAME: commandTimedOut
+    FUNC DESC: Sends an embed informing the user that their command took too long and was given up on
+    FUNC TYPE: Error
+    """
+    timedOutEmbed = discord.Embed(
+        color=discord.Colour.red(),
+        title="ERROR - Took too long",
+        description="Your command took too long to finish, most likely because Open5e is slow to respond right now. Please try again in a little while."
+    )
+    timedOutEmbed.set_thumbnail(url="https://i.imgur.com/j3OoT8F.png")
+    return timedOutEmbed
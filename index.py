@@ -0,0 +1,105 @@
+import config
+
+import threading
+import logging
+import gzip
+import json
+import time
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+
+class EntityIndex:
+    """
+    In-memory copy of every Open5e directory, searched instead of asking Open5e for each command.
+    It is built in the background, so until it is ready every lookup returns None and callers use the live API
+    """
+    def __init__(self):
+        self.directories = {}
+        self.allEntities = []
+        self.builtAt = None
+        self.readyEvent = threading.Event()
+
+    def ready(self):
+        return self.readyEvent.is_set()
+
+    def load(self, directories: dict, builtAt: float):
+        """
+        Swaps in a new set of directories in one step, so lookups never see half of them
+        """
+        for directory, entities in directories.items():
+            for entity in entities:
+                # Directory listings don't always say where their entities live, search/ results do
+                entity.setdefault("route", f"{directory}/")
+        self.directories, self.allEntities = directories, [entity for entities in directories.values() for entity in entities]
+        self.builtAt = builtAt
+        self.readyEvent.set()
+        LOGGER.info(f"Entity index ready with {len(self.allEntities)} entities from {len(directories)} directories")
+
+    def candidates(self, scope: str):
+        """
+        Returns every entity in a directory (or all of them for search), or None if the index can't answer for that scope
+        """
+        if not self.ready():
+            return None
+        if scope == "search":
+            return self.allEntities
+        return self.directories.get(scope)
+
+
+ENTITY_INDEX = EntityIndex()
+
+
+def loadIndexSnapshot():
+    """
+    FUNC NAME: loadIndexSnapshot
+    FUNC DESC: Reads the entity index saved by a previous run, returning (directories, time it was built) or None if there isn't a readable one
+    FUNC TYPE: Function
+    """
+    if not os.path.exists(config.ENTITY_INDEX_SNAPSHOT):
+        return None
+    try:
+        with gzip.open(config.ENTITY_INDEX_SNAPSHOT, "rt", encoding="utf-8") as snapshotFile:
+            snapshot = json.load(snapshotFile)
+    except (OSError, ValueError) as loadError:
+        LOGGER.warning(f"Failed to load entity index snapshot {config.ENTITY_INDEX_SNAPSHOT}: {loadError}")
+        return None
+    return snapshot["directories"], snapshot["built"]
+
+
+def saveIndexSnapshot(directories: dict, builtAt: float):
+    """
+    FUNC NAME: saveIndexSnapshot
+    FUNC DESC: Saves the entity index so the next run can start from it, replacing the old file in one step so it is never half written
+    FUNC TYPE: Function
+    """
+    try:
+        os.makedirs(os.path.dirname(config.ENTITY_INDEX_SNAPSHOT), exist_ok=True)
+        tempFileName = f"{config.ENTITY_INDEX_SNAPSHOT}.{os.getpid()}.tmp"
+        with gzip.open(tempFileName, "wt", encoding="utf-8") as snapshotFile:
+            json.dump({"built": builtAt, "directories": directories}, snapshotFile)
+        os.replace(tempFileName, config.ENTITY_INDEX_SNAPSHOT)
+    except OSError as saveError:
+        LOGGER.warning(f"Failed to save entity index snapshot {config.ENTITY_INDEX_SNAPSHOT}: {saveError}")
+
+
+def snapshotModified():
+    """
+    FUNC NAME: snapshotModified
+    FUNC DESC: Returns when the entity index snapshot was last saved (as a file modification time), or None if there isn't one
+    FUNC TYPE: Function
+    """
+    try:
+        return os.path.getmtime(config.ENTITY_INDEX_SNAPSHOT)
+    except OSError:
+        return None
+
+
+def snapshotIsFresh(builtAt: float):
+    """
+    FUNC NAME: snapshotIsFresh
+    FUNC DESC: Whether an index built at builtAt is recent enough to use without downloading every directory again
+    FUNC TYPE: Function
+    """
+    return time.time() - builtAt < config.ENTITY_INDEX_MAX_AGE
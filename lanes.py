@@ -0,0 +1,150 @@
+import config
+from metrics import Gauge, registerMetric
+from deadline import checkDeadline, remainingTime, DeadlineExceeded
+from profiler import PROFILER
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import contextvars
+import threading
+import asyncio
+import logging
+
+LOGGER = logging.getLogger(__name__)
+
+
+class Lane:
+    """
+    A class of blocking work with its own threads. At most workers jobs run at once, the rest wait their turn in this lane only,
+    so a pile up of heavy lookups can never hold up a cheap /roll. Callers stop waiting (in line or for the result) at their command's deadline
+    """
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"lane-{name}")
+        self.semaphore = None
+        self.waiting = 0
+        self.running = 0
+
+    async def run(self, func, *args):
+        # Created on first use so it belongs to the client's event loop
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.workers)
+
+        # Don't queue up work for a command that has already run out of time
+        checkDeadline(f"{self.name} lane")
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self.semaphore.acquire(), remainingTime())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"wait for the {self.name} lane") from None
+        finally:
+            self.waiting -= 1
+
+        self.running += 1
+        try:
+            # Carry the caller's context over like asyncio.to_thread does, so records logged in the lane know which command they're for
+            # (and the profiler knows whose work the thread is doing)
+            context = contextvars.copy_context()
+            job = asyncio.get_running_loop().run_in_executor(self.executor, partial(context.run, PROFILER.runJob, func, *args))
+        except BaseException:
+            self.finishJob(None)
+            raise
+        # The slot is only freed once the thread is done, even if the command stops waiting for it at its deadline
+        job.add_done_callback(self.finishJob)
+
+        try:
+            return await asyncio.wait_for(asyncio.shield(job), remainingTime())
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded(f"{self.name} lane") from None
+
+    async def stream(self, func, *args):
+        # Runs a generator in the lane, handing over each item as soon as it's yielded rather than when the generator is done
+        loop = asyncio.get_running_loop()
+        items = asyncio.Queue()
+        stopped = threading.Event()
+
+        def produce():
+            for item in func(*args):
+                loop.call_soon_threadsafe(items.put_nowait, item)
+                if stopped.is_set():
+                    return
+                checkDeadline(f"{self.name} lane")
+
+        job = asyncio.ensure_future(self.run(produce))
+        nextItem = None
+        try:
+            while True:
+                nextItem = asyncio.ensure_future(items.get())
+                await asyncio.wait((nextItem, job), return_when=asyncio.FIRST_COMPLETED)
+                if nextItem.done():
+                    yield nextItem.result()
+                    continue
+
+                # The job has finished (or failed, which is raised here), so everything it yielded is already queued
+                nextItem.cancel()
+                job.result()
+                while not items.empty():
+                    yield items.get_nowait()
+                return
+        finally:
+            # Stop producing if the caller stops taking items part way through, nothing will look at the job's result then
+            stopped.set()
+            if nextItem is not None and not nextItem.done():
+                nextItem.cancel()
+            job.add_done_callback(lambda finishedJob: finishedJob.cancelled() or finishedJob.exception())
+
+    def finishJob(self, job):
+        self.running -= 1
+        self.semaphore.release()
+        # Abandoned jobs that failed would otherwise warn that their exception was never retrieved
+        if job is not None and not job.cancelled():
+            job.exception()
+
+
+LANES = {laneName: Lane(laneName, workers) for laneName, workers in config.LANE_WORKERS.items()}
+
+
+def collectLaneJobs():
+    """
+    FUNC NAME: collectLaneJobs
+    FUNC DESC: Returns how many jobs are waiting for & running in each lane, for the metrics endpoint
+    FUNC TYPE: Function
+    """
+    laneJobs = {}
+    for lane in LANES.values():
+        laneJobs[(lane.name, "waiting")] = lane.waiting
+        laneJobs[(lane.name, "running")] = lane.running
+    return laneJobs
+
+
+registerMetric(Gauge("oghma_lane_jobs", "Jobs waiting for or running in each priority lane", ("lane", "state"), collectLaneJobs))
+
+
+async def runInLane(laneName: str, func, *args):
+    """
+    FUNC NAME: runInLane
+    FUNC DESC: Runs a blocking function in a lane's threads without blocking the event loop, waiting for a free slot in that lane first
+    FUNC TYPE: Function
+    """
+    return await LANES[laneName].run(func, *args)
+
+
+async def streamInLane(laneName: str, func, *args):
+    """
+    FUNC NAME: streamInLane
+    FUNC DESC: Runs a blocking generator in a lane's threads like runInLane, yielding each of its items as soon as it's ready
+    FUNC TYPE: Generator
+    """
+    async for item in LANES[laneName].stream(func, *args):
+        yield item
+
+
+def shutdownLanes():
+    """
+    FUNC NAME: shutdownLanes
+    FUNC DESC: Stops every lane's threads, abandoning any work that hasn't started
+    FUNC TYPE: Function
+    """
+    for lane in LANES.values():
+        lane.executor.shutdown(wait=False, cancel_futures=True)
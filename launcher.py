@@ -0,0 +1,91 @@
+"""
+# Project: oghma
+# Author: M-Davies
+# https://github.com/M-Davies/oghma
+"""
+
+import config
+from cache import CacheStore, CacheManager
+
+import subprocess
+import threading
+import logging
+import secrets
+import signal
+import sys
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+
+def serveCacheStore(authkey: str):
+    """
+    FUNC NAME: serveCacheStore
+    FUNC DESC: Serves a fresh cache store on a free local port in a background thread, returning its "host:port" address
+    FUNC TYPE: Function
+    """
+    store = CacheStore()
+    CacheManager.register("getStore", callable=lambda: store)
+    server = CacheManager(address=("127.0.0.1", 0), authkey=authkey.encode("utf-8")).get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.address
+    return f"{host}:{port}"
+
+
+def shardsForProcess(processIndex: int, processCount: int, shardCount: int):
+    """
+    FUNC NAME: shardsForProcess
+    FUNC DESC: Splits the shards between processes round robin, e.g. process 1 of 2 runs shards 1, 3, 5...
+    FUNC TYPE: Function
+    """
+    return list(range(processIndex, shardCount, processCount))
+
+
+def launchShards(processCount: int, shardCount: int = None):
+    """
+    FUNC NAME: launchShards
+    FUNC DESC: Runs the bot as processCount processes sharing one cache store, then waits for them to exit.
+               Stopping the launcher stops every shard process
+    FUNC TYPE: Function
+    """
+    shardCount = shardCount or processCount
+    authkey = secrets.token_hex(16)
+    cacheAddress = serveCacheStore(authkey)
+    LOGGER.info(f"Serving shared cache at {cacheAddress}, launching {shardCount} shards over {processCount} processes...")
+
+    botPath = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+    shardProcesses = []
+    for processIndex in range(processCount):
+        shardIds = shardsForProcess(processIndex, processCount, shardCount)
+        shardEnvironment = {
+            **os.environ,
+            "SHARD_IDS": ",".join(map(str, shardIds)),
+            "SHARD_COUNT": str(shardCount),
+            "PROCESS_INDEX": str(processIndex),
+            "CACHE_ADDRESS": cacheAddress,
+            "CACHE_AUTHKEY": authkey
+        }
+        # Every process serves its own metrics, so give each one its own port
+        if config.METRICS_PORT:
+            shardEnvironment["METRICS_PORT"] = str(config.METRICS_PORT + processIndex)
+        shardProcesses.append(subprocess.Popen([sys.executable, botPath], env=shardEnvironment))
+        LOGGER.info(f"Started process {processIndex} (pid {shardProcesses[-1].pid}) with shards {shardIds}")
+
+    # Turn termination into a normal exit so the shards get stopped below
+    signal.signal(signal.SIGTERM, lambda signalNumber, frame: sys.exit(0))
+    try:
+        for shardProcess in shardProcesses:
+            shardProcess.wait()
+    finally:
+        for shardProcess in shardProcesses:
+            # Interrupt rather than kill, so discord.py closes the client and the primary shard saves its state
+            if shardProcess.poll() is None:
+                shardProcess.send_signal(signal.SIGINT)
+        for shardProcess in shardProcesses:
+            shardProcess.wait()
+
+
+if __name__ == "__main__":
+    # Usage: python launcher.py [PROCESSES] (defaults to SHARD_PROCESSES, the shard count defaults to one per process)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s: %(levelname)s: %(name)s: %(message)s")
+    launchShards(int(sys.argv[1]) if len(sys.argv) > 1 else config.SHARD_PROCESSES, config.SHARD_COUNT)
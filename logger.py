@@ -0,0 +1,207 @@
+import config
+
+from logging.handlers import QueueHandler, QueueListener, TimedRotatingFileHandler
+from contextvars import ContextVar
+import logging
+import random
+import queue
+import json
+import time
+import sys
+import os
+
+# Fields describing the command being handled (command, guild, cache outcomes...), added to every record logged while handling it.
+# Lanes copy the context into their threads, so records logged from there get them too
+COMMAND_FIELDS = ContextVar("commandFields", default=None)
+LOG_LISTENER = None
+AUDIT_LISTENER = None
+# Rolls are written through their own logger, so the audit log rotates like the main log but never mixes with it
+AUDIT_LOGGER = logging.getLogger("oghma.audit")
+AUDIT_LOGGER.propagate = False
+AUDIT_LOGGER.setLevel(logging.INFO)
+
+
+class LazyPayload:
+    """
+    Wraps a function building a (usually big) log payload so it's only built if the record is written, and on the writer thread
+    """
+    def __init__(self, build):
+        self.build = build
+
+    def __str__(self):
+        try:
+            return json.dumps(self.build(), default=str)
+        except Exception as buildError:
+            return f"<payload failed to build: {buildError}>"
+
+
+def shouldLogPayload():
+    """
+    FUNC NAME: shouldLogPayload
+    FUNC DESC: Decides whether to dump a payload (like a whole embed), so only a sample of them are logged
+    FUNC TYPE: Function
+    """
+    return config.LOG_PAYLOAD_SAMPLE_RATE > 0 and random.random() < config.LOG_PAYLOAD_SAMPLE_RATE
+
+
+def startCommandFields(**fields):
+    """
+    FUNC NAME: startCommandFields
+    FUNC DESC: Sets the fields added to records for the rest of the current command
+    FUNC TYPE: Function
+    """
+    COMMAND_FIELDS.set(dict(fields))
+
+
+def noteCommandField(name: str, value):
+    """
+    FUNC NAME: noteCommandField
+    FUNC DESC: Adds a field to the current command's records (if there is a current command). List fields are appended to
+    FUNC TYPE: Function
+    """
+    fields = COMMAND_FIELDS.get()
+    if fields is None:
+        return
+    if isinstance(fields.get(name), list):
+        fields[name].append(value)
+    else:
+        fields[name] = value
+
+
+class CommandFieldsFilter(logging.Filter):
+    """
+    Copies the current command's fields onto each record. Runs on the thread that logged it, where the context is available
+    """
+    def filter(self, record: logging.LogRecord):
+        fields = COMMAND_FIELDS.get()
+        if fields:
+            for name, value in fields.items():
+                if not hasattr(record, name):
+                    setattr(record, name, list(value) if isinstance(value, list) else value)
+        return True
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Puts records on the queue as they are, unlike QueueHandler which formats the message first.
+    Formatting (and any LazyPayload) then happens on the writer thread rather than the event loop
+    """
+    def prepare(self, record: logging.LogRecord):
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats records as one line of JSON, including any structured fields they carry
+    """
+    def format(self, record: logging.LogRecord):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(record.created)) + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for name in config.LOG_STRUCTURED_FIELDS:
+            if hasattr(record, name):
+                entry[name] = getattr(record, name)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TimedSizeRotatingFileHandler(TimedRotatingFileHandler):
+    """
+    Rotates the log file on a schedule (e.g. at midnight) or once it grows past maxBytes, whichever comes first
+    """
+    def __init__(self, fileName: str, maxBytes: int, **kwargs):
+        super().__init__(fileName, **kwargs)
+        self.maxBytes = maxBytes
+
+    def shouldRollover(self, record: logging.LogRecord):
+        if super().shouldRollover(record):
+            return True
+        return self.maxBytes > 0 and self.stream is not None and self.stream.tell() >= self.maxBytes
+
+    def rotation_filename(self, default_name: str):
+        # Size rotations can happen several times in one period, so never overwrite an earlier file from the same period
+        rotatedName = default_name
+        suffix = 1
+        while os.path.exists(rotatedName):
+            rotatedName = f"{default_name}.{suffix}"
+            suffix += 1
+        return rotatedName
+
+
+def setupLogging(fileName: str = None):
+    """
+    FUNC NAME: setupLogging
+    FUNC DESC: Sends every record through a queue to a background writer, which writes JSON lines to a rotating file and readable lines to stdout
+    FUNC TYPE: Function
+    """
+    global LOG_LISTENER
+    fileName = fileName or config.LOG_FILE
+    os.makedirs(os.path.dirname(fileName), exist_ok=True)
+
+    fileHandler = TimedSizeRotatingFileHandler(
+        fileName,
+        config.LOG_MAX_BYTES,
+        when=config.LOG_ROTATE_WHEN,
+        backupCount=config.LOG_BACKUP_COUNT,
+        encoding="utf-8"
+    )
+    fileHandler.setFormatter(JsonFormatter())
+    outputHandler = logging.StreamHandler(sys.stdout)
+    outputHandler.setFormatter(logging.Formatter("%(asctime)s: %(levelname)s: %(name)s: %(message)s"))
+
+    logQueue = queue.SimpleQueue()
+    queueHandler = DeferredQueueHandler(logQueue)
+    queueHandler.addFilter(CommandFieldsFilter())
+
+    rootLogger = logging.getLogger()
+    rootLogger.setLevel(config.LOG_LEVEL)
+    rootLogger.addHandler(queueHandler)
+
+    LOG_LISTENER = QueueListener(logQueue, fileHandler, outputHandler, respect_handler_level=True)
+    LOG_LISTENER.start()
+    setupAuditLogging()
+
+
+def setupAuditLogging(fileName: str = None):
+    """
+    FUNC NAME: setupAuditLogging
+    FUNC DESC: Sends rolls recorded to the audit logger through their own queue & background writer to the rotating audit log,
+               so recording a roll never waits on the disk or on other background work
+    FUNC TYPE: Function
+    """
+    global AUDIT_LISTENER
+    fileName = fileName or config.AUDIT_LOG_FILE
+    os.makedirs(os.path.dirname(fileName), exist_ok=True)
+
+    auditHandler = TimedSizeRotatingFileHandler(
+        fileName,
+        config.AUDIT_LOG_MAX_BYTES,
+        when=config.LOG_ROTATE_WHEN,
+        backupCount=config.AUDIT_LOG_BACKUP_COUNT,
+        encoding="utf-8"
+    )
+    auditHandler.setFormatter(logging.Formatter("%(message)s"))
+
+    auditQueue = queue.SimpleQueue()
+    AUDIT_LOGGER.addHandler(DeferredQueueHandler(auditQueue))
+    AUDIT_LISTENER = QueueListener(auditQueue, auditHandler)
+    AUDIT_LISTENER.start()
+
+
+def stopLogging():
+    """
+    FUNC NAME: stopLogging
+    FUNC DESC: Writes out any queued records (audited rolls included) and stops the background writers
+    FUNC TYPE: Function
+    """
+    global LOG_LISTENER, AUDIT_LISTENER
+    if AUDIT_LISTENER is not None:
+        AUDIT_LISTENER.stop()
+        AUDIT_LISTENER = None
+    if LOG_LISTENER is not None:
+        LOG_LISTENER.stop()
+        LOG_LISTENER = None
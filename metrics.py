@@ -0,0 +1,181 @@
+import config
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from bisect import bisect_left
+import threading
+import asyncio
+import logging
+import time
+
+LOGGER = logging.getLogger(__name__)
+
+
+def formatLabels(labelNames: tuple, labelValues: tuple, extra: str = ""):
+    """
+    FUNC NAME: formatLabels
+    FUNC DESC: Formats label names & values as a Prometheus label set, e.g. {command="roll"}
+    FUNC TYPE: Function
+    """
+    labels = [f'{name}="{value}"' for name, value in zip(labelNames, labelValues)]
+    if extra:
+        labels.append(extra)
+    return "{" + ",".join(labels) + "}" if labels else ""
+
+
+class Counter:
+    """
+    Prometheus counter, one value per combination of label values
+    """
+    def __init__(self, name: str, description: str, labelNames: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labelNames = labelNames
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *labelValues, amount: float = 1):
+        with self.lock:
+            self.values[labelValues] = self.values.get(labelValues, 0) + amount
+
+    def render(self):
+        with self.lock:
+            values = dict(self.values)
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{formatLabels(self.labelNames, labelValues)} {value}" for labelValues, value in sorted(values.items())]
+        return lines
+
+
+class Gauge:
+    """
+    Prometheus gauge whose values are read from a callback returning {labelValues: value} when scraped
+    """
+    def __init__(self, name: str, description: str, labelNames: tuple, collect):
+        self.name = name
+        self.description = description
+        self.labelNames = labelNames
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        lines += [f"{self.name}{formatLabels(self.labelNames, labelValues)} {value}" for labelValues, value in sorted(self.collect().items())]
+        return lines
+
+
+class Histogram:
+    """
+    Prometheus histogram with fixed buckets, one set of buckets per combination of label values
+    """
+    def __init__(self, name: str, description: str, labelNames: tuple = (), buckets: tuple = None):
+        self.name = name
+        self.description = description
+        self.labelNames = labelNames
+        self.buckets = tuple(buckets or config.METRICS_LATENCY_BUCKETS)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, *labelValues):
+        with self.lock:
+            # [count per bucket (plus +Inf), sum]
+            series = self.series.setdefault(labelValues, [[0] * (len(self.buckets) + 1), 0.0])
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self):
+        with self.lock:
+            series = {labelValues: (list(counts), total) for labelValues, (counts, total) in self.series.items()}
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labelValues, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                bucketLabel = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{formatLabels(self.labelNames, labelValues, bucketLabel)} {cumulative}")
+            lines.append(f"{self.name}_sum{formatLabels(self.labelNames, labelValues)} {total}")
+            lines.append(f"{self.name}_count{formatLabels(self.labelNames, labelValues)} {cumulative}")
+        return lines
+
+
+COMMAND_REQUESTS = Counter("oghma_command_requests_total", "Commands received, by outcome (ok, rejected, timeout or error)", ("command", "outcome"))
+COMMAND_LATENCY = Histogram("oghma_command_latency_seconds", "Time from a command being admitted to its handler finishing", ("command",))
+UPSTREAM_RESPONSES = Counter("oghma_upstream_responses_total", "Responses from upstream APIs, by host and status code", ("host", "status"))
+UPSTREAM_LATENCY = Histogram("oghma_upstream_latency_seconds", "Time taken by requests to upstream APIs", ("host",))
+CACHE_EVENTS = Counter("oghma_cache_events_total", "Cache hits, misses and evictions", ("cache", "event"))
+THUMBNAIL_OUTCOMES = Counter("oghma_thumbnails_total", "Scryfall pictures for sent entities, by outcome (cached, edited, none, timeout or error)", ("outcome",))
+DUPLICATE_RESPONSES = Counter("oghma_duplicate_responses_total", "Commands answered from an identical one recently sent in the same channel, by mode (reuse or point)", ("command", "mode"))
+EVENT_LOOP_LAG = Histogram("oghma_event_loop_lag_seconds", "How late the event loop woke up for a timer", buckets=config.METRICS_LAG_BUCKETS)
+
+METRICS = [COMMAND_REQUESTS, COMMAND_LATENCY, UPSTREAM_RESPONSES, UPSTREAM_LATENCY, CACHE_EVENTS, THUMBNAIL_OUTCOMES, DUPLICATE_RESPONSES, EVENT_LOOP_LAG]
+
+
+def registerMetric(metric):
+    """
+    FUNC NAME: registerMetric
+    FUNC DESC: Adds a metric to the ones exposed by the metrics endpoint
+    FUNC TYPE: Function
+    """
+    METRICS.append(metric)
+    return metric
+
+
+def renderMetrics():
+    """
+    FUNC NAME: renderMetrics
+    FUNC DESC: Renders every metric in the Prometheus text format
+    FUNC TYPE: Function
+    """
+    lines = []
+    for metric in METRICS:
+        try:
+            lines += metric.render()
+        except Exception as renderError:
+            LOGGER.warning(f"Failed to render metric {metric.name}: {renderError}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """
+    Serves renderMetrics() on /metrics
+    """
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = renderMetrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would drown out the bot's own logs
+        pass
+
+
+def startMetricsServer(port: int = None, host: str = None):
+    """
+    FUNC NAME: startMetricsServer
+    FUNC DESC: Serves the metrics endpoint from a background thread. Does nothing if no port is configured
+    FUNC TYPE: Function
+    """
+    port = port or config.METRICS_PORT
+    if not port:
+        return None
+    server = ThreadingHTTPServer((host or config.METRICS_HOST, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    LOGGER.info(f"Serving metrics on http://{server.server_address[0]}:{server.server_address[1]}/metrics")
+    return server
+
+
+async def monitorEventLoopLag(interval: float = None):
+    """
+    FUNC NAME: monitorEventLoopLag
+    FUNC DESC: Repeatedly sleeps for interval seconds and records how much later than that the event loop woke up
+    FUNC TYPE: Function
+    """
+    interval = interval or config.METRICS_LAG_INTERVAL
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, time.perf_counter() - expected))
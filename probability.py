@@ -0,0 +1,184 @@
+import config
+from dice import Number, Negate, BinaryOperation, Node, DiceSyntaxError, DiceSizeError, applyOperator, compileCalculation, describeNode, isPlainDice
+
+from functools import lru_cache
+from itertools import accumulate
+import math
+
+
+def flattenAdditive(node: Node, sign: int = 1, terms: list = None):
+    """
+    FUNC NAME: flattenAdditive
+    FUNC DESC: Flattens a calculation only made of dice, whole numbers, + and - into (sign, node) terms. Returns None for anything else
+    FUNC TYPE: Function
+    """
+    if terms is None:
+        terms = []
+
+    if isPlainDice(node) or (isinstance(node, Number) and isinstance(node.value, int)):
+        terms.append((sign, node))
+    elif isinstance(node, Negate):
+        if flattenAdditive(node.operand, -sign, terms) is None:
+            return None
+    elif isinstance(node, BinaryOperation) and node.operator in ("+", "-"):
+        if flattenAdditive(node.left, sign, terms) is None:
+            return None
+        if flattenAdditive(node.right, sign if node.operator == "+" else -sign, terms) is None:
+            return None
+    else:
+        return None
+    return terms
+
+
+def normaliseAdditive(terms: list):
+    """
+    FUNC NAME: normaliseAdditive
+    FUNC DESC: Collapses additive terms into a canonical key of ((sign, sides, rolls), ...) and a constant,
+               so 1d8 + 2d6 + 5 and 5 + 1d6 + 1d8 + 1d6 share a cached distribution
+    FUNC TYPE: Function
+    """
+    constant = 0
+    pools = {}
+    for sign, term in terms:
+        if isinstance(term, Number):
+            constant += sign * term.value
+        else:
+            pools[(sign, term.sides)] = pools.get((sign, term.sides), 0) + term.rolls
+    return tuple(sorted((sign, sides, rolls) for (sign, sides), rolls in pools.items())), constant
+
+
+@lru_cache(maxsize=config.STATS_CACHE_SIZE)
+def additiveDistribution(pools: tuple, constant: int):
+    """
+    FUNC NAME: additiveDistribution
+    FUNC DESC: Calculates the exact distribution of a sum of dice pools plus a constant, adding one die at a time with a sliding window
+               over prefix sums so each die costs time linear in the current number of outcomes
+    FUNC TYPE: Function
+    """
+    # Estimate the work up front so huge pools are rejected rather than hogging a thread
+    support = 1 + sum(rolls * (sides - 1) for _, sides, rolls in pools)
+    totalDice = sum(rolls for _, _, rolls in pools)
+    if totalDice * support > config.STATS_MAX_WORK:
+        raise DiceSizeError(totalDice, config.STATS_MAX_WORK // max(support, 1))
+
+    # probabilities[i] is the chance of rolling lowest + i
+    lowest = constant
+    probabilities = [1.0]
+    for sign, sides, rolls in pools:
+        for _ in range(rolls):
+            prefix = [0.0, *accumulate(probabilities)]
+            outcomes = len(probabilities)
+            probabilities = [
+                (prefix[min(index + 1, outcomes)] - prefix[max(index + 1 - sides, 0)]) / sides
+                for index in range(outcomes + sides - 1)
+            ]
+            # A subtracted die shifts the range down by its sides, the window shape is identical either way
+            lowest += 1 if sign > 0 else -sides
+
+    return {lowest + index: probability for index, probability in enumerate(probabilities) if probability > 0}
+
+
+@lru_cache(maxsize=config.STATS_CACHE_SIZE)
+def nodeDistribution(node: Node):
+    """
+    FUNC NAME: nodeDistribution
+    FUNC DESC: Calculates the exact distribution of a parsed calculation as a {value: probability} dict
+    FUNC TYPE: Function
+    """
+    terms = flattenAdditive(node)
+    if terms is not None:
+        return additiveDistribution(*normaliseAdditive(terms))
+
+    if isinstance(node, Number):
+        return {node.value: 1.0}
+    if isinstance(node, Negate):
+        return {-value: probability for value, probability in nodeDistribution(node.operand).items()}
+    if not isinstance(node, BinaryOperation):
+        raise DiceSyntaxError(f"{describeNode(node)} CAN'T BE CALCULATED EXACTLY, TRY mode:simulate INSTEAD")
+
+    # Anything else (e.g. multiplying two rolls together) has to pair up every outcome of each side
+    left = nodeDistribution(node.left)
+    right = nodeDistribution(node.right)
+    if len(left) * len(right) > config.STATS_MAX_WORK:
+        raise DiceSizeError(len(left) * len(right), config.STATS_MAX_WORK)
+
+    distribution = {}
+    for leftValue, leftProbability in left.items():
+        for rightValue, rightProbability in right.items():
+            value = applyOperator(node.operator, leftValue, rightValue)
+            distribution[value] = distribution.get(value, 0.0) + leftProbability * rightProbability
+    return distribution
+
+
+def summariseDistribution(distribution: dict, target: float = None):
+    """
+    FUNC NAME: summariseDistribution
+    FUNC DESC: Works out the mean, variance, extremes, percentiles and (optionally) the chance of meeting or beating target
+    FUNC TYPE: Function
+    """
+    values = sorted(distribution)
+    mean = sum(value * distribution[value] for value in values)
+    variance = sum((value - mean) ** 2 * distribution[value] for value in values)
+
+    percentiles = {}
+    cumulative = 0.0
+    remaining = list(config.STATS_PERCENTILES)
+    for value in values:
+        cumulative += distribution[value]
+        while remaining and cumulative >= remaining[0] / 100 - 1e-12:
+            percentiles[remaining.pop(0)] = value
+
+    summary = {
+        "mean": mean,
+        "variance": variance,
+        "deviation": math.sqrt(variance),
+        "minimum": values[0],
+        "maximum": values[-1],
+        "percentiles": percentiles
+    }
+    if target is not None:
+        summary["target"] = target
+        summary["chance"] = sum(probability for value, probability in distribution.items() if value >= target)
+    return summary
+
+
+def renderHistogram(distribution: dict, rows: int = None, width: int = None):
+    """
+    FUNC NAME: renderHistogram
+    FUNC DESC: Draws a compact text histogram of a distribution, grouping outcomes into at most rows buckets.
+               Vanishingly unlikely outcomes at either end are left out so big pools don't waste rows on them
+    FUNC TYPE: Function
+    """
+    rows = rows or config.STATS_HISTOGRAM_ROWS
+    width = width or config.STATS_HISTOGRAM_WIDTH
+
+    values = []
+    cumulative = 0.0
+    for value in sorted(distribution):
+        cumulative += distribution[value]
+        if cumulative >= config.STATS_HISTOGRAM_TAIL and cumulative - distribution[value] <= 1 - config.STATS_HISTOGRAM_TAIL:
+            values.append(value)
+    bucketSize = math.ceil(len(values) / rows)
+
+    buckets = []
+    for start in range(0, len(values), bucketSize):
+        bucketValues = values[start:start + bucketSize]
+        label = str(bucketValues[0]) if len(bucketValues) == 1 else f"{bucketValues[0]}-{bucketValues[-1]}"
+        buckets.append((label, sum(distribution[value] for value in bucketValues)))
+
+    labelWidth = max(len(label) for label, _ in buckets)
+    tallest = max(probability for _, probability in buckets)
+    return "\n".join(
+        f"{label.rjust(labelWidth)} | {'#' * max(1, round(probability / tallest * width)) if probability > 0 else ''} {probability:.1%}"
+        for label, probability in buckets
+    )
+
+
+def calculateDistribution(calculation: str, target: float = None):
+    """
+    FUNC NAME: calculateDistribution
+    FUNC DESC: Compiles a calculation and returns its exact distribution, a summary of it and a histogram
+    FUNC TYPE: Function
+    """
+    distribution = nodeDistribution(compileCalculation(calculation))
+    return distribution, summariseDistribution(distribution, target), renderHistogram(distribution)
@@ -0,0 +1,213 @@
+import config
+
+from contextvars import ContextVar
+from collections import Counter
+import tracemalloc
+import threading
+import asyncio
+import logging
+import time
+import sys
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+# Innermost frames of threads that are just waiting for work, sampling them would bury the busy ones
+IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+# The profile of the command being handled, None if it isn't being profiled. Lanes copy the context into their threads,
+# which is how the sampler knows whose work a lane thread is doing
+PROFILE_SESSION = ContextVar("profileSession", default=None)
+
+
+class ProfileSession:
+    """
+    Samples & (optionally) allocations collected while one command runs
+    """
+    def __init__(self, commandName: str, options: dict, traceMemory: bool):
+        self.commandName = commandName
+        self.options = options
+        self.started = time.perf_counter()
+        self.finished = None
+        self.stacks = Counter()
+        # The command's own task & event loop, so samples of the loop thread are only counted while this command is the one running
+        try:
+            self.loop = asyncio.get_running_loop()
+            self.task = asyncio.current_task()
+        except RuntimeError:
+            self.loop, self.task = None, None
+        self.loopThread = threading.get_ident()
+        # Memory snapshots are slow, so they're taken by the sampler & writeProfile rather than on the event loop
+        self.traceMemory = traceMemory
+        self.memoryBefore = None
+        self.memoryAfter = None
+
+
+class CommandProfiler:
+    """
+    Profiles the next few commands by sampling the stacks of every busy thread (the event loop and the lanes) every few milliseconds.
+    Sampling rather than cProfile means work handed to other threads is captured too. Each stack is only counted for the command
+    it belongs to: the event loop's for the command whose task is running, a lane thread's for the command whose job it's running
+    """
+    def __init__(self):
+        self.remaining = config.PROFILE_COMMANDS
+        self.traceMemory = config.PROFILE_MEMORY
+        self.sessions = set()
+        # Lane threads currently running a profiled command's job, by thread id
+        self.threadSessions = {}
+        # Finished commands still waiting for writeProfile to take their after snapshot
+        self.unwrittenMemory = 0
+        self.lock = threading.Lock()
+        self.sampler = None
+
+    def enable(self, commands: int, traceMemory: bool = False):
+        """
+        Profiles the next commands commands, 0 turns profiling off
+        """
+        with self.lock:
+            self.remaining = commands
+            self.traceMemory = traceMemory
+        LOGGER.info(f"Profiling the next {commands} commands{' with memory snapshots' if traceMemory else ''}")
+
+    def start(self, commandName: str, options: dict):
+        """
+        Starts profiling a command if there are profiles left to take, returning its session (or None)
+        """
+        with self.lock:
+            if self.remaining <= 0:
+                return None
+            self.remaining -= 1
+            if self.traceMemory and not tracemalloc.is_tracing():
+                tracemalloc.start(config.PROFILE_MEMORY_FRAMES)
+            session = ProfileSession(commandName, options, self.traceMemory)
+            self.sessions.add(session)
+            PROFILE_SESSION.set(session)
+            if self.sampler is None:
+                self.sampler = threading.Thread(target=self.sample, name="profiler", daemon=True)
+                self.sampler.start()
+        return session
+
+    def finish(self, session: ProfileSession):
+        """
+        Stops profiling a command. Returns the session so it can be written out (and its memory compared) away from the event loop
+        """
+        session.finished = time.perf_counter()
+        with self.lock:
+            self.sessions.discard(session)
+            if session.traceMemory:
+                self.unwrittenMemory += 1
+        return session
+
+    def finishMemory(self, session: ProfileSession):
+        """
+        Takes a finished command's after snapshot, then stops tracing allocations if nothing else needs them. Called by writeProfile
+        """
+        if session.memoryBefore is not None and tracemalloc.is_tracing():
+            session.memoryAfter = tracemalloc.take_snapshot()
+        with self.lock:
+            if session.traceMemory:
+                self.unwrittenMemory -= 1
+            # Stop tracing allocations once nothing needs them, it slows every allocation down
+            if not self.sessions and self.unwrittenMemory <= 0 and self.remaining <= 0 and tracemalloc.is_tracing():
+                tracemalloc.stop()
+
+    def runJob(self, func, *args):
+        """
+        Runs a lane job, marking its thread as working for the command being profiled (if it is) while it runs
+        """
+        session = PROFILE_SESSION.get()
+        if session is None:
+            return func(*args)
+        threadId = threading.get_ident()
+        self.threadSessions[threadId] = session
+        try:
+            return func(*args)
+        finally:
+            self.threadSessions.pop(threadId, None)
+
+    def sessionFor(self, threadId: int, sessions: list):
+        """
+        Returns the session a sampled thread is working for, or None if it isn't working for a profiled command
+        """
+        session = self.threadSessions.get(threadId)
+        if session is not None:
+            return session
+        for session in sessions:
+            if session.task is not None and threadId == session.loopThread and asyncio.current_task(session.loop) is session.task:
+                return session
+        return None
+
+    def sample(self):
+        samplerId = threading.get_ident()
+        threadNames = {}
+        while True:
+            with self.lock:
+                if not self.sessions:
+                    self.sampler = None
+                    return
+                sessions = list(self.sessions)
+
+            # Commands that have just started need a snapshot to compare their memory with
+            if any(session.traceMemory and session.memoryBefore is None for session in sessions) and tracemalloc.is_tracing():
+                memoryBefore = tracemalloc.take_snapshot()
+                for session in sessions:
+                    if session.traceMemory and session.memoryBefore is None:
+                        session.memoryBefore = memoryBefore
+
+            for threadId, frame in sys._current_frames().items():
+                if threadId == samplerId or os.path.basename(frame.f_code.co_filename) in IDLE_FILES:
+                    continue
+                session = self.sessionFor(threadId, sessions)
+                if session is None:
+                    continue
+                if threadId not in threadNames:
+                    threadNames = {thread.ident: thread.name for thread in threading.enumerate()}
+                stack = []
+                while frame is not None:
+                    stack.append(f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(threadNames.get(threadId, str(threadId)))
+                session.stacks[tuple(reversed(stack))] += 1
+            time.sleep(config.PROFILE_INTERVAL)
+
+
+def writeProfile(session: ProfileSession):
+    """
+    FUNC NAME: writeProfile
+    FUNC DESC: Writes a command's profile to the profiles directory: a report of the hottest functions (and allocations if traced)
+               and the raw stacks in the folded format flamegraph tools read
+    FUNC TYPE: Function
+    """
+    PROFILER.finishMemory(session)
+    os.makedirs(config.PROFILE_DIRECTORY, exist_ok=True)
+    profileName = f"{time.strftime('%d-%m-%Y-%H%M%S')}-{session.commandName}-{id(session):x}"
+    totalSamples = sum(session.stacks.values())
+
+    selfSamples = Counter()
+    totalSamplesByFunction = Counter()
+    for stack, count in session.stacks.items():
+        selfSamples[stack[-1]] += count
+        for function in set(stack[1:]):
+            totalSamplesByFunction[function] += count
+
+    report = [
+        f"/{session.commandName} {session.options}",
+        f"Took {session.finished - session.started:.3f} seconds, {totalSamples} samples every {config.PROFILE_INTERVAL * 1000:.0f}ms of the threads working on it",
+        "",
+        "SELF       TOTAL      FUNCTION"
+    ]
+    for function, count in totalSamplesByFunction.most_common(config.PROFILE_TOP_FUNCTIONS):
+        report.append(f"{selfSamples[function] / max(totalSamples, 1):>8.1%}   {count / max(totalSamples, 1):>8.1%}   {function}")
+
+    if session.memoryAfter is not None:
+        report += ["", "ALLOCATIONS (SIZE CHANGE, COUNT CHANGE, LINE)"]
+        for statistic in session.memoryAfter.compare_to(session.memoryBefore, "lineno")[:config.PROFILE_TOP_FUNCTIONS]:
+            report.append(f"{statistic.size_diff / 1024:>+10.1f} KiB {statistic.count_diff:>+8} {statistic.traceback}")
+
+    with open(os.path.join(config.PROFILE_DIRECTORY, f"{profileName}.txt"), "w", encoding="utf-8") as reportFile:
+        reportFile.write("\n".join(report) + "\n")
+    with open(os.path.join(config.PROFILE_DIRECTORY, f"{profileName}.folded"), "w", encoding="utf-8") as foldedFile:
+        foldedFile.writelines(f"{';'.join(stack)} {count}\n" for stack, count in session.stacks.items())
+    LOGGER.info(f"Wrote profile of /{session.commandName} to {profileName}.txt")
+
+
+PROFILER = CommandProfiler()
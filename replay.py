@@ -0,0 +1,114 @@
+import config
+
+from urllib.parse import urlsplit, parse_qsl, urlencode
+import requests
+import hashlib
+import logging
+import gzip
+import json
+import time
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+
+class MissingFixtureError(requests.RequestException):
+    """
+    Raised in replay mode when no response was recorded for a request. Handled like any other failed request
+    """
+
+
+class ReplayedResponse:
+    """
+    Stands in for a requests.Response, rebuilt from a recorded fixture
+    """
+    def __init__(self, query: str, statusCode: int, text: str, elapsed: float):
+        self.url = query
+        self.status_code = statusCode
+        self.text = text
+        self.elapsed = elapsed
+
+    @property
+    def content(self):
+        return self.text.encode("utf-8")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+def fixtureKey(query: str):
+    """
+    FUNC NAME: fixtureKey
+    FUNC DESC: Normalises a request url so the same request always finds the same fixture, whatever the order of its parameters
+    FUNC TYPE: Function
+    """
+    url = urlsplit(query)
+    return f"{url.hostname}/{url.path.strip('/')}?{urlencode(sorted(parse_qsl(url.query)))}"
+
+
+def fixturePath(query: str):
+    """
+    FUNC NAME: fixturePath
+    FUNC DESC: Returns where the fixture for a request is (or would be) recorded
+    FUNC TYPE: Function
+    """
+    key = fixtureKey(query)
+    return os.path.join(config.UPSTREAM_FIXTURE_DIRECTORY, f"{key.split('/')[0]}-{hashlib.sha256(key.encode('utf-8')).hexdigest()[:16]}.json.gz")
+
+
+def recordResponse(query: str, response, elapsed: float):
+    """
+    FUNC NAME: recordResponse
+    FUNC DESC: Saves a response & how long it took as a compressed fixture, replacing the old file in one step so it is never half written
+    FUNC TYPE: Function
+    """
+    fixture = {"query": query, "key": fixtureKey(query), "status": response.status_code, "elapsed": elapsed, "recorded": time.time(), "body": response.text}
+    try:
+        os.makedirs(config.UPSTREAM_FIXTURE_DIRECTORY, exist_ok=True)
+        recordedPath = fixturePath(query)
+        tempFileName = f"{recordedPath}.{os.getpid()}.{id(fixture):x}.tmp"
+        with gzip.open(tempFileName, "wt", encoding="utf-8") as fixtureFile:
+            json.dump(fixture, fixtureFile)
+        os.replace(tempFileName, recordedPath)
+    except OSError as recordError:
+        LOGGER.warning(f"Failed to record fixture for {query}: {recordError}")
+
+
+def loadRecording(fixtureFileName: str):
+    """
+    FUNC NAME: loadRecording
+    FUNC DESC: Reads a recorded fixture file
+    FUNC TYPE: Function
+    """
+    with gzip.open(fixtureFileName, "rt", encoding="utf-8") as fixtureFile:
+        return json.load(fixtureFile)
+
+
+def replayResponse(query: str):
+    """
+    FUNC NAME: replayResponse
+    FUNC DESC: Answers a request from its recorded fixture, taking as long as the recorded request did if UPSTREAM_REPLAY_TIMING is set
+    FUNC TYPE: Function
+    """
+    try:
+        fixture = loadRecording(fixturePath(query))
+    except FileNotFoundError:
+        raise MissingFixtureError(f"No fixture recorded for {fixtureKey(query)}, record one with UPSTREAM_MODE=record") from None
+    if config.UPSTREAM_REPLAY_TIMING:
+        time.sleep(fixture["elapsed"])
+    return ReplayedResponse(query, fixture["status"], fixture["body"], fixture["elapsed"])
+
+
+def recordedQueries():
+    """
+    FUNC NAME: recordedQueries
+    FUNC DESC: Returns the url of every request with a recorded fixture
+    FUNC TYPE: Function
+    """
+    if not os.path.isdir(config.UPSTREAM_FIXTURE_DIRECTORY):
+        return []
+    queries = []
+    for fixtureFileName in sorted(os.listdir(config.UPSTREAM_FIXTURE_DIRECTORY)):
+        if fixtureFileName.endswith(".json.gz"):
+            queries.append(loadRecording(os.path.join(config.UPSTREAM_FIXTURE_DIRECTORY, fixtureFileName))["query"])
+    return queries
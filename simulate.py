@@ -0,0 +1,139 @@
+import config
+from dice import Node, DiceSizeError, compileCalculation, countRolls, evaluate
+from probability import summariseDistribution, renderHistogram
+from deadline import remainingTime, DeadlineExceeded
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from collections import Counter
+import multiprocessing
+import logging
+import random
+import math
+import time
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+# Created on first use so the bot doesn't pay for worker processes it never needs
+SIMULATION_POOL = None
+
+
+def getSimulationPool():
+    """
+    FUNC NAME: getSimulationPool
+    FUNC DESC: Returns the shared process pool used for simulations, creating it with a worker per core if needed
+    FUNC TYPE: Function
+    """
+    global SIMULATION_POOL
+    if SIMULATION_POOL is None:
+        # Spawn rather than fork, forking a process running the discord client's threads isn't safe
+        SIMULATION_POOL = ProcessPoolExecutor(
+            max_workers=config.SIMULATION_WORKERS or os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return SIMULATION_POOL
+
+
+def shutdownSimulationPool():
+    """
+    FUNC NAME: shutdownSimulationPool
+    FUNC DESC: Stops the simulation worker processes, abandoning any batches that haven't started
+    FUNC TYPE: Function
+    """
+    global SIMULATION_POOL
+    if SIMULATION_POOL is not None:
+        SIMULATION_POOL.shutdown(wait=False, cancel_futures=True)
+        SIMULATION_POOL = None
+
+
+def simulateBatch(node: Node, seed: int, trials: int):
+    """
+    FUNC NAME: simulateBatch
+    FUNC DESC: Runs a batch of trials of a parsed calculation in one vectorised evaluation, returning how often each total came up.
+               Runs inside a worker process
+    FUNC TYPE: Function
+    """
+    return Counter(evaluate(node, random.Random(seed), trials))
+
+
+def simulateCalculation(calculation: str, trials: int = None, seed: int = None, timeBudget: float = None):
+    """
+    FUNC NAME: simulateCalculation
+    FUNC DESC: Estimates the distribution of a calculation by rolling it many times across the simulation pool, returning (counts, seed, trials asked for).
+               Stops early if the time budget (or the command's deadline) runs out. The same seed always produces the same batches,
+               so only runs that finish every trial are reproducible
+    FUNC TYPE: Function
+    """
+    trials = trials or config.SIMULATION_DEFAULT_TRIALS
+    timeBudget = timeBudget or config.SIMULATION_TIME_BUDGET
+    if trials > config.SIMULATION_MAX_TRIALS:
+        raise DiceSizeError(trials, config.SIMULATION_MAX_TRIALS)
+    remaining = remainingTime()
+    if remaining is not None:
+        timeBudget = min(timeBudget, remaining)
+
+    node = compileCalculation(calculation)
+    if seed is None:
+        seed = random.SystemRandom().getrandbits(config.ROLL_SEED_BITS)
+
+    # Keep the dice per batch bounded so a single batch never runs for long
+    batchSize = max(1, min(config.SIMULATION_BATCH_SIZE, config.SIMULATION_BATCH_ROLLS // max(countRolls(node), 1)))
+    seeds = random.Random(seed)
+    batches = [(seeds.getrandbits(64), min(batchSize, trials - start)) for start in range(0, trials, batchSize)]
+
+    deadline = time.monotonic() + timeBudget
+    pool = getSimulationPool()
+    pending = {pool.submit(simulateBatch, node, batchSeed, batchTrials) for batchSeed, batchTrials in batches}
+
+    counts = Counter()
+    try:
+        while pending and time.monotonic() < deadline:
+            done, pending = wait(pending, timeout=max(deadline - time.monotonic(), 0), return_when=FIRST_COMPLETED)
+            for future in done:
+                counts.update(future.result())
+    finally:
+        # Stop batches that haven't started, whether time ran out or a batch failed
+        for future in pending:
+            future.cancel()
+
+    if not counts:
+        raise DeadlineExceeded("simulating")
+    if pending:
+        LOGGER.info(f"Simulation of {calculation} ran out of time after {sum(counts.values())}/{trials} trials")
+
+    return counts, seed, trials
+
+
+def summariseSimulation(counts: Counter, target: float = None):
+    """
+    FUNC NAME: summariseSimulation
+    FUNC DESC: Summarises simulated totals like an exact distribution, adding 95% confidence intervals for the mean and chance of beating target
+    FUNC TYPE: Function
+    """
+    completedTrials = sum(counts.values())
+    distribution = {value: count / completedTrials for value, count in counts.items()}
+    summary = summariseDistribution(distribution, target)
+
+    summary["trials"] = completedTrials
+    meanError = config.SIMULATION_CONFIDENCE_Z * summary["deviation"] / math.sqrt(completedTrials)
+    summary["meanInterval"] = (summary["mean"] - meanError, summary["mean"] + meanError)
+    if target is not None:
+        chanceError = config.SIMULATION_CONFIDENCE_Z * math.sqrt(summary["chance"] * (1 - summary["chance"]) / completedTrials)
+        summary["chanceInterval"] = (max(0.0, summary["chance"] - chanceError), min(1.0, summary["chance"] + chanceError))
+
+    return distribution, summary, renderHistogram(distribution)
+
+
+def runSimulation(calculation: str, target: float = None, trials: int = None, seed: int = None):
+    """
+    FUNC NAME: runSimulation
+    FUNC DESC: Simulates a calculation and returns its estimated distribution, a summary of it (including the seed used) and a histogram.
+               The summary's partial flag is set when time ran out before every trial finished, as the seed won't reproduce those results
+    FUNC TYPE: Function
+    """
+    counts, seed, requestedTrials = simulateCalculation(calculation, trials, seed)
+    distribution, summary, histogram = summariseSimulation(counts, target)
+    summary["seed"] = seed
+    summary["requestedTrials"] = requestedTrials
+    summary["partial"] = summary["trials"] < requestedTrials
+    return distribution, summary, histogram
@@ -0,0 +1,230 @@
+import config
+
+from contextvars import ContextVar
+import itertools
+import threading
+import logging
+import random
+import queue
+import glob
+import json
+import time
+import os
+
+LOGGER = logging.getLogger(__name__)
+
+# The trace of the command being handled, None if it wasn't sampled (or outside of commands).
+# Lanes copy the context into their threads, so their work is traced too
+COMMAND_TRACE = ContextVar("commandTrace", default=None)
+TRACE_NUMBERS = itertools.count(1)
+TRACE_WRITER = None
+
+
+class Trace:
+    """
+    One sampled command. Its spans are drawn on two tracks in trace viewers: one for the event loop & one for the lanes
+    """
+    def __init__(self, commandName: str, attributes: dict):
+        self.number = next(TRACE_NUMBERS)
+        self.commandName = commandName
+        self.attributes = attributes
+        self.loopThread = threading.current_thread()
+        self.started = time.perf_counter_ns() // 1000
+
+    def track(self):
+        """
+        Returns the track (trace viewers call them threads) for spans ending on the current thread
+        """
+        return self.number * 2 + (threading.current_thread() is not self.loopThread)
+
+
+class Span:
+    """
+    Times a stage of a traced command, recorded as a Chrome trace event once it ends. Attributes can be added while it runs with set
+    """
+    recording = True
+
+    def __init__(self, trace: Trace, name: str, attributes: dict):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+        self.started = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.started = time.perf_counter_ns() // 1000
+        return self
+
+    def __exit__(self, errorType, error, traceback):
+        if errorType is not None:
+            self.attributes["error"] = errorType.__name__
+        writeTraceEvent({
+            "name": self.name,
+            "cat": self.trace.commandName,
+            "ph": "X",
+            "ts": self.started,
+            "dur": time.perf_counter_ns() // 1000 - self.started,
+            "pid": os.getpid(),
+            "tid": self.trace.track(),
+            "args": self.attributes
+        })
+        return False
+
+
+class NoSpan:
+    """
+    Stands in for a Span when the command isn't being traced, so untraced commands only pay for a context variable lookup
+    """
+    recording = False
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, errorType, error, traceback):
+        return False
+
+
+NO_SPAN = NoSpan()
+
+
+class TraceWriter:
+    """
+    Appends trace events to files from a background thread, so the event loop never waits on the disk.
+    Files use the JSON array format, which trace viewers accept without a closing bracket, so events are only ever appended.
+    Once a file reaches TRACE_MAX_BYTES the writer moves on to a new numbered one & removes the oldest trace files
+    """
+    def __init__(self, baseName: str):
+        self.baseName = baseName
+        self.fileNumber = 0
+        self.events = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.write, name="trace-writer", daemon=True)
+        self.thread.start()
+
+    def openNext(self):
+        self.fileNumber += 1
+        fileName = os.path.join(config.TRACE_DIRECTORY, f"{self.baseName}-{self.fileNumber}.json")
+        traceFile = open(fileName, "a", encoding="utf-8")
+        if traceFile.tell() == 0:
+            traceFile.write("[\n")
+        pruneTraceFiles(fileName)
+        return traceFile
+
+    def write(self):
+        traceFile = None
+        try:
+            os.makedirs(config.TRACE_DIRECTORY, exist_ok=True)
+            traceFile = self.openNext()
+            while True:
+                event = self.events.get()
+                if event is None:
+                    return
+                traceFile.write(json.dumps(event, default=str) + ",\n")
+                # Only flush once the queue is empty, so a burst of events is one write
+                if self.events.empty():
+                    traceFile.flush()
+                if config.TRACE_MAX_BYTES > 0 and traceFile.tell() >= config.TRACE_MAX_BYTES:
+                    traceFile.close()
+                    traceFile = self.openNext()
+        except OSError as writeError:
+            LOGGER.warning(f"Failed to write trace file for {self.baseName}: {writeError}")
+        finally:
+            if traceFile is not None:
+                traceFile.close()
+
+    def stop(self):
+        self.events.put(None)
+        self.thread.join()
+
+
+def pruneTraceFiles(currentFileName: str):
+    """
+    FUNC NAME: pruneTraceFiles
+    FUNC DESC: Removes the oldest trace files (from any process) so no more than TRACE_MAX_FILES are kept, never the file being written
+    FUNC TYPE: Function
+    """
+    traceFiles = sorted(glob.glob(os.path.join(glob.escape(config.TRACE_DIRECTORY), "oghma-*.json")), key=os.path.getmtime, reverse=True)
+    for traceFileName in traceFiles[config.TRACE_MAX_FILES:]:
+        if traceFileName == currentFileName:
+            continue
+        try:
+            os.remove(traceFileName)
+        except OSError as removeError:
+            LOGGER.warning(f"Failed to remove old trace file {traceFileName}: {removeError}")
+
+
+def writeTraceEvent(event: dict):
+    """
+    FUNC NAME: writeTraceEvent
+    FUNC DESC: Queues a trace event to be written, starting the writer if this is the first one
+    FUNC TYPE: Function
+    """
+    global TRACE_WRITER
+    if TRACE_WRITER is None:
+        TRACE_WRITER = TraceWriter(f"oghma-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}")
+    TRACE_WRITER.events.put(event)
+
+
+def startTrace(commandName: str, **attributes):
+    """
+    FUNC NAME: startTrace
+    FUNC DESC: Decides whether to trace the current command (TRACE_SAMPLE_RATE of them are), returning its trace or None
+    FUNC TYPE: Function
+    """
+    if config.TRACE_SAMPLE_RATE <= 0 or random.random() >= config.TRACE_SAMPLE_RATE:
+        COMMAND_TRACE.set(None)
+        return None
+
+    trace = Trace(commandName, attributes)
+    COMMAND_TRACE.set(trace)
+    # Name both of the command's tracks so viewers show which command they belong to
+    for track, trackName in ((trace.number * 2, "event loop"), (trace.number * 2 + 1, "lanes")):
+        writeTraceEvent({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": track, "args": {"name": f"/{commandName} #{trace.number} ({trackName})"}})
+    return trace
+
+
+def finishTrace(trace: Trace, outcome: str):
+    """
+    FUNC NAME: finishTrace
+    FUNC DESC: Records a span covering the whole of a traced command, from being admitted to finishing with outcome
+    FUNC TYPE: Function
+    """
+    writeTraceEvent({
+        "name": f"/{trace.commandName}",
+        "cat": trace.commandName,
+        "ph": "X",
+        "ts": trace.started,
+        "dur": time.perf_counter_ns() // 1000 - trace.started,
+        "pid": os.getpid(),
+        "tid": trace.number * 2,
+        "args": {**trace.attributes, "outcome": outcome}
+    })
+
+
+def traceSpan(name: str, **attributes):
+    """
+    FUNC NAME: traceSpan
+    FUNC DESC: Returns a context manager timing a stage of the current command, which does nothing unless the command is being traced.
+               Works around both blocking code & awaits
+    FUNC TYPE: Function
+    """
+    trace = COMMAND_TRACE.get()
+    if trace is None:
+        return NO_SPAN
+    return Span(trace, name, attributes)
+
+
+def stopTracing():
+    """
+    FUNC NAME: stopTracing
+    FUNC DESC: Writes out any queued trace events and stops the background writer
+    FUNC TYPE: Function
+    """
+    global TRACE_WRITER
+    if TRACE_WRITER is not None:
+        TRACE_WRITER.stop()
+        TRACE_WRITER = None
@@ -1,8 +1,14 @@
+import config
+from dice import summariseFaces
+
 import random
 import discord
+import gzip
+import io
 import logging
 import platform
 import os
+import time
 
 SEARCH_PARAM_DIRECTORIES = ["spells", "monsters", "magicitems", "weapons"]
 LOGGER = logging.getLogger(__name__)
@@ -43,10 +49,10 @@ def getRequestType(route: str):
 def constructResponse(entityInput: str, route: str, matchedObj: dict):
     """
     FUNC NAME: constructResponse
-    FUNC DESC: Constructs embed responses from the API object.
-    FUNC TYPE: Function
+    FUNC DESC: Constructs embed responses (and the paths of any files to send with them) from the API object.
+               Yields ("embed", embed) & ("file", path) pairs as each one is ready, so the first embed can be sent while the rest are built
+    FUNC TYPE: Generator
     """
-    responses = {"files": list(), "embeds": list()}
     fileDelimiter = getFileDelimiter()
 
     # Document
@@ -78,7 +84,7 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
 
         documentEmbed.set_thumbnail(url="https://i.imgur.com/lnkhxCe.jpg")
 
-        responses["embeds"].append(documentEmbed)
+        yield "embed", documentEmbed
 
     # Spell
     elif "spell" in route:
@@ -118,10 +124,13 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
 
         spellEmbed.set_thumbnail(url="https://i.imgur.com/W15EmNT.jpg")
 
-        responses["embeds"].append(spellEmbed)
+        yield "embed", spellEmbed
 
     # Monster
     elif "monster" in route:
+        # Image for all embeds
+        monsterThumbnail = matchedObj["img_main"] if matchedObj["img_main"] is not None else "https://i.imgur.com/6HsoQ7H.jpg"
+
         # 1ST EMBED
         monsterLink = f"https://open5e.com/monsters/{matchedObj['slug']}/"
         monsterEmbedBasics = discord.Embed(
@@ -241,7 +250,8 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
             inline=True
         )
 
-        responses["embeds"].append(monsterEmbedBasics)
+        monsterEmbedBasics.set_thumbnail(url=monsterThumbnail)
+        yield "embed", monsterEmbedBasics
 
         # 2ND EMBED
         monsterEmbedSkills = discord.Embed(
@@ -275,7 +285,8 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
             inline=False
         )
 
-        responses["embeds"].append(monsterEmbedSkills)
+        monsterEmbedSkills.set_thumbnail(url=monsterThumbnail)
+        yield "embed", monsterEmbedSkills
 
         # 3RD EMBED
         monsterEmbedActions = discord.Embed(
@@ -334,7 +345,8 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                     inline=False
                 )
 
-        responses["embeds"].append(monsterEmbedActions)
+        monsterEmbedActions.set_thumbnail(url=monsterThumbnail)
+        yield "embed", monsterEmbedActions
 
         # 4TH EMBED (only used if it has legendary actions)
         if matchedObj["legendary_desc"] != "":
@@ -352,14 +364,8 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                     inline=False
                 )
 
-            responses["embeds"].append(monsterEmbedLegend)
-
-        # Author & Image for all embeds
-        for embed in responses["embeds"]:
-            if matchedObj["img_main"] is not None:
-                embed.set_thumbnail(url=matchedObj["img_main"])
-            else:
-                embed.set_thumbnail(url="https://i.imgur.com/6HsoQ7H.jpg")
+            monsterEmbedLegend.set_thumbnail(url=monsterThumbnail)
+            yield "embed", monsterEmbedLegend
 
     # Background
     elif "background" in route:
@@ -397,7 +403,8 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
         # Feature
         backgroundEmbed.add_field(name=matchedObj["feature"], value=matchedObj["feature_desc"], inline=False)
 
-        responses["embeds"].append(backgroundEmbed)
+        backgroundEmbed.set_thumbnail(url="https://i.imgur.com/GhGODan.jpg")
+        yield "embed", backgroundEmbed
 
         # 2nd Embed (feature)
         backgroundFeatureEmbed = discord.Embed(
@@ -407,7 +414,8 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
             url=bckLink
         )
 
-        responses["embeds"].append(backgroundFeatureEmbed)
+        backgroundFeatureEmbed.set_thumbnail(url="https://i.imgur.com/GhGODan.jpg")
+        yield "embed", backgroundFeatureEmbed
 
         # 3rd Embed & File (suggested characteristics)
         if matchedObj["suggested_characteristics"] is not None:
@@ -421,7 +429,8 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                     url=bckLink
                 )
 
-                responses["embeds"].append(backgroundChars)
+                backgroundChars.set_thumbnail(url="https://i.imgur.com/GhGODan.jpg")
+                yield "embed", backgroundChars
 
             else:
                 backgroundChars = discord.Embed(
@@ -438,17 +447,15 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                     value=f"See `{bckFileName}` for full description",
                     inline=False
                 )
-                responses["embeds"].append(backgroundChars)
+                backgroundChars.set_thumbnail(url="https://i.imgur.com/GhGODan.jpg")
+                yield "embed", backgroundChars
 
                 # Create characteristics file
                 LOGGER.info(f"Creating file: {bckFileName}")
                 with open(f"{os.getcwd()}data{fileDelimiter}{bckFileName}", "w+") as characteristicsFile:
                     characteristicsFile.write(matchedObj["suggested_characteristics"])
 
-                responses["files"].append(discord.File(f"{os.getcwd()}data{fileDelimiter + bckFileName}"))
-
-        for response in responses["embeds"]:
-            response.set_thumbnail(url="https://i.imgur.com/GhGODan.jpg")
+                yield "file", f"{os.getcwd()}data{fileDelimiter + bckFileName}"
 
     # Plane
     elif "plane" in route:
@@ -461,7 +468,7 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
 
         planeEmbed.set_thumbnail(url="https://i.imgur.com/GJk1HFh.jpg")
 
-        responses["embeds"].append(planeEmbed)
+        yield "embed", planeEmbed
 
     # Section
     elif "section" in route:
@@ -483,13 +490,13 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                 inline=False
             )
             sectionEmbedDesc.set_thumbnail(url="https://i.imgur.com/J75S6bF.jpg")
-            responses["embeds"].append(sectionEmbedDesc)
+            yield "embed", sectionEmbedDesc
 
             # Full description as a file
             LOGGER.info(f"Creating file: {sectionFilename}")
             with open(f"{os.getcwd()}data{fileDelimiter}{sectionFilename}", "w+") as secDescFile:
                 secDescFile.write(matchedObj["desc"])
-            responses["files"].append(discord.File(f"{os.getcwd()}data{fileDelimiter + sectionFilename}"))
+            yield "file", f"{os.getcwd()}data{fileDelimiter + sectionFilename}"
 
         else:
             sectionEmbedDesc = discord.Embed(
@@ -499,7 +506,7 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                 url=secLink
             )
             sectionEmbedDesc.set_thumbnail(url="https://i.imgur.com/J75S6bF.jpg")
-            responses["embeds"].append(sectionEmbedDesc)
+            yield "embed", sectionEmbedDesc
 
     # Feat
     elif "feat" in route:
@@ -513,7 +520,7 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
         featEmbed.add_field(name="DESCRIPTION", value=matchedObj["desc"], inline=False)
         featEmbed.set_thumbnail(url="https://i.imgur.com/X1l7Aif.jpg")
 
-        responses["embeds"].append(featEmbed)
+        yield "embed", featEmbed
 
     # Condition
     elif "condition" in route:
@@ -537,7 +544,7 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
             )
         conditionEmbed.set_thumbnail(url="https://i.imgur.com/tOdL5n3.jpg")
 
-        responses["embeds"].append(conditionEmbed)
+        yield "embed", conditionEmbed
 
     # Race
     elif "race" in route:
@@ -577,7 +584,7 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                 raceEmbed.add_field(name="TRAITS", value=matchedObj["traits"], inline=False)
 
         raceEmbed.set_thumbnail(url="https://i.imgur.com/OUSzh8W.jpg")
-        responses["embeds"].append(raceEmbed)
+        yield "embed", raceEmbed
 
         # Start new embed for any subraces
         if matchedObj["subraces"] != []:
@@ -604,7 +611,7 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                         subraceEmbed.add_field(name="TRAITS", value=subrace["traits"], inline=False)
 
                 subraceEmbed.set_thumbnail(url="https://i.imgur.com/OUSzh8W.jpg")
-                responses["embeds"].append(subraceEmbed)
+                yield "embed", subraceEmbed
 
     # Class
     elif "class" in route:
@@ -631,19 +638,20 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
             inline=False
         )
 
-        responses["embeds"].append(classDescEmbed)
+        classDescEmbed.set_thumbnail(url="https://i.imgur.com/Mjh6AAi.jpg")
+        yield "embed", classDescEmbed
 
         # Full description as a file
         LOGGER.info(f"Creating file: {clsDesFileName}")
         with open(f"{os.getcwd()}data{fileDelimiter}{clsDesFileName}", "w+") as descFile:
             descFile.write(matchedObj["desc"])
-        responses["files"].append(discord.File(f"{os.getcwd()}data{fileDelimiter + clsDesFileName}"))
+        yield "file", f"{os.getcwd()}data{fileDelimiter + clsDesFileName}"
 
         # Class table as a file
         LOGGER.info(f"Creating file: {clsTblFileName}")
         with open(f"{os.getcwd()}data{fileDelimiter}{clsTblFileName}", "w+") as tableFile:
             tableFile.write(matchedObj["table"])
-        responses["files"].append(discord.File(f"{os.getcwd()}data{fileDelimiter + clsTblFileName}"))
+        yield "file", f"{os.getcwd()}data{fileDelimiter + clsTblFileName}"
 
         # 2nd Embed (DETAILS)
         classDetailsEmbed = discord.Embed(
@@ -666,7 +674,8 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
         else:
             classDetailsEmbed.add_field(name="EQUIPMENT", value=matchedObj["equipment"], inline=False)
 
-        responses["embeds"].append(classDetailsEmbed)
+        classDetailsEmbed.set_thumbnail(url="https://i.imgur.com/Mjh6AAi.jpg")
+        yield "embed", classDetailsEmbed
 
         # 3rd Embed (ARCHETYPES)
         if matchedObj["archetypes"] != []:
@@ -684,7 +693,8 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                         url=classLink
                     )
 
-                    responses["embeds"].append(archTypeEmbed)
+                    archTypeEmbed.set_thumbnail(url="https://i.imgur.com/Mjh6AAi.jpg")
+                    yield "embed", archTypeEmbed
 
                 else:
 
@@ -703,20 +713,18 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                         inline=False
                     )
 
-                    responses["embeds"].append(archTypeEmbed)
+                    archTypeEmbed.set_thumbnail(url="https://i.imgur.com/Mjh6AAi.jpg")
+                    yield "embed", archTypeEmbed
 
                     LOGGER.info(f"Creating file: {clsArchFileName}")
                     with open(f"{os.getcwd()}data{fileDelimiter}{clsArchFileName}", "w+") as archDesFile:
                         archDesFile.write(archtype["desc"])
-                    responses["files"].append(discord.File(f"{os.getcwd()}data{fileDelimiter + clsArchFileName}"))
-
-        # Finish up
-        for response in responses["embeds"]:
-            response.set_thumbnail(url="https://i.imgur.com/Mjh6AAi.jpg")
+                    yield "file", f"{os.getcwd()}data{fileDelimiter + clsArchFileName}"
 
     # Magic Item
     elif "magicitem" in route:
         itemLink = f"https://open5e.com/magicitems/{matchedObj['slug']}"
+        mIfileName = None
         if len(matchedObj["desc"]) >= 2048:
             magicItemEmbed = discord.Embed(
                 colour=discord.Colour.green(),
@@ -733,13 +741,6 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                 inline=False
             )
 
-            responses["embeds"].append(magicItemEmbed)
-
-            LOGGER.info(f"Creating file: {mIfileName}")
-            with open(f"{os.getcwd()}data{fileDelimiter}{mIfileName}", "w+") as itemFile:
-                itemFile.write(matchedObj["desc"])
-            responses["files"].append(discord.File(f"{os.getcwd()}data{fileDelimiter + mIfileName}"))
-
         else:
             magicItemEmbed = discord.Embed(
                 colour=discord.Colour.green(),
@@ -747,21 +748,24 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
                 description=matchedObj["desc"],
                 url=itemLink
             )
-            responses["embeds"].append(magicItemEmbed)
 
-        for response in responses["embeds"]:
-            response.add_field(name="TYPE", value=matchedObj["type"], inline=True)
-            response.add_field(name="RARITY", value=matchedObj["rarity"], inline=True)
+        magicItemEmbed.add_field(name="TYPE", value=matchedObj["type"], inline=True)
+        magicItemEmbed.add_field(name="RARITY", value=matchedObj["rarity"], inline=True)
 
-            if matchedObj["requires_attunement"] == "requires_attunement":
-                response.add_field(name="ATTUNEMENT REQUIRED?", value="YES", inline=True)
-            else:
-                response.add_field(name="ATTUNEMENT REQUIRED?", value="NO", inline=True)
+        if matchedObj["requires_attunement"] == "requires_attunement":
+            magicItemEmbed.add_field(name="ATTUNEMENT REQUIRED?", value="YES", inline=True)
+        else:
+            magicItemEmbed.add_field(name="ATTUNEMENT REQUIRED?", value="NO", inline=True)
 
-            response.set_thumbnail(url="https://i.imgur.com/2wzBEjB.png")
+        magicItemEmbed.set_thumbnail(url="https://i.imgur.com/2wzBEjB.png")
+        yield "embed", magicItemEmbed
 
-            # Remove this break if magicitems produces more than 1 embed in the future
-            break
+        # Full description as a file, written after the embed is on its way
+        if mIfileName is not None:
+            LOGGER.info(f"Creating file: {mIfileName}")
+            with open(f"{os.getcwd()}data{fileDelimiter}{mIfileName}", "w+") as itemFile:
+                itemFile.write(matchedObj["desc"])
+            yield "file", f"{os.getcwd()}data{fileDelimiter + mIfileName}"
 
     # Weapon
     elif "weapon" in route:
@@ -783,7 +787,7 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
 
         weaponEmbed.set_thumbnail(url="https://i.imgur.com/pXEe4L9.png")
 
-        responses["embeds"].append(weaponEmbed)
+        yield "embed", weaponEmbed
 
     else:
         badObjectFilename = generateFileName("badobject")
@@ -799,7 +803,166 @@ def constructResponse(entityInput: str, route: str, matchedObj: dict):
         )
         noRouteEmbed.set_thumbnail(url="https://i.imgur.com/j3OoT8F.png")
 
-        responses["embeds"].append(noRouteEmbed)
-        responses["files"].append(discord.File(f"{os.getcwd()}data{fileDelimiter + badObjectFilename}"))
+        yield "embed", noRouteEmbed
+        yield "file", f"{os.getcwd()}data{fileDelimiter + badObjectFilename}"
 
+
+def collectResponse(responseParts):
+    """
+    FUNC NAME: collectResponse
+    FUNC DESC: Gathers the parts yielded by constructResponse into {"files": [paths], "embeds": [embeds]}
+    FUNC TYPE: Function
+    """
+    responses = {"files": list(), "embeds": list()}
+    for partType, part in responseParts:
+        responses[f"{partType}s"].append(part)
     return responses
+
+
+def isSummarised(step: dict):
+    """
+    FUNC NAME: isSummarised
+    FUNC DESC: Checks if a dice step rolled too many faces to list in an embed, estimating the length rather than building the string
+    FUNC TYPE: Function
+    """
+    return (len(step["results"]) + len(step["dropped"])) * (len(str(step["sides"])) + 2) > config.ROLL_SUMMARY_CHARACTERS
+
+
+def formatFaces(step: dict):
+    """
+    FUNC NAME: formatFaces
+    FUNC DESC: Formats the faces rolled in a dice step, summarising them if there are too many to fit in an embed field
+    FUNC TYPE: Function
+    """
+    if not isSummarised(step):
+        return f"{step['results']}\n{'~~' + str(step['dropped']) + '~~' if step['dropped'] else ''}"
+
+    summary = summariseFaces(step["results"], step["sides"])
+    histogram = " | ".join(f"**{label}**: {count}" for label, count in summary["histogram"])
+    dropped = f"\n*{len(step['dropped'])} dropped*" if step["dropped"] else ""
+    return f"{summary['count']} dice kept{dropped}\n{histogram}\n**MIN** {summary['minimum']} **MAX** {summary['maximum']} **MEAN** {summary['mean']:.2f}"
+
+
+def constructRollResponse(calculation: str, seed: int, totals: list, allSteps: list, author: discord.abc.User, replayOf: dict = None):
+    """
+    FUNC NAME: constructRollResponse
+    FUNC DESC: Constructs the embed response for a /roll, along with a compressed attachment of every face if any had to be summarised.
+               replayOf is the audit log entry being replayed by /replay, which marks the embed as a replay rather than a new roll
+    FUNC TYPE: Function
+    """
+    repeat = len(totals)
+    diceRollEmbed = discord.Embed(
+        color=discord.Colour.purple(),
+        title="REPLAY OF AN AUDITED ROLL" if replayOf is not None else None
+    )
+    diceRollEmbed.add_field(name="QUERY", value=f"`{calculation}`" if repeat == 1 else f"`{calculation}` x{repeat}", inline=False)
+    diceRollEmbed.add_field(name="TOTAL", value=", ".join(f"`{total}`" for total in totals), inline=False)
+    diceRollEmbed.add_field(name="RESULTS", value="----------", inline=False)
+    if replayOf is None:
+        diceRollEmbed.set_author(name=f"Rolled by {author.name}", icon_url=f"{author.display_avatar}")
+        diceRollEmbed.set_footer(text=f"seed {seed}")
+    else:
+        diceRollEmbed.set_author(name=f"Replayed by {author.name}", icon_url=f"{author.display_avatar}")
+        rolledAt = time.strftime("%d-%m-%Y %H:%M:%S", time.gmtime(replayOf["t"]))
+        diceRollEmbed.set_footer(text=f"seed {seed} | first rolled {rolledAt} UTC | {'matches' if totals == replayOf['x'] else 'DOES NOT MATCH'} the audit log")
+
+    # Repeated rolls only have room for a field per repeat, so just list the dice rolled in each
+    rollsSummarised = False
+    if repeat > 1:
+        rollFields = []
+        for rollCount, steps in enumerate(allSteps, start=1):
+            diceResults = "\n".join(f"`{step['notation']}` {formatFaces(step)}" for step in steps if step["type"] == "dice")
+            rollFields.append((f"__ROLL {rollCount}__", f"{diceResults}\n*TOTAL = {totals[rollCount - 1]}*"))
+
+        # Lots of dice steps can still overflow a field or the whole embed, in which case only show the totals & attach the dice
+        rollCharacters = len(diceRollEmbed) + sum(len(name) + len(value) for name, value in rollFields)
+        if rollCharacters > config.EMBED_MAX_CHARACTERS - config.ROLL_RESULTS_NOTE_CHARACTERS or \
+                any(len(value) > config.EMBED_MAX_FIELD_CHARACTERS for _, value in rollFields):
+            rollFields = [(name, f"*TOTAL = {total}*") for (name, _), total in zip(rollFields, totals)]
+            rollsSummarised = True
+
+        for name, value in rollFields:
+            diceRollEmbed.add_field(name=name, value=value, inline=True)
+
+    # Each step is either a dice roll or an operator applied to the results of earlier steps, e.g. for `/roll 3d8 + 8`:
+    # [
+    #   {"type": "dice", "notation": "3d8", "sides": 8, "results": [4, 8, 1], "dropped": [], "total": 13},
+    #   {"type": "operator", "operator": "+", "left": 13, "right": 8, "total": 21}
+    # ]
+    else:
+        for stepCount, step in enumerate(allSteps[0][:config.ROLL_MAX_STEP_FIELDS], start=1):
+            if step["type"] == "dice":
+                diceRollEmbed.add_field(
+                    name=f"__STEP {stepCount}__\n`{step['notation']}` ROLLED |",
+                    value=f"{formatFaces(step)}\n*TOTAL = {step['total']}*",
+                    inline=True
+                )
+            else:
+                diceRollEmbed.add_field(
+                    name=f"__STEP {stepCount}__\n`{step['operator']}` OPERATOR APPLIED! |",
+                    value=f"{step['left']}\n**{step['operator']}**\n{step['right']}\n*TOTAL = {step['total']}*",
+                    inline=True
+                )
+
+    # Send every face & step in a compressed attachment when the embed couldn't fit them all
+    summarised = rollsSummarised or any(step["type"] == "dice" and isSummarised(step) for steps in allSteps for step in steps)
+    if repeat == 1 and len(allSteps[0]) > config.ROLL_MAX_STEP_FIELDS:
+        diceRollEmbed.add_field(name="MORE STEPS", value=f"{len(allSteps[0]) - config.ROLL_MAX_STEP_FIELDS} more steps in the attached file", inline=False)
+        summarised = True
+    if not summarised:
+        return diceRollEmbed, None
+
+    fullResults = io.StringIO()
+    for rollCount, steps in enumerate(allSteps, start=1):
+        fullResults.write(f"ROLL {rollCount} (TOTAL = {totals[rollCount - 1]})\n")
+        for stepCount, step in enumerate(steps, start=1):
+            if step["type"] == "dice":
+                fullResults.write(f"STEP {stepCount}: {step['notation']} = {step['total']}\nKEPT: {', '.join(map(str, step['results']))}\n")
+                if step["dropped"]:
+                    fullResults.write(f"DROPPED: {', '.join(map(str, step['dropped']))}\n")
+            else:
+                fullResults.write(f"STEP {stepCount}: {step['left']} {step['operator']} {step['right']} = {step['total']}\n")
+    resultsFile = discord.File(io.BytesIO(gzip.compress(fullResults.getvalue().encode("utf-8"))), filename=f"roll-{seed}.txt.gz")
+    diceRollEmbed.add_field(name="FULL RESULTS", value=f"See `roll-{seed}.txt.gz` for every dice rolled", inline=False)
+    return diceRollEmbed, resultsFile
+
+
+def constructDistributionResponse(calculation: str, summary: dict, histogram: str):
+    """
+    FUNC NAME: constructDistributionResponse
+    FUNC DESC: Constructs the embed response for the exact or simulated odds of a /roll calculation
+    FUNC TYPE: Function
+    """
+    simulated = "trials" in summary
+    distributionEmbed = discord.Embed(
+        colour=discord.Colour.purple(),
+        title=f"{'SIMULATED ' if simulated else ''}ODDS FOR `{calculation}`",
+        description=f"```\n{histogram}\n```"
+    )
+    distributionEmbed.add_field(name="MEAN", value=f"{summary['mean']:.2f}", inline=True)
+    distributionEmbed.add_field(name="VARIANCE", value=f"{summary['variance']:.2f} (SD {summary['deviation']:.2f})", inline=True)
+    distributionEmbed.add_field(name="RANGE", value=f"{summary['minimum']} to {summary['maximum']}", inline=True)
+    distributionEmbed.add_field(
+        name="PERCENTILES",
+        value="\n".join(f"**{percentile}%**: {value}" for percentile, value in summary["percentiles"].items()),
+        inline=True
+    )
+    if "target" in summary:
+        distributionEmbed.add_field(name=f"CHANCE OF {summary['target']} OR MORE", value=f"{summary['chance']:.2%}", inline=True)
+
+    # Simulations are estimates, so show how far off they could be
+    if simulated:
+        distributionEmbed.add_field(
+            name="95% CONFIDENCE",
+            value=f"**MEAN**: {summary['meanInterval'][0]:.2f} to {summary['meanInterval'][1]:.2f}" + (
+                f"\n**CHANCE**: {summary['chanceInterval'][0]:.2%} to {summary['chanceInterval'][1]:.2%}" if "chanceInterval" in summary else ""
+            ),
+            inline=True
+        )
+        if summary["partial"]:
+            # Which batches finished depends on timing, so the seed can't reproduce a run that was cut short
+            distributionEmbed.set_footer(text=f"partial ({summary['trials']:,}/{summary['requestedTrials']:,} trials) | seed {summary['seed']} (not reproducible)")
+        else:
+            distributionEmbed.set_footer(text=f"{summary['trials']:,} trials | seed {summary['seed']}")
+
+    return distributionEmbed